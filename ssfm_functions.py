@@ -17,6 +17,9 @@ import matplotlib.pyplot as plt
 from matplotlib import cm
 
 import os
+import copy
+import json
+import math
 
 from datetime import datetime
 
@@ -165,18 +168,16 @@ class timeFreq_class:
 
     def saveTimeFreq(self):
         """
-        Saves info needed to construct this timeFreq_class instance to .csv 
+        Saves info needed to construct this timeFreq_class instance to .json 
         file so they can be loaded later using the load_timeFreq function.
         
         Parameters:
             self
         """
-        timeFreq_df = pd.DataFrame(columns=['number_of_points', 'dt_s','centerFreq_Hz'])
-
-        timeFreq_df.loc[  len(timeFreq_df.index) ] = [self.number_of_points,
-                                                  self.time_step,self.centerFrequency]
-        
-        timeFreq_df.to_csv("timeFreq.csv")  
+        with open("timeFreq.json","w") as timeFreq_file:
+            json.dump({"number_of_points": int(self.number_of_points),
+                       "dt_s": float(self.time_step),
+                       "centerFreq_Hz": float(self.centerFrequency)},timeFreq_file,indent=4)
         
     
 
@@ -184,8 +185,9 @@ def load_timeFreq(path:str):
     """ 
     Loads timeFreq_class for previous run
 
-    Takes a path to a previous run, opens the relevant .csv file and extracts
+    Takes a path to a previous run, opens the relevant .json file and extracts
     stored info from which the timeFreq class for that run can be restored.
+    Runs saved before .json files were introduced are read from .csv files.
 
     Parameters:
         path (str): Path to previous run
@@ -194,6 +196,10 @@ def load_timeFreq(path:str):
         timeFreq_class: timeFreq_class used in previous run.
 
     """
+    if os.path.isfile(os.path.join(path,"timeFreq.json")):
+        with open(os.path.join(path,"timeFreq.json")) as timeFreq_file:
+            info = json.load(timeFreq_file)
+        return timeFreq_class(info["number_of_points"], info["dt_s"], info["centerFreq_Hz"])
     
     df = pd.read_csv(path+'\\timeFreq.csv')
     number_of_points = df['number_of_points']
@@ -520,22 +526,37 @@ class fiber_class:
         self.tau1=0.0
         self.tau2=0.0
         
-        self.RamanInFreqDomain_func = lambda freq: 0.0
-        
         if ramanModel == "Agrawal":  #Raman parameters taken from Govind P. Agrawal's book, "Nonlinear Fiber Optics". 
             self.fR = 0.180  # Relative contribution of Raman effect to overall nonlinearity
             self.tau1 = 12.2*1e-15 # Average angular oscillation time of molecular bonds in silica lattice. Note: 1/(2*pi*12.2fs) = 13.05THz = Typical Raman frequency
             self.tau2 = 30.0*1e-15 # Average exponential decay time of molecular bond oscilaltions. Note: 2*1/(2*pi*30.0fs) = 10.61 THz = Typical Raman gain spectrum FWHM 
             
-            #Frequency domain representation of Raman response taken from https://github.com/omelchert/GNLStools/blob/main/src/GNLStools.py
-            self.RamanInFreqDomain_func = lambda freq: (self.tau1**2+self.tau2**2)/(self.tau1**2*(1-1j*freq*2*pi*self.tau2)**2+self.tau2**2) #Freq domain representation of Raman response
-            
         
         
         
         self.describe_fiber()
     
     
+    def RamanInFreqDomain_func(self,freq):
+        """
+        Frequency domain representation of the Raman response of the fiber
+        
+        Defined as a method rather than a lambda so fiber_class instances can
+        be pickled and sent to worker processes.
+        
+        Parameters:
+            self
+            freq (nparray): Frequency range in Hz
+            
+        Returns:
+            nparray: Raman response at each frequency. 0.0 if ramanModel is "None"
+        """
+        if self.ramanModel == "Agrawal":
+            #Frequency domain representation of Raman response taken from https://github.com/omelchert/GNLStools/blob/main/src/GNLStools.py
+            return (self.tau1**2+self.tau2**2)/(self.tau1**2*(1-1j*freq*2*pi*self.tau2)**2+self.tau2**2) 
+        
+        return 0.0
+    
     
     def describe_fiber(self,destination = None):
         """
@@ -587,51 +608,31 @@ class fiber_span_class:
         
     def saveFiberSpan(self):
         """
-        Saves info about each fiber in span to .csv file so they can be loaded later by the load_fiber_span function 
+        Saves info about each fiber in span to .json file so they can be loaded later by the load_fiber_span function 
         
         Parameters:
             self
         """
-        fiber_df = pd.DataFrame(columns=['Length_m',
-                                         'numberOfSteps',
-                                         'gamma_per_W_per_m',
-                                         'beta2_s2_per_m',
-                                         'beta3_s3_per_m',
-                                         'beta4_s4_per_m',
-                                         'beta5_s5_per_m',
-                                         'beta6_s6_per_m',
-                                         'beta7_s7_per_m',
-                                         'beta8_s8_per_m',
-                                         'alpha_dB_per_m',
-                                         'alpha_Np_per_m',
-                                         'ramanModel'
-                                         ])
-                                         
+        fiber_info_list = []
         for fiber in self.fiber_list:
-            fiber_df.loc[  len(fiber_df.index) ] = [fiber.Length,
-                                                    fiber.numberOfSteps,
-                                                    fiber.gamma,
-                                                    fiber.beta_list[0],
-                                                    fiber.beta_list[1],
-                                                    fiber.beta_list[2],
-                                                    fiber.beta_list[3],
-                                                    fiber.beta_list[4],
-                                                    fiber.beta_list[5],
-                                                    fiber.beta_list[6],
-                                                    fiber.alpha_dB_per_m,
-                                                    fiber.alpha_Np_per_m,
-                                                    fiber.ramanModel
-                                                    ]
-        
-        fiber_df.to_csv("Fiber_span.csv")
+            fiber_info_list.append({"Length_m": float(fiber.Length),
+                                    "numberOfSteps": int(fiber.numberOfSteps),
+                                    "gamma_per_W_per_m": float(fiber.gamma),
+                                    "beta_list": [float(beta_n) for beta_n in fiber.beta_list],
+                                    "alpha_dB_per_m": float(fiber.alpha_dB_per_m),
+                                    "ramanModel": str(fiber.ramanModel)})
+        
+        with open("Fiber_span.json","w") as fiber_span_file:
+            json.dump(fiber_info_list,fiber_span_file,indent=4)
 
 
 def load_fiber_span(path:str):
     """ 
     Loads fiber_span_class for previous run
     
-    Takes a path to a previous run, opens the relevant .csv file and extracts
+    Takes a path to a previous run, opens the relevant .json file and extracts
     stored info from which the fiber_span_class for that run can be restored.
+    Runs saved before .json files were introduced are read from .csv files.
     
     Parameters:
         path (str): Path to previous run
@@ -640,20 +641,31 @@ def load_fiber_span(path:str):
         fiber_span_class: A class containing a list of fibers from a previous run.
     
     """    
+    if os.path.isfile(os.path.join(path,"Fiber_span.json")):
+        with open(os.path.join(path,"Fiber_span.json")) as fiber_span_file:
+            fiber_info_list = json.load(fiber_span_file)
+        
+        return fiber_span_class([fiber_class(info["Length_m"],
+                                             info["numberOfSteps"],
+                                             info["gamma_per_W_per_m"],
+                                             info["beta_list"],
+                                             info["alpha_dB_per_m"],
+                                             info["ramanModel"]) for info in fiber_info_list])
+    
     df = pd.read_csv(path+'\\Fiber_span.csv')
     Length_m = df['Length_m']
     numberOfSteps = df['numberOfSteps']
     gamma_per_W_per_m = df['gamma_per_W_per_m']
     beta2_s2_per_m = df['beta2_s2_per_m']
-    beta3_s3_per_m = df['beta2_s3_per_m']
-    beta4_s4_per_m = df['beta2_s4_per_m']
-    beta5_s5_per_m = df['beta2_s5_per_m']
-    beta6_s6_per_m = df['beta2_s6_per_m']
-    beta7_s7_per_m = df['beta2_s7_per_m']
-    beta8_s8_per_m = df['beta2_s8_per_m']
+    beta3_s3_per_m = df['beta3_s3_per_m']
+    beta4_s4_per_m = df['beta4_s4_per_m']
+    beta5_s5_per_m = df['beta5_s5_per_m']
+    beta6_s6_per_m = df['beta6_s6_per_m']
+    beta7_s7_per_m = df['beta7_s7_per_m']
+    beta8_s8_per_m = df['beta8_s8_per_m']
     
     alpha_dB_per_m = df['alpha_dB_per_m']
-    ramanModel = df['ramanModel']
+    ramanModel = df['ramanModel'].fillna("None") #pandas reads the string "None" as a missing value
     
     fiber_list=[]
     
@@ -768,57 +780,42 @@ class input_signal_class:
 
     def saveInputSignal(self):
         """
-        Saves info needed to construct this input_signal_class instance to .csv 
+        Saves info needed to construct this input_signal_class instance to .json 
         file so they can be loaded later using the load_InputSignal function.
+        The amplitude is always saved to a .npy file, so custom signals and 
+        the particular noise realization are restored exactly.
         
         Parameters:
             self
         """
-        #Initialize dataframe
-        signal_df = pd.DataFrame(columns=['Amax_sqrt(W)',
-                                          'Pmax_W',
-                                          'duration_s',
-                                          'time_offset_s',
-                                          'freq_offset_Hz',             
-                                          'chirp',
-                                          'pulseType',
-                                          'order',
-                                          'noiseAmplitude_sqrt(W)'])
-                                         
-         
-        
-        #Fill it with values used for generating input signal
-        signal_df.loc[  len(signal_df.index) ] = [self.Amax,
-                                                  self.Pmax,
-                                                  self.duration,
-                                                  self.time_offset_s,
-                                                  self.freq_offset_Hz,
-                                                  self.chirp,
-                                                  self.pulseType,
-                                                  self.order,
-                                                  self.noiseAmplitude]
-        #Export dataframe to .csv file
-        signal_df.to_csv("Input_signal.csv")
+        signal_info = {"Amax_sqrt(W)": float(self.Amax),
+                       "Pmax_W": float(self.Pmax),
+                       "duration_s": float(self.duration),
+                       "time_offset_s": float(self.time_offset_s),
+                       "freq_offset_Hz": float(self.freq_offset_Hz),
+                       "chirp": float(self.chirp),
+                       "pulseType": str(self.pulseType),
+                       "order": int(self.order),
+                       "noiseAmplitude_sqrt(W)": float(self.noiseAmplitude),
+                       "amplitudeFile": "Input_signal_amplitude.npy"}
+        
+        with open("Input_signal.json","w") as signal_file:
+            json.dump(signal_info,signal_file,indent=4)
+        
+        np.save("Input_signal_amplitude.npy",self.amplitude)
         
         #Also export timeFreq
         self.timeFreq.saveTimeFreq()
       
-        if self.pulseType == "custom":
-            custom_input_df =    pd.DataFrame(columns=[ "time_s", "amplitude_sqrt_W_real","amplitude_sqrt_W_imag" ] )
-            
-            custom_input_df["time_s"] = self.timeFreq.t
-            custom_input_df["amplitude_sqrt_W_real"] = np.real(self.amplitude)
-            custom_input_df["amplitude_sqrt_W_imag"] = np.imag(self.amplitude)
-            
-            custom_input_df.to_csv("Custom_input_signal.csv")
-      
 
 def load_InputSignal(path):    
     """ 
     Loads input_signal_class for previous run
     
-    Takes a path to a previous run, opens the relevant .csv file and extracts
-    stored info from which the input_signal_class for that run can be restored.
+    Takes a path to a previous run, opens the relevant .json and .npy files 
+    and extracts stored info from which the input_signal_class for that run 
+    can be restored. Runs saved before .json files were introduced are read 
+    from .csv files.
     
     Parameters:
         path (str): Path to previous run
@@ -827,6 +824,31 @@ def load_InputSignal(path):
         input_signal_class: A class containing the input signal and time base.
     
     """    
+    if os.path.isfile(os.path.join(path,"Input_signal.json")):
+        with open(os.path.join(path,"Input_signal.json")) as signal_file:
+            info = json.load(signal_file)
+        
+        timeFreq = load_timeFreq( path )
+        
+        loaded_input_signal = input_signal_class(timeFreq,
+                                                 info["Amax_sqrt(W)"],
+                                                 info["duration_s"],
+                                                 info["time_offset_s"],
+                                                 info["freq_offset_Hz"],
+                                                 info["chirp"],
+                                                 info["pulseType"],
+                                                 info["order"],
+                                                 info["noiseAmplitude_sqrt(W)"])
+        
+        #Restore exact amplitude, including custom signals and noise
+        loaded_input_signal.amplitude = np.load(os.path.join(path,info["amplitudeFile"]))
+        if getEnergy(timeFreq.t, loaded_input_signal.amplitude) == 0.0:
+            loaded_input_signal.spectrum = np.copy(loaded_input_signal.amplitude)
+        else:
+            loaded_input_signal.spectrum = getSpectrumFromPulse(timeFreq.t,loaded_input_signal.amplitude)
+        
+        return loaded_input_signal
+    
     #Open dataframe with pulse parameters
     df = pd.read_csv(path+'\\Input_signal.csv')
     
@@ -1049,10 +1071,13 @@ class ssfm_result_class:
         experimentName ( str ): Name of experiment
         dirs ( tuple ): Contains directory where current script is located and the directory where output is to be saved
         
-        pulseMatrix ( nparray ): Amplitude of pulse at every z-location in fiber
-        spectrumMatrix ( nparray ): Spectrum of pulse at every z-location in fiber       
+        z_array ( nparray ): z-locations in fiber at which pulse and spectrum are stored
+        pulseMatrix ( nparray ): Amplitude of pulse at every z-location in z_array
+        spectrumMatrix ( nparray ): Spectrum of pulse at every z-location in z_array       
+        pulsePyramid ( power_pyramid_class ): Power of pulseMatrix at reduced resolutions. None until buildPyramids is called.
+        spectrumPyramid ( power_pyramid_class ): Power of spectrumMatrix at reduced resolutions. None until buildPyramids is called.
     """
-    def __init__(self, input_signal:input_signal_class, fiber:fiber_class,experimentName,directories):
+    def __init__(self, input_signal:input_signal_class, fiber:fiber_class,experimentName,directories,pulseMatrix=None,spectrumMatrix=None,timeWindow=None,frequencyWindow=None,z_array=None):
 
         """
         Constructor for ssfm_result_class. 
@@ -1062,17 +1087,88 @@ class ssfm_result_class:
             fiber ( fiber_class ): Fiber signal was sent through
             experimentName ( str ): Name of experiment
             directories ( tuple ): Contains directory where current script is located and the directory where output is to be saved 
+            pulseMatrix = None ( nparray ) (optional): Previously computed pulseMatrix, e.g. loaded from disk. If None, an empty matrix is allocated
+            spectrumMatrix = None ( nparray ) (optional): Previously computed spectrumMatrix, e.g. loaded from disk. If None, an empty matrix is allocated
+            timeWindow = None ( storage_window_class ) (optional): If specified, only store this window of pulseMatrix for every z-step
+            frequencyWindow = None ( storage_window_class ) (optional): If specified, only store this window of spectrumMatrix for every z-step
+            z_array = None ( nparray ) (optional): z-locations at which results are stored. Defaults to fiber.z_array.
         """ 
         self.input_signal = input_signal
         self.fiber = fiber
         self.experimentName=experimentName
         self.dirs = directories
+        self.z_array = fiber.z_array if z_array is None else z_array
+        self.pulsePyramid = None
+        self.spectrumPyramid = None
+
+        if pulseMatrix is not None and spectrumMatrix is not None:
+            self.pulseMatrix = pulseMatrix
+            self.spectrumMatrix = spectrumMatrix
+            return
 
-        self.pulseMatrix = np.zeros((len(fiber.z_array),input_signal.timeFreq.number_of_points ) )*(1+0j)
-        self.spectrumMatrix = np.copy(self.pulseMatrix)
+        if timeWindow is None:
+            self.pulseMatrix = np.zeros((len(self.z_array),input_signal.timeFreq.number_of_points ) )*(1+0j)
+        else:
+            self.pulseMatrix = windowed_matrix_class(len(self.z_array),input_signal.timeFreq.number_of_points,timeWindow)
+        
+        if frequencyWindow is None:
+            self.spectrumMatrix = np.zeros((len(self.z_array),input_signal.timeFreq.number_of_points ) )*(1+0j)
+        else:
+            self.spectrumMatrix = windowed_matrix_class(len(self.z_array),input_signal.timeFreq.number_of_points,frequencyWindow)
         
         self.pulseMatrix[0,:]=np.copy(input_signal.amplitude)   
         self.spectrumMatrix[0,:] = np.copy(input_signal.spectrum)
+    
+    def buildPyramids(self,minSize=64):
+        """
+        Builds power pyramids of pulseMatrix and spectrumMatrix
+        
+        Plots use the coarsest level with enough resolution instead of 
+        reading the full matrices. See buildPowerPyramid. 
+        
+        Parameters:
+            self
+            minSize=64 (int) (optional): Axes are only halved while they are longer than this
+        """
+        self.pulsePyramid = buildPowerPyramid(self.pulseMatrix,minSize)
+        self.spectrumPyramid = buildPowerPyramid(self.spectrumMatrix,minSize)
+    
+    def saveResult(self,path,fiber_index=0,compression=None,chunkShape=(64,1024),deltaErrorBound=None):
+        """
+        Saves z_array, pulseMatrix, spectrumMatrix and power pyramids to binary files
+        
+        Files are named after fiber_index, so the results of a span can share 
+        one folder. Use saveResults to also write the manifest needed by 
+        load_results. 
+        
+        Parameters:
+            self
+            path (str): Folder in which the result is saved. Created if it does not exist.
+            fiber_index=0 (int) (optional): Index of fiber in span
+            compression=None (str) (optional): None for .npy files, otherwise "zlib", "zstd", "blosc" or "none" for chunked archives 
+            chunkShape=(64,1024) (tuple) (optional): Number of z-steps and time points in each chunk of archives
+            deltaErrorBound=None (float) (optional): If specified, save matrices with saveDeltaMatrix with this error bound relative to their largest value
+            
+        Returns:
+            bool: True if a matrix was saved with a storage window
+        """
+        os.makedirs(path,exist_ok=True)
+        np.save(os.path.join(path,f"fiber_{fiber_index}_z_array.npy"), self.z_array)
+        
+        windowed = False
+        for name, matrix in [("pulseMatrix",self.pulseMatrix), ("spectrumMatrix",self.spectrumMatrix)]:
+            if type(matrix) == windowed_matrix_class:
+                matrix.save(os.path.join(path,f"fiber_{fiber_index}_{name}"), compression, chunkShape)
+                windowed = True
+            elif deltaErrorBound is not None:
+                saveDeltaMatrix(matrix, os.path.join(path,f"fiber_{fiber_index}_{name}"), deltaErrorBound, compression=compression or "zlib")
+            elif compression is None:
+                np.save(os.path.join(path,f"fiber_{fiber_index}_{name}.npy"), matrix)
+            else:
+                saveChunkedMatrix(matrix, os.path.join(path,f"fiber_{fiber_index}_{name}"), chunkShape, compression)
+        
+        savePyramids(self, path, fiber_index)
+        return windowed
         
         
 
@@ -1451,7 +1547,7 @@ def load_previous_run(basePath):
     """ 
     Loads all relevant info about previous run
     
-    When path to previous run folder is specified, open .csv files describing fiber, signal and stepconfig.
+    When path to previous run folder is specified, open .json, .npy and .csv files describing fiber, signal and stepconfig.
     Use the stored values to reconstruct the parameters for the run.
     
     Parameters:
@@ -1474,286 +1570,3451 @@ def load_previous_run(basePath):
     return fiber_span, input_signal, stepConfig
 
 
-def NL_simple(fiber:fiber_class, timeFreq:timeFreq_class, pulse,dz):
-    return np.exp(1j*fiber.gamma*getPower(pulse)*dz)
+import zlib
 
-def NL_full(fiber:fiber_class, timeFreq:timeFreq_class, pulse,dz):
-    
-    fR = fiber.fR
-    freq = timeFreq.f
-    t = timeFreq.t
-    
-    f0 = timeFreq.centerFrequency
-    RamanInFreqDomain=fiber.RamanInFreqDomain_func(freq)
+#Optional compressors for chunked archives. zlib from the standard library is always available.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
-    
-    NR_func = lambda current_pulse: (1-fR)*getPower(current_pulse)*current_pulse + fR*current_pulse*getPulseFromSpectrum(freq,getSpectrumFromPulse(t,getPower(current_pulse))*RamanInFreqDomain)
-    
-    NR_in_freq_domain = 1j*dz*fiber.gamma*(1.+freq/f0)*getPulseFromSpectrum(freq,NR_func(getSpectrumFromPulse(timeFreq.t, pulse)))
-    
-    
-    return np.exp( getPulseFromSpectrum(freq, NR_in_freq_domain) ) 
-    
-    
+try:
+    import blosc
+except ImportError:
+    blosc = None
 
-    
 
-def SSFM(fiber_span:fiber_span_class,
-         input_signal:input_signal_class,
-         experimentName ="most_recent_run",
-         showProgressFlag = False):
+def getCompressor(compression):
     """ 
-    Runs the Split-Step Fourier method and calculates field throughout fiber
-    
-    Runs the SSFM to solve the NLSE with the specified parameters. Goes through the following steps:
-        1) Create folder for saving input config and results
-        2) Loops over fibers in fiber_span. Gets zsteps for each and runs the SSFM
-        3) Stores results of each fiber in a separate ssfm_result_class and uses pulse at the end as input to next one
-        4) Returns list of ssfm_result_class objects
+    Returns functions for compressing and decompressing chunks of an archive
     
     Parameters:
-        fiber_span (fiber_span_class): Class holding fibers through which the signal is propagated
-        input_signal (input_signal_class): Class holding info about initial input signal
-        numberOfSteps = 2**10 (optional): Number of z-steps taken during SSFM. 
-        experimentName ="most_recent_run" (optional): Name of folder for present simulation.
+        compression (str): "zlib", "zstd", "blosc" or "none". zstd and blosc require the zstandard and blosc packages.
         
     Returns:
-        list: List of ssfm_result_class corresponding to each fiber segment.  
-    
+        list(function,function): compress(bytes) and decompress(bytes)
     """
-    print("########### Initializing SSFM!!! ###########")
-    
-    t = input_signal.timeFreq.t
-    f = input_signal.timeFreq.f
-    
-    
-    
-    #Create output directory, switch to it and return appropriate paths and current time
-    dirs , current_time = createOutputDirectory(experimentName)
+    compression = compression.lower()
+    if compression == "zlib":
+        return (lambda data: zlib.compress(data,6)), zlib.decompress
+    elif compression == "zstd":
+        assert zstandard is not None, "ERROR: compression='zstd' requires the zstandard package!!!"
+        return zstandard.ZstdCompressor(level=3).compress, zstandard.ZstdDecompressor().decompress
+    elif compression == "blosc":
+        assert blosc is not None, "ERROR: compression='blosc' requires the blosc package!!!"
+        return (lambda data: blosc.compress(data,typesize=16)), blosc.decompress
+    elif compression == "none":
+        return bytes, bytes
+    
+    raise ValueError(f"Unknown compression '{compression}'. Please use 'zlib', 'zstd', 'blosc' or 'none'")
+
+
+def saveChunkedMatrix(matrix, path, chunkShape=(64,1024), compression="zlib"):
+    """ 
+    Saves a 2D matrix as compressed chunks so parts of it can be read without decompressing the rest
     
+    The matrix is split into blocks of chunkShape rows (z-steps) and 
+    columns (time or frequency points). Each block is compressed 
+    separately and appended to a single data file, whose offsets are 
+    stored in an index file next to a manifest describing the layout.
     
-    #Make new folder to hold info about the input signal and fiber span
-    base_dir    = dirs[0]
-    current_dir = dirs[1]
+    Parameters:
+        matrix (nparray): 2D array to be saved, e.g. pulseMatrix
+        path (str): Folder in which the archive is saved. Created if it does not exist.
+        chunkShape=(64,1024) (tuple) (optional): Number of rows and columns in each chunk
+        compression="zlib" (str) (optional): "zlib", "zstd", "blosc" or "none"
+    """
+    compress, _ = getCompressor(compression)
+    os.makedirs(path,exist_ok=True)
     
-    newFolderName = "input_info\\"
-    newFolderPath = newFolderName
-    os.makedirs(newFolderPath,exist_ok=True)
-    os.chdir(newFolderPath)
-
-    #Save parameters of fiber span to file in directory
-    fiber_span.saveFiberSpan()
+    number_of_rows, number_of_columns = matrix.shape
+    chunk_rows, chunk_columns = chunkShape
+    number_of_row_chunks = int(np.ceil(number_of_rows/chunk_rows))
+    number_of_column_chunks = int(np.ceil(number_of_columns/chunk_columns))
     
-    #Save input signal parameters
-    input_signal.saveInputSignal()
+    offsets = np.zeros((number_of_row_chunks,number_of_column_chunks,2),dtype=np.int64)
     
+    with open(os.path.join(path,"chunks.bin"),"wb") as data_file:
+        position = 0
+        for i in range(number_of_row_chunks):
+            rows = np.array(matrix[i*chunk_rows:(i+1)*chunk_rows,:])
+            for j in range(number_of_column_chunks):
+                data = compress(np.ascontiguousarray(rows[:,j*chunk_columns:(j+1)*chunk_columns]).tobytes())
+                data_file.write(data)
+                offsets[i,j,:] = [position, len(data)]
+                position += len(data)
     
+    np.save(os.path.join(path,"index.npy"),offsets)
     
-    #Return to main output directory
-    os.chdir(current_dir)
+    manifest = {"shape": [int(number_of_rows), int(number_of_columns)],
+                "dtype": np.dtype(matrix.dtype).str,
+                "chunkShape": [int(chunk_rows), int(chunk_columns)],
+                "compression": compression.lower()}
     
-    #TODO: Make sure code handles current_input_signal correctly for concatenated fibers!!!
-    current_input_signal = input_signal
+    with open(os.path.join(path,"manifest.json"),"w") as manifest_file:
+        json.dump(manifest,manifest_file,indent=4)
+
+
+class chunked_matrix_class:
+    """
+    Class for reading a matrix saved with saveChunkedMatrix. 
     
-    ssfm_result_list = []
+    Behaves like a read-only 2D array. Indexing it with integers or slices
+    only reads and decompresses the chunks overlapping the selected rows 
+    and columns, so a z-range and time window can be extracted from a 
+    large archive quickly.
     
-    print(f"Starting SSFM loop over {len(fiber_span.fiber_list)} fibers")
+    Attributes:
+        path (str): Folder holding the archive
+        shape (tuple): Number of rows and columns
+        dtype (dtype): Data type of the matrix
+        chunkShape (tuple): Number of rows and columns in each chunk
+        compression (str): Compression used for the chunks
+    """
+    def __init__(self,path):
+        """
+        Constructor for chunked_matrix_class
+        
+        Parameters:
+            self
+            path (str): Folder holding the archive
+        """
+        self.path = path
+        with open(os.path.join(path,"manifest.json")) as manifest_file:
+            manifest = json.load(manifest_file)
+        
+        self.shape = tuple(manifest["shape"])
+        self.dtype = np.dtype(manifest["dtype"])
+        self.chunkShape = tuple(manifest["chunkShape"])
+        self.compression = manifest["compression"]
+        self.ndim = 2
+        
+        self.offsets = np.load(os.path.join(path,"index.npy"))
+        _, self.decompress = getCompressor(self.compression)
     
-    for fiber_index, fiber in enumerate(fiber_span.fiber_list):
+    def __len__(self):
+        return self.shape[0]
     
-        print(f"Propagating through fiber number {fiber_index+1} out of {fiber_span.number_of_fibers_in_span}")
- 
+    def __array__(self,dtype=None,copy=None):
+        matrix = self[:,:]
+        return matrix if dtype is None else matrix.astype(dtype)
     
+    def getChunk(self,data_file,i,j):
+        """
+        Reads and decompresses a single chunk
         
-        #Initialize arrays to store pulse and spectrum throughout fiber
-        ssfm_result = ssfm_result_class(current_input_signal,fiber,experimentName,dirs)
-
+        Parameters:
+            self
+            data_file (file): Open chunks.bin file
+            i (int): Row index of chunk
+            j (int): Column index of chunk
+            
+        Returns:
+            nparray: Values in the chunk
+        """
+        position, size = self.offsets[i,j]
+        data_file.seek(position)
+        values = np.frombuffer(self.decompress(data_file.read(size)),dtype=self.dtype)
+        
+        chunk_rows = min(self.chunkShape[0], self.shape[0]-i*self.chunkShape[0])
+        return values.reshape(chunk_rows,-1)
     
-        newFolderName = "Length_info\\"
-        newFolderPath = newFolderName
-        os.makedirs(newFolderPath,exist_ok=True)
-        os.chdir(newFolderPath)
-
-        #Print simulation info to both terminal and .txt file in output folder
-        describeInputConfig(current_time, fiber,  current_input_signal,fiber_index)
+    def readBlock(self,row_min,row_max,column_min,column_max):
+        """
+        Reads the rectangular block matrix[row_min:row_max,column_min:column_max]
+        
+        Returns:
+            nparray: Values in the block
+        """
+        chunk_rows, chunk_columns = self.chunkShape
+        block = np.zeros((row_max-row_min,column_max-column_min),dtype=self.dtype)
         
-        #Return to main output directory
-        os.chdir(current_dir)
+        with open(os.path.join(self.path,"chunks.bin"),"rb") as data_file:
+            for i in range(row_min//chunk_rows, (row_max-1)//chunk_rows+1):
+                for j in range(column_min//chunk_columns, (column_max-1)//chunk_columns+1):
+                    chunk = self.getChunk(data_file,i,j)
+                    
+                    #Overlap between chunk and requested block in matrix coordinates
+                    r0 = max(row_min, i*chunk_rows)
+                    r1 = min(row_max, i*chunk_rows+chunk.shape[0])
+                    c0 = max(column_min, j*chunk_columns)
+                    c1 = min(column_max, j*chunk_columns+chunk.shape[1])
+                    
+                    block[r0-row_min:r1-row_min, c0-column_min:c1-column_min] = chunk[r0-i*chunk_rows:r1-i*chunk_rows, c0-j*chunk_columns:c1-j*chunk_columns]
         
-        #Pre-calculate dispersion term
-        dispterm=np.zeros_like(input_signal.timeFreq.f)*1.0
-        for n, beta_n in enumerate(fiber.beta_list):
-            dispterm+=beta_n/np.math.factorial(n)*(2*pi*input_signal.timeFreq.f)**(n+2)
-       
+        return block
+    
+    def __getitem__(self,key):
+        if not isinstance(key,tuple):
+            key = (key,slice(None))
         
-        #Pre-calculate effect of dispersion and loss as it's the same everywhere
-        disp_and_loss=np.exp(fiber.dz*(1j*dispterm-fiber.alpha_Np_per_m/2))
-        disp_and_loss_half_step = disp_and_loss**0.5
-        #Precalculate constants for nonlinearity
+        indices = []
+        for index, length in zip(key,self.shape):
+            if isinstance(index,slice):
+                indices.append(np.arange(*index.indices(length)))
+            else:
+                indices.append(np.arange(length)[index])
+        row_indices, column_indices = indices
         
-        #Use simply NL model by default if Raman is ignored
-        NL_function = NL_simple
-        if fiber.ramanModel != "None":
-            NL_function = NL_full
+        if row_indices.size == 0 or column_indices.size == 0:
+            return np.zeros(np.shape(row_indices)+np.shape(column_indices),dtype=self.dtype)
         
+        row_min, row_max = np.min(row_indices), np.max(row_indices)+1
+        column_min, column_max = np.min(column_indices), np.max(column_indices)+1
         
+        block = self.readBlock(row_min,row_max,column_min,column_max)
         
-        #Initialize arrays to store temporal profile and spectrum while calculating SSFM
-        spectrum = getSpectrumFromPulse(current_input_signal.timeFreq.t, current_input_signal.amplitude)*disp_and_loss_half_step
+        return block[np.ix_(np.atleast_1d(row_indices)-row_min, np.atleast_1d(column_indices)-column_min)].reshape(np.shape(row_indices)+np.shape(column_indices))
+
 
-        #spectrum = np.copy(current_input_signal.spectrum )*disp_and_loss_half_step
-        pulse    = getPulseFromSpectrum(input_signal.timeFreq.f, spectrum)
+#Class for choosing which samples of each row are stored by windowed_matrix_class
+class storage_window_class:
+    """
+    Class describing a window of time or frequency points stored for every z-step. 
+    
+    The window is either fixed around a given index or follows the 
+    power-weighted centroid of each row, so a pulse that drifts in time or
+    a spectrum that shifts in frequency stays inside it. 
+    
+    Attributes:
+        width (int): Number of points in window
+        center (int): Index of center of a fixed window. None centers it in the array.
+        trackCentroid (bool): If True, center the window on the centroid of each row instead
+    """
+    def __init__(self,width,center=None,trackCentroid=False):
+        """
+        Constructor for storage_window_class
         
-        #
-        #Apply half dispersion step
-        #Start loop
-        #   Apply full NL step
-        #   Apply full Disp step
-        #End loop
-        #Apply half dispersion step
+        Parameters:
+            self
+            width (int): Number of points in window
+            center=None (int) (optional): Index of center of a fixed window. Defaults to the center of the array, like the nrange of the plotting functions.
+            trackCentroid=False (bool) (optional): If True, center the window on the centroid of each row instead
+        """
+        self.width = int(width)
+        self.center = center
+        self.trackCentroid = trackCentroid
+    
+    def getStart(self,row):
+        """
+        Returns:
+            int: Index of the first point in the window for row
+        """
+        number_of_points = len(row)
+        assert self.width <= number_of_points, f"ERROR: Storage window width = {self.width} exceeds number of points = {number_of_points}!!!"
+        center = number_of_points//2 if self.center is None else self.center
         
+        if self.trackCentroid == True:
+            power = getPower(row)
+            if np.sum(power) > 0:
+                center = int(np.round(np.sum(np.arange(number_of_points)*power)/np.sum(power)))
         
-        print(f"Running SSFM with {fiber.numberOfSteps} steps")
-        updates = 0
-        for z_step_index in range(fiber.numberOfSteps):   
-            
-            #Apply nonlinearity
-            pulse*=NL_function(fiber,input_signal.timeFreq,pulse,fiber.dz) 
-            
-            #Go to spectral domain and apply disp and loss
-            spectrum = getSpectrumFromPulse(t, pulse)*(disp_and_loss) 
-            
-            
-            #Apply half dispersion step to spectrum and store results 
-            ssfm_result.spectrumMatrix[z_step_index+1,:]=spectrum*disp_and_loss_half_step
-            ssfm_result.pulseMatrix[z_step_index+1,:]=getPulseFromSpectrum(f, ssfm_result.spectrumMatrix[z_step_index+1,:])
-            
-            #Return to time domain 
-            pulse=getPulseFromSpectrum(f, spectrum) 
+        return int(np.clip(center-self.width//2, 0, number_of_points-self.width))
+    
+    def describe(self):
+        """
+        Returns:
+            dict: Parameters of the window for result manifests
+        """
+        return {"width": self.width, "center": self.center, "trackCentroid": self.trackCentroid}
 
-            finished = 100*(z_step_index/fiber.numberOfSteps)
-            if divmod(finished, 10)[0] > updates and showProgressFlag == True:
-                updates += 1
-                print(f"SSFM progress through fiber number {fiber_index+1} = {np.floor(finished):.2f}%")
-            
+
+class windowed_matrix_class:
+    """
+    Class for storing only a window of points around the pulse for every z-step. 
+    
+    Behaves like a 2D array of the full size. Points outside the stored 
+    window of a row are returned as zeros. The first and last rows are 
+    always stored in full, so the field at the fiber boundaries is exact 
+    and can be launched into the next fiber. Rows are written by assigning
+    a complete row, e.g. matrix[z_step_index,:] = spectrum.
+    
+    Attributes:
+        shape (tuple): Number of rows and number of points in full rows
+        dtype (dtype): Data type of the matrix
+        window (storage_window_class): Window used when rows are written
+        data (nparray): Stored points of every row. Can be any 2D array-like, e.g. a chunked_matrix_class
+        offsets (nparray): Index of the first stored point of every row
+        boundaryRows (nparray): Full first and last rows
+    """
+    def __init__(self,number_of_rows,number_of_points,window,data=None,offsets=None,boundaryRows=None):
+        """
+        Constructor for windowed_matrix_class
+        
+        Parameters:
+            self
+            number_of_rows (int): Number of rows, i.e. z-steps
+            number_of_points (int): Number of points in full rows
+            window (storage_window_class): Window used when rows are written
+            data=None (nparray) (optional): Previously stored points. If None, empty arrays are allocated.
+            offsets=None (nparray) (optional): Previously stored offsets
+            boundaryRows=None (nparray) (optional): Previously stored first and last rows
+        """
+        self.shape = (int(number_of_rows),int(number_of_points))
+        self.dtype = np.dtype(complex)
+        self.ndim = 2
+        self.window = window
+        
+        self.data = np.zeros((number_of_rows,window.width),dtype=complex) if data is None else data
+        self.offsets = np.zeros(number_of_rows,dtype=np.int64) if offsets is None else offsets
+        self.boundaryRows = np.zeros((2,number_of_points),dtype=complex) if boundaryRows is None else boundaryRows
+    
+    def __len__(self):
+        return self.shape[0]
+    
+    def __array__(self,dtype=None,copy=None):
+        matrix = self[:,:]
+        return matrix if dtype is None else matrix.astype(dtype)
+    
+    def __setitem__(self,key,row):
+        row_index, columns = key
+        assert columns == slice(None), "ERROR: Only complete rows can be assigned to windowed_matrix_class!!!"
+        row_index = np.arange(self.shape[0])[row_index]
+        
+        if row_index == 0:
+            self.boundaryRows[0,:] = row
+        if row_index == self.shape[0]-1:
+            self.boundaryRows[1,:] = row
+        
+        start = self.window.getStart(row)
+        self.offsets[row_index] = start
+        self.data[row_index,:] = row[start:start+self.window.width]
+    
+    def __getitem__(self,key):
+        if not isinstance(key,tuple):
+            key = (key,slice(None))
+        
+        indices = []
+        for index, length in zip(key,self.shape):
+            if isinstance(index,slice):
+                indices.append(np.arange(*index.indices(length)))
+            else:
+                indices.append(np.arange(length)[index])
+        row_indices, column_indices = indices
+        
+        rows = np.atleast_1d(row_indices)
+        columns = np.atleast_1d(column_indices)
+        block = np.zeros((len(rows),len(columns)),dtype=self.dtype)
+        
+        if len(rows) > 0 and len(columns) > 0:
+            #Read all stored rows in one go, so lazy data only loads what is needed
+            row_min, row_max = np.min(rows), np.max(rows)+1
+            data = np.asarray(self.data[row_min:row_max,:])
             
-        #Append list of output results
+            for i, row_index in enumerate(rows):
+                if row_index == 0:
+                    block[i,:] = self.boundaryRows[0,columns]
+                elif row_index == self.shape[0]-1:
+                    block[i,:] = self.boundaryRows[1,columns]
+                else:
+                    positions = columns-self.offsets[row_index]
+                    inside = (positions >= 0) & (positions < self.window.width)
+                    block[i,inside] = data[row_index-row_min,positions[inside]]
+        
+        return block.reshape(np.shape(row_indices)+np.shape(column_indices))
+    
+    def save(self,path,compression=None,chunkShape=(64,1024)):
+        """
+        Saves the windowed matrix to a folder
+        
+        Parameters:
+            self
+            path (str): Folder in which the matrix is saved. Created if it does not exist.
+            compression=None (str) (optional): If specified, stored points are saved as a chunked archive with this compression
+            chunkShape=(64,1024) (tuple) (optional): Number of rows and columns in each chunk
+        """
+        os.makedirs(path,exist_ok=True)
+        np.save(os.path.join(path,"offsets.npy"),self.offsets)
+        np.save(os.path.join(path,"boundaryRows.npy"),self.boundaryRows)
         
-        ssfm_result_list.append(ssfm_result)
+        if compression is None:
+            np.save(os.path.join(path,"data.npy"),self.data)
+        else:
+            saveChunkedMatrix(self.data,os.path.join(path,"data"),chunkShape,compression)
         
-        #Take signal at output of this fiber and feed it into the next one
-        current_input_signal.amplitude = np.copy(ssfm_result.pulseMatrix[z_step_index+1,:])
-        current_input_signal.spectrum  = np.copy(ssfm_result.spectrumMatrix[z_step_index+1,:])
+        window_info = {"shape": list(self.shape),
+                       "window": self.window.describe(),
+                       "dataFormat": "npy" if compression is None else "chunked"}
         
-
-    print("Finished running SSFM!!!")
-    
-    #Exit current output directory and return to base directory.
-    os.chdir(base_dir)
-
-             
-    return ssfm_result_list
+        with open(os.path.join(path,"window.json"),"w") as window_file:
+            json.dump(window_info,window_file,indent=4)
 
 
-def saveplot(basename):
+def load_windowed_matrix(path):
     """ 
-    Helper function for adding file type suffix to name of plot
-    
-    Helper function for adding file type suffix to name of plot
+    Loads a matrix saved with windowed_matrix_class.save
     
     Parameters:
-        basename (str): Name to which a file extension is to be appended if not already present. 
+        path (str): Folder holding the matrix
         
     Returns:
-        
-    
+        windowed_matrix_class: Matrix whose stored points are memory-mapped or read from a chunked archive when used
     """
+    with open(os.path.join(path,"window.json")) as window_file:
+        window_info = json.load(window_file)
     
-    if basename.lower().endswith(('.pdf','.png','.jpg')) == False:
-        basename+='.png'
-        
-    plt.savefig(basename, bbox_inches='tight', pad_inches=0, transparent=True, dpi=500)
+    if window_info["dataFormat"] == "chunked":
+        data = chunked_matrix_class(os.path.join(path,"data"))
+    else:
+        data = np.load(os.path.join(path,"data.npy"),mmap_mode="r")
+    
+    window = storage_window_class(**window_info["window"])
+    
+    return windowed_matrix_class(window_info["shape"][0],
+                                 window_info["shape"][1],
+                                 window,
+                                 data,
+                                 np.load(os.path.join(path,"offsets.npy")),
+                                 np.load(os.path.join(path,"boundaryRows.npy")))
 
 
-def unpackZvals(ssfm_result_list):
+def saveDeltaMatrix(matrix, path, errorBound=1e-6, keyframeInterval=32, compression="zlib"):
     """ 
-    Unpacks z_values of individual fibers in ssfm_result_list into single array
-    
-    For a span of 5 fibers with 100 steps each, this function concatenates the
-    arrays like this:
-        
-        Merge A[0:98] with (B[0:98] + A[end])      to create z_temp
-        Merge z_temp with  (C[0:98] + z_temp[end]) to create z_temp
-        Merge z_temp with  (D[0:98] + z_temp[end]) to create z_temp
-        Merge z_temp with  (E[0:99] + z_temp[end]) to create z_temp
-        
-    Note that the final entry in the first 4 arrays are discarded as they are
-    identical to the first element in the next one.
+    Saves a 2D matrix as keyframes plus quantized differences between consecutive rows
     
+    Adjacent z-steps are highly correlated, so every keyframeInterval-th row 
+    is stored exactly, and every other row is stored as the difference to 
+    the reconstruction of the previous row, rounded to a multiple of a 
+    quantization step and compressed. Because the differences are taken 
+    with respect to the reconstruction rather than the original row, 
+    rounding errors do not accumulate, and every value read back differs 
+    from the original by at most errorBound times the largest absolute 
+    value in the matrix.
     
     Parameters:
-        ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
-        
-    Returns:
-        nparray: z_values for each fiber concatenated together.  
+        matrix (nparray): 2D array to be saved, e.g. spectrumMatrix
+        path (str): Folder in which the matrix is saved. Created if it does not exist.
+        errorBound=1e-6 (float) (optional): Maximum error relative to the largest absolute value in matrix
+        keyframeInterval=32 (int) (optional): Number of rows between exactly stored rows
+        compression="zlib" (str) (optional): Compression of the differences. "zlib", "zstd", "blosc" or "none"
+    """
+    compress, _ = getCompressor(compression)
+    os.makedirs(path,exist_ok=True)
     
-    """    
-    number_of_fibers = len(ssfm_result_list)
-    if number_of_fibers==1:
-        return ssfm_result_list[0].fiber.z_array
+    number_of_rows, number_of_columns = matrix.shape
     
-    zvals =np.array([])
+    peak_amplitude = np.max([np.max(np.abs(matrix[i,:])) for i in range(number_of_rows)])
+    if peak_amplitude == 0:
+        peak_amplitude = 1.0
     
-    previous_length = 0
-    for i, ssfm_result in enumerate(ssfm_result_list):
-        
+    #Rounding real and imaginary parts to a multiple of the step changes the magnitude by at most step/sqrt(2)
+    quantization_step = np.sqrt(2)*errorBound*peak_amplitude
     
-        if i==0:
-            zvals = np.copy(ssfm_result.fiber.z_array[0:-1])
-            
-        elif  (i>0) and (i< number_of_fibers-1):
-            zvals = np.append(zvals,ssfm_result.fiber.z_array[0:-1]+previous_length) 
+    keyframes = []
+    keyframe_rows = []
+    offsets = np.zeros((number_of_rows,2),dtype=np.int64)
+    
+    with open(os.path.join(path,"residuals.bin"),"wb") as data_file:
+        position = 0
+        previous_row = None
+        for i in range(number_of_rows):
+            row = np.asarray(matrix[i,:],dtype=complex)
             
+            if previous_row is not None and i-keyframe_rows[-1] < keyframeInterval:
+                difference = row-previous_row
+                quantized = np.stack([np.round(np.real(difference)/quantization_step),
+                                      np.round(np.imag(difference)/quantization_step)])
+                
+                if np.max(np.abs(quantized)) < 2**31:
+                    quantized = quantized.astype(np.int32)
+                    data = compress(quantized.tobytes())
+                    data_file.write(data)
+                    offsets[i,:] = [position, len(data)]
+                    position += len(data)
+                    
+                    previous_row = previous_row+(quantized[0]+1j*quantized[1])*quantization_step
+                    continue
             
-        elif i==number_of_fibers-1:
-            zvals = np.append(zvals,ssfm_result.fiber.z_array+previous_length) 
+            #Store row exactly if it is due, or if the difference is too large to quantize
+            keyframes.append(row)
+            keyframe_rows.append(i)
+            previous_row = row
+    
+    np.save(os.path.join(path,"keyframes.npy"),np.array(keyframes))
+    np.save(os.path.join(path,"keyframe_rows.npy"),np.array(keyframe_rows,dtype=np.int64))
+    np.save(os.path.join(path,"index.npy"),offsets)
+    
+    delta_info = {"shape": [int(number_of_rows), int(number_of_columns)],
+                  "errorBound": float(errorBound),
+                  "quantizationStep": float(quantization_step),
+                  "keyframeInterval": int(keyframeInterval),
+                  "compression": compression.lower()}
+    
+    with open(os.path.join(path,"delta.json"),"w") as delta_file:
+        json.dump(delta_info,delta_file,indent=4)
 
-       
-        previous_length += ssfm_result.fiber.Length    
-       
-    return zvals
 
-def unpackMatrix(ssfm_result_list,zvals,timeFreq,pulse_or_spectrum):
-    """ 
-    Unpacks pulseMatrix or spectrumMatrix for individual fibers in ssfm_result_list into single array
+class delta_matrix_class:
+    """
+    Class for reading a matrix saved with saveDeltaMatrix. 
     
-    For a span of 5 fibers with 100 steps each, this function concatenates the
-    arrays like this:
+    Behaves like a read-only 2D array. Reading a row decodes it from the 
+    nearest preceding keyframe, and reading a range of rows decodes them 
+    in one pass, so sequential access is as cheap as reading every row once.
+    
+    Attributes:
+        path (str): Folder holding the matrix
+        shape (tuple): Number of rows and columns
+        dtype (dtype): Data type of the matrix
+        errorBound (float): Maximum error relative to the largest absolute value in the matrix
+        quantizationStep (float): Step to which differences were rounded
+    """
+    def __init__(self,path):
+        """
+        Constructor for delta_matrix_class
         
-        Merge A[0:98,:] with B[0:98,:]  to create mat_temp
-        Merge mat_temp with  C[0:98,:]  to create mat_temp
-        Merge mat_temp with  D[0:98,:]  to create mat_temp
-        Merge mat_temp with  E[0:99,:]  to create mat_temp
+        Parameters:
+            self
+            path (str): Folder holding the matrix
+        """
+        self.path = path
+        with open(os.path.join(path,"delta.json")) as delta_file:
+            delta_info = json.load(delta_file)
         
-    Note that the final entry in the first 4 arrays are discarded as they are
-    identical to the first element in the next one.
+        self.shape = tuple(delta_info["shape"])
+        self.dtype = np.dtype(complex)
+        self.ndim = 2
+        self.errorBound = delta_info["errorBound"]
+        self.quantizationStep = delta_info["quantizationStep"]
+        
+        self.keyframes = np.load(os.path.join(path,"keyframes.npy"),mmap_mode="r")
+        self.keyframe_rows = np.load(os.path.join(path,"keyframe_rows.npy"))
+        self.offsets = np.load(os.path.join(path,"index.npy"))
+        _, self.decompress = getCompressor(delta_info["compression"])
     
+    def __len__(self):
+        return self.shape[0]
     
-    Parameters:
-        ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
+    def __array__(self,dtype=None,copy=None):
+        matrix = self[:,:]
+        return matrix if dtype is None else matrix.astype(dtype)
+    
+    def readRows(self,row_min,row_max):
+        """
+        Decodes the rows matrix[row_min:row_max,:]
+        
+        Returns:
+            nparray: Decoded rows
+        """
+        rows = np.zeros((row_max-row_min,self.shape[1]),dtype=self.dtype)
+        
+        #Start from the last keyframe at or before row_min
+        keyframe_index = np.searchsorted(self.keyframe_rows,row_min,side="right")-1
+        
+        with open(os.path.join(self.path,"residuals.bin"),"rb") as data_file:
+            row = None
+            for i in range(self.keyframe_rows[keyframe_index],row_max):
+                if keyframe_index < len(self.keyframe_rows) and self.keyframe_rows[keyframe_index] == i:
+                    row = np.array(self.keyframes[keyframe_index])
+                    keyframe_index += 1
+                else:
+                    position, size = self.offsets[i]
+                    data_file.seek(position)
+                    quantized = np.frombuffer(self.decompress(data_file.read(size)),dtype=np.int32).reshape(2,-1)
+                    row = row+(quantized[0]+1j*quantized[1])*self.quantizationStep
+                
+                if i >= row_min:
+                    rows[i-row_min,:] = row
+        
+        return rows
+    
+    def __getitem__(self,key):
+        if not isinstance(key,tuple):
+            key = (key,slice(None))
+        
+        indices = []
+        for index, length in zip(key,self.shape):
+            if isinstance(index,slice):
+                indices.append(np.arange(*index.indices(length)))
+            else:
+                indices.append(np.arange(length)[index])
+        row_indices, column_indices = indices
+        
+        if np.size(row_indices) == 0 or np.size(column_indices) == 0:
+            return np.zeros(np.shape(row_indices)+np.shape(column_indices),dtype=self.dtype)
+        
+        row_min, row_max = np.min(row_indices), np.max(row_indices)+1
+        rows = self.readRows(row_min,row_max)
+        
+        return rows[np.ix_(np.atleast_1d(row_indices)-row_min, np.atleast_1d(column_indices))].reshape(np.shape(row_indices)+np.shape(column_indices))
+
+
+def poolPowerPairs(sums,maxes,poolRows,poolColumns):
+    """ 
+    Combines neighbouring pairs of blocks of a power pyramid level
+    
+    Parameters:
+        sums (nparray): Summed power of each block
+        maxes (nparray): Largest power in each block
+        poolRows (bool): Combine pairs of rows
+        poolColumns (bool): Combine pairs of columns
+        
+    Returns:
+        list(nparray,nparray): Summed and largest power of the combined blocks
+    """
+    for axis, pool in [(0,poolRows),(1,poolColumns)]:
+        if pool:
+            edges = np.arange(0,sums.shape[axis],2)
+            sums  = np.add.reduceat(sums,edges,axis=axis)
+            maxes = np.maximum.reduceat(maxes,edges,axis=axis)
+    return sums, maxes
+
+
+class power_pyramid_class:
+    """
+    Class for storing |A|^2 of a result matrix at repeatedly halved resolution. 
+    
+    Level L holds blocks of rowSteps[L] x columnSteps[L] entries of the 
+    full matrix, with the largest and the average power in each block. 
+    An axis is only halved while it is longer than the minimum size the 
+    pyramid was built with, so short z-arrays are not reduced to a few rows. 
+    Level 0 is the full matrix, which is read from source.
+    
+    Attributes:
+        shape (tuple): Number of rows and columns in the full matrix
+        maxLevels (list): Largest power in each block for levels 1, 2, ...
+        meanLevels (list): Average power in each block for levels 1, 2, ...
+        rowSteps (list): Number of rows of the full matrix in each block for every level
+        columnSteps (list): Number of columns of the full matrix in each block for every level
+        source (nparray): Full matrix, e.g. pulseMatrix. May be None, in which case level 0 cannot be read.
+        path (str): Folder the levels are memory-mapped from if the pyramid was loaded with load_power_pyramid, otherwise None
+    """
+    def __init__(self,shape,maxLevels,meanLevels,rowSteps,columnSteps,source=None):
+        """
+        Constructor for power_pyramid_class
+        
+        Parameters:
+            self
+            shape (tuple): Number of rows and columns in the full matrix
+            maxLevels (list): Largest power in each block for levels 1, 2, ...
+            meanLevels (list): Average power in each block for levels 1, 2, ...
+            rowSteps (list): Number of rows in each block for levels 0, 1, 2, ...
+            columnSteps (list): Number of columns in each block for levels 0, 1, 2, ...
+            source=None (nparray) (optional): Full matrix
+        """
+        self.shape = (int(shape[0]),int(shape[1]))
+        self.maxLevels = maxLevels
+        self.meanLevels = meanLevels
+        self.rowSteps = [int(step) for step in rowSteps]
+        self.columnSteps = [int(step) for step in columnSteps]
+        self.source = source
+        self.path = None
+    
+    def getLevel(self,number_of_rows,number_of_columns,rows,cols):
+        """
+        Finds the coarsest level with enough resolution for a region of the matrix
+        
+        Parameters:
+            self
+            number_of_rows (int): Number of rows of the full matrix in the region
+            number_of_columns (int): Number of columns of the full matrix in the region
+            rows (int): Smallest number of rows needed
+            cols (int): Smallest number of columns needed
+            
+        Returns:
+            int: Level to be read. 0 if the full matrix is needed.
+        """
+        level = 0
+        for candidate in range(1,len(self.rowSteps)):
+            if number_of_rows/self.rowSteps[candidate] < rows or number_of_columns/self.columnSteps[candidate] < cols:
+                break
+            level = candidate
+        return level
+    
+    def read(self,rowSlice,columnSlice,level,channel="max"):
+        """
+        Reads the power in a region of the matrix at a given level
+        
+        Parameters:
+            self
+            rowSlice (slice): Rows of the full matrix to be read
+            columnSlice (slice): Columns of the full matrix to be read
+            level (int): Level to be read, e.g. from getLevel
+            channel="max" (str) (optional): "max" or "mean"
+            
+        Returns:
+            list(nparray,nparray,nparray): Power in each block and the first row and column of each block relative to the start of the region. See getBlockCenters.
+        """
+        row_min, row_max, _ = rowSlice.indices(self.shape[0])
+        column_min, column_max, _ = columnSlice.indices(self.shape[1])
+        
+        if level == 0:
+            assert self.source is not None, "ERROR: Full matrix is not attached to this pyramid!!!"
+            return getPower(np.asarray(self.source[row_min:row_max,column_min:column_max])), np.arange(row_max-row_min), np.arange(column_max-column_min)
+        
+        if channel.lower() == "max":
+            values = self.maxLevels[level-1]
+        elif channel.lower() == "mean":
+            values = self.meanLevels[level-1]
+        else:
+            assert False, f"ERROR: Unknown channel={channel}. Use 'max' or 'mean'!!!"
+        
+        rowStep, columnStep = self.rowSteps[level], self.columnSteps[level]
+        first_row, last_row = row_min//rowStep, -(-row_max//rowStep)
+        first_column, last_column = column_min//columnStep, -(-column_max//columnStep)
+        
+        rowEdges = np.maximum(np.arange(first_row,last_row)*rowStep,row_min)-row_min
+        columnEdges = np.maximum(np.arange(first_column,last_column)*columnStep,column_min)-column_min
+        
+        return np.asarray(values[first_row:last_row,first_column:last_column]), rowEdges, columnEdges
+    
+    def save(self,path):
+        """
+        Saves the pyramid levels to a folder as .npy files
+        
+        Does nothing if the pyramid was loaded from path, since its levels 
+        are memory-mapped from the files that would be overwritten. 
+        
+        Parameters:
+            self
+            path (str): Folder in which the pyramid is saved. Created if it does not exist.
+        """
+        if self.path is not None and self.path == os.path.realpath(path):
+            return
+        
+        os.makedirs(path,exist_ok=True)
+        for level, (maxes, means) in enumerate(zip(self.maxLevels,self.meanLevels)):
+            np.save(os.path.join(path,f"max_{level+1}.npy"),maxes)
+            np.save(os.path.join(path,f"mean_{level+1}.npy"),means)
+        
+        pyramid_info = {"shape": list(self.shape),
+                        "rowSteps": self.rowSteps,
+                        "columnSteps": self.columnSteps}
+        
+        with open(os.path.join(path,"pyramid.json"),"w") as pyramid_file:
+            json.dump(pyramid_info,pyramid_file,indent=4)
+
+
+def buildPowerPyramid(matrix,minSize=64,rowChunk=256):
+    """ 
+    Builds a power_pyramid_class from a complex result matrix
+    
+    The first level is computed from blocks of rowChunk rows at a time, 
+    so lazily loaded matrices are never read into memory in full. Coarser 
+    levels are computed from the previous one. Averages are computed from 
+    summed power, so blocks at the edges with fewer entries are weighted 
+    correctly.
+    
+    Parameters:
+        matrix (nparray): pulseMatrix or spectrumMatrix of size (n_z, N). Can be any 2D array-like, e.g. a chunked_matrix_class
+        minSize=64 (int) (optional): Axes are only halved while they are longer than this
+        rowChunk=256 (int) (optional): Number of rows read at a time for the first level. Must be even.
+        
+    Returns:
+        power_pyramid_class: Pyramid with matrix attached as source
+    """
+    assert rowChunk%2 == 0, "ERROR: rowChunk must be even!!!"
+    
+    number_of_rows, number_of_columns = matrix.shape
+    rowSteps, columnSteps = [1], [1]
+    maxLevels, meanLevels = [], []
+    
+    sums, maxes = None, None
+    while True:
+        rows    = -(-number_of_rows//rowSteps[-1])
+        columns = -(-number_of_columns//columnSteps[-1])
+        poolRows, poolColumns = rows > minSize, columns > minSize
+        if not (poolRows or poolColumns):
+            break
+        
+        if sums is None:
+            chunks = []
+            for row_min in range(0,number_of_rows,rowChunk):
+                power = getPower(np.asarray(matrix[row_min:row_min+rowChunk,:]))
+                chunks.append(poolPowerPairs(power,power,poolRows,poolColumns))
+            sums, maxes = np.concatenate([chunk[0] for chunk in chunks]), np.concatenate([chunk[1] for chunk in chunks])
+        else:
+            sums, maxes = poolPowerPairs(sums,maxes,poolRows,poolColumns)
+        
+        rowSteps.append(rowSteps[-1]*(2 if poolRows else 1))
+        columnSteps.append(columnSteps[-1]*(2 if poolColumns else 1))
+        
+        rowCounts    = np.diff(np.append(np.arange(0,number_of_rows,rowSteps[-1]),number_of_rows))
+        columnCounts = np.diff(np.append(np.arange(0,number_of_columns,columnSteps[-1]),number_of_columns))
+        
+        maxLevels.append(maxes)
+        meanLevels.append(sums/np.outer(rowCounts,columnCounts))
+    
+    return power_pyramid_class(matrix.shape,maxLevels,meanLevels,rowSteps,columnSteps,matrix)
+
+
+def load_power_pyramid(path,source=None):
+    """ 
+    Loads a pyramid saved with power_pyramid_class.save
+    
+    Parameters:
+        path (str): Folder holding the pyramid
+        source=None (nparray) (optional): Full matrix to attach as level 0
+        
+    Returns:
+        power_pyramid_class: Pyramid whose levels are memory-mapped
+    """
+    with open(os.path.join(path,"pyramid.json")) as pyramid_file:
+        pyramid_info = json.load(pyramid_file)
+    
+    number_of_levels = len(pyramid_info["rowSteps"])-1
+    maxLevels  = [np.load(os.path.join(path,f"max_{level}.npy"),mmap_mode="r") for level in range(1,number_of_levels+1)]
+    meanLevels = [np.load(os.path.join(path,f"mean_{level}.npy"),mmap_mode="r") for level in range(1,number_of_levels+1)]
+    
+    pyramid = power_pyramid_class(pyramid_info["shape"],maxLevels,meanLevels,pyramid_info["rowSteps"],pyramid_info["columnSteps"],source)
+    pyramid.path = os.path.realpath(path)
+    return pyramid
+
+
+def saveResults(ssfm_result_list, path, compression=None, chunkShape=(64,1024), deltaErrorBound=None):
+    """ 
+    Saves pulse and spectrum matrices of all fibers to binary files
+    
+    Calls ssfm_result_class.saveResult for every fiber and writes a manifest.
+    By default, each matrix is stored as a .npy file. If compression is
+    specified, each matrix is stored as a chunked, compressed archive with
+    saveChunkedMatrix instead, so plots of a z-range or time window only 
+    decompress the chunks they need. Matrices stored with a storage window 
+    are saved with windowed_matrix_class.save. If deltaErrorBound is 
+    specified, other matrices are saved with saveDeltaMatrix as keyframes 
+    and quantized differences between rows. A manifest.json file describes the 
+    format, number of fibers and shapes of the matrices, so the results can 
+    be loaded later with load_results without recomputing them. Power 
+    pyramids are saved with the matrices if they have been built. 
+    
+    Parameters:
+        ssfm_result_list (list): List of ssfm_result_class objects corresponding to each fiber segment
+        path (str): Folder in which results are saved. Created if it does not exist.
+        compression=None (str) (optional): None for .npy files, otherwise "zlib", "zstd", "blosc" or "none" for chunked archives 
+        chunkShape=(64,1024) (tuple) (optional): Number of z-steps and time points in each chunk of archives
+        deltaErrorBound=None (float) (optional): If specified, save matrices with saveDeltaMatrix with this error bound relative to their largest value. Compressed with compression, or zlib if compression is None.
+    """
+    os.makedirs(path,exist_ok=True)
+    
+    resultFormat = "npy" if compression is None else "chunked"
+    if deltaErrorBound is not None:
+        resultFormat = "delta"
+    
+    for fiber_index, ssfm_result in enumerate(ssfm_result_list):
+        if ssfm_result.saveResult(path, fiber_index, compression, chunkShape, deltaErrorBound):
+            resultFormat = "windowed"
+    
+    saveResultManifest(ssfm_result_list, path, resultFormat)
+
+
+def savePyramids(ssfm_result, path, fiber_index):
+    """ 
+    Saves the power pyramids of a result, if it has any, next to its matrices
+    
+    Parameters:
+        ssfm_result (ssfm_result_class): Result of a single fiber
+        path (str): Folder in which results are saved
+        fiber_index (int): Index of fiber in span
+    """
+    for name, pyramid in [("pulsePyramid",ssfm_result.pulsePyramid), ("spectrumPyramid",ssfm_result.spectrumPyramid)]:
+        if pyramid is not None:
+            pyramid.save(os.path.join(path,f"fiber_{fiber_index}_{name}"))
+
+
+def addResultPyramids(basePath, minSize=64):
+    """ 
+    Builds and saves power pyramids for the results of a previous run
+    
+    Parameters:
+        basePath (str): Path to run folder
+        minSize=64 (int) (optional): Axes are only halved while they are longer than this
+    """
+    resultPath = os.path.join(basePath,"result_info")
+    
+    for fiber_index, ssfm_result in enumerate(load_results(basePath)):
+        ssfm_result.buildPyramids(minSize)
+        savePyramids(ssfm_result, resultPath, fiber_index)
+
+
+def saveResultManifest(ssfm_result_list, path, resultFormat):
+    """ 
+    Writes the manifest.json file describing results saved in path
+    
+    Parameters:
+        ssfm_result_list (list): List of ssfm_result_class objects corresponding to each fiber segment
+        path (str): Folder in which results are saved
+        resultFormat (str): "npy", "chunked", "windowed" or "delta"
+    """
+    manifest = {"experimentName": ssfm_result_list[0].experimentName,
+                "SSFM_solver_version": SSFM_solver_version,
+                "format": resultFormat,
+                "number_of_fibers": len(ssfm_result_list),
+                "shapes": [list(ssfm_result.pulseMatrix.shape) for ssfm_result in ssfm_result_list]}
+    
+    with open(os.path.join(path,"manifest.json"),"w") as manifest_file:
+        json.dump(manifest,manifest_file,indent=4)
+
+
+def compressResults(basePath, compression="zlib", chunkShape=(64,1024), deltaErrorBound=None):
+    """ 
+    Converts the .npy files of a previous run to chunked, compressed archives
+    
+    Only the pulse and spectrum matrices are converted. The z-locations of 
+    every fiber are kept, so runs thinned by a snapshot_policy_class still 
+    load with the right z-axis. The converted results are loaded again 
+    afterwards to check that every matrix matches its z-locations.
+    
+    Parameters:
+        basePath (str): Path to run folder
+        compression="zlib" (str) (optional): "zlib", "zstd", "blosc" or "none"
+        chunkShape=(64,1024) (tuple) (optional): Number of z-steps and time points in each chunk
+        deltaErrorBound=None (float) (optional): If specified, store keyframes and quantized differences between rows with this error bound instead of chunks. See saveDeltaMatrix.
+    """
+    resultPath = os.path.join(basePath,"result_info")
+    ssfm_result_list = load_results(basePath)
+    
+    if type(ssfm_result_list[0].pulseMatrix) != np.memmap:
+        print(f"Results in {basePath} are already compressed or windowed")
+        return
+    
+    saveResults(ssfm_result_list, resultPath, compression, chunkShape, deltaErrorBound)
+    
+    number_of_fibers = len(ssfm_result_list)
+    
+    #Release memory-maps before deleting the files they point to
+    del ssfm_result_list
+    for fiber_index in range(number_of_fibers):
+        for name in ["pulseMatrix","spectrumMatrix"]:
+            os.remove(os.path.join(resultPath,f"fiber_{fiber_index}_{name}.npy"))
+    
+    #Check that every converted matrix still matches its z-locations
+    for fiber_index, ssfm_result in enumerate(load_results(basePath)):
+        for matrix in [ssfm_result.pulseMatrix, ssfm_result.spectrumMatrix]:
+            assert matrix.shape[0] == len(ssfm_result.z_array), f"ERROR: Compressed matrix of fiber {fiber_index} has {matrix.shape[0]} rows but {len(ssfm_result.z_array)} z-locations!!!"
+
+
+def load_result_matrix(resultPath, fiber_index, name):
+    """ 
+    Opens a single result matrix saved by saveResults in whichever format it was saved
+    
+    Parameters:
+        resultPath (str): Folder holding results
+        fiber_index (int): Index of fiber in span
+        name (str): "pulseMatrix" or "spectrumMatrix"
+        
+    Returns:
+        memmap, chunked_matrix_class, windowed_matrix_class or delta_matrix_class: Lazily loaded matrix
+    """
+    path = os.path.join(resultPath,f"fiber_{fiber_index}_{name}")
+    
+    if os.path.isfile(os.path.join(path,"window.json")):
+        return load_windowed_matrix(path)
+    elif os.path.isfile(os.path.join(path,"delta.json")):
+        return delta_matrix_class(path)
+    elif os.path.isfile(os.path.join(path,"manifest.json")):
+        return chunked_matrix_class(path)
+    
+    return np.load(path+".npy",mmap_mode="r")
+
+
+def load_results(basePath):
+    """ 
+    Loads results of previous run
+    
+    Reconstructs the fiber span and input signal from the input_info folder
+    and memory-maps the matrices saved by saveResults in the result_info 
+    folder, or opens them as chunked_matrix_class if they were compressed,
+    so nothing is read from disk until it is used. The returned 
+    results can be passed directly to plotEverythingAboutResult, which 
+    saves its plots in basePath.
+    
+    Parameters:
+        basePath (str): Path to run folder
+        
+    Returns:
+        list: List of ssfm_result_class objects corresponding to each fiber segment
+    """
+    print(f"Loading results in {basePath}")
+    
+    fiber_span      = load_fiber_span(basePath+'\\input_info\\')
+    input_signal    = load_InputSignal(basePath+'\\input_info\\')
+    
+    resultPath = os.path.join(basePath,"result_info")
+    with open(os.path.join(resultPath,"manifest.json")) as manifest_file:
+        manifest = json.load(manifest_file)
+    
+    if manifest["SSFM_solver_version"] != SSFM_solver_version:
+        print(f"Warning: results were computed with SSFM solver version {manifest['SSFM_solver_version']}, current version is {SSFM_solver_version}")
+    
+    dirs = (os.getcwd(), os.path.realpath(basePath))
+    
+    ssfm_result_list = []
+    for fiber_index, fiber in enumerate(fiber_span.fiber_list[:manifest["number_of_fibers"]]):
+        pulseMatrix    = load_result_matrix(resultPath,fiber_index,"pulseMatrix")
+        spectrumMatrix = load_result_matrix(resultPath,fiber_index,"spectrumMatrix")
+        
+        #Signal launched into this fiber is the first row of its matrices
+        fiber_input_signal = copy.copy(input_signal)
+        fiber_input_signal.amplitude = np.array(pulseMatrix[0,:])
+        fiber_input_signal.spectrum  = np.array(spectrumMatrix[0,:])
+        
+        #Results saved before z-locations were stored always use the z-steps of the fiber
+        z_array = None
+        if os.path.isfile(os.path.join(resultPath,f"fiber_{fiber_index}_z_array.npy")):
+            z_array = np.load(os.path.join(resultPath,f"fiber_{fiber_index}_z_array.npy"))
+        
+        ssfm_result = ssfm_result_class(fiber_input_signal,fiber,manifest["experimentName"],dirs,pulseMatrix,spectrumMatrix,z_array=z_array)
+        
+        for name, matrix in [("pulsePyramid",pulseMatrix), ("spectrumPyramid",spectrumMatrix)]:
+            if os.path.isfile(os.path.join(resultPath,f"fiber_{fiber_index}_{name}","pyramid.json")):
+                setattr(ssfm_result, name, load_power_pyramid(os.path.join(resultPath,f"fiber_{fiber_index}_{name}"),matrix))
+        
+        ssfm_result_list.append( ssfm_result )
+    
+    print(f"Successfully loaded results in {basePath}")
+    
+    return ssfm_result_list
+
+
+def NL_simple(fiber:fiber_class, timeFreq:timeFreq_class, pulse,dz):
+    return np.exp(1j*fiber.gamma*getPower(pulse)*dz)
+
+def NL_full(fiber:fiber_class, timeFreq:timeFreq_class, pulse,dz):
+    
+    fR = fiber.fR
+    freq = timeFreq.f
+    t = timeFreq.t
+    
+    f0 = timeFreq.centerFrequency
+    RamanInFreqDomain=fiber.RamanInFreqDomain_func(freq)
+
+    
+    NR_func = lambda current_pulse: (1-fR)*getPower(current_pulse)*current_pulse + fR*current_pulse*getPulseFromSpectrum(freq,getSpectrumFromPulse(t,getPower(current_pulse))*RamanInFreqDomain)
+    
+    NR_in_freq_domain = 1j*dz*fiber.gamma*(1.+freq/f0)*getPulseFromSpectrum(freq,NR_func(getSpectrumFromPulse(timeFreq.t, pulse)))
+    
+    
+    return np.exp( getPulseFromSpectrum(freq, NR_in_freq_domain) ) 
+    
+
+
+from collections import OrderedDict
+
+#Cache of linear operators shared by all fibers with identical parameters and grids.
+#Entries are evicted in least recently used order when the total size exceeds the cap.
+_operatorCache = OrderedDict()
+operatorCacheMaxBytes = 512*1024**2
+
+
+def clearOperatorCache():
+    """ 
+    Empties the cache of linear operators used by getDispersionAndLoss
+    """
+    _operatorCache.clear()
+
+
+def getDispersionAndLoss(fiber:fiber_class, timeFreq:timeFreq_class, dz):
+    """ 
+    Pre-calculates the linear operator for a single z-step
+    
+    Dispersion and loss are the same everywhere in the fiber, so the
+    exponentials for a full step and a half step can be computed once
+    and reused throughout the stepping loop. They are also stored in a 
+    cache keyed on the dispersion, loss, step size and frequency grid, 
+    so fibers, spans and runs with identical parameters in the same 
+    process reuse them instead of recomputing them. The returned arrays 
+    are shared and therefore read-only.
+    
+    Parameters:
+        fiber (fiber_class): Fiber whose dispersion and loss are applied
+        timeFreq (timeFreq_class): Contains info about discretized time and freq axes
+        dz (float): Step size in m
+        
+    Returns:
+        list(nparray,nparray): disp_and_loss for a full step of size dz and disp_and_loss_half_step for a step of size dz/2
+    """
+    f = timeFreq.f
+    key = (tuple(float(beta_n) for beta_n in fiber.beta_list),
+           float(fiber.alpha_Np_per_m),
+           float(dz),
+           len(f),
+           float(f[0]),
+           float(f[1]-f[0]))
+    
+    if key in _operatorCache:
+        _operatorCache.move_to_end(key)
+        return _operatorCache[key]
+    
+    #Pre-calculate dispersion term
+    dispterm=np.zeros_like(f)*1.0
+    for n, beta_n in enumerate(fiber.beta_list):
+        dispterm+=beta_n/math.factorial(n)*(2*pi*f)**(n+2)
+   
+    
+    #Pre-calculate effect of dispersion and loss as it's the same everywhere
+    disp_and_loss=np.exp(dz*(1j*dispterm-fiber.alpha_Np_per_m/2))
+    disp_and_loss_half_step = disp_and_loss**0.5
+    
+    disp_and_loss.setflags(write=False)
+    disp_and_loss_half_step.setflags(write=False)
+    
+    #Store operators and evict least recently used ones if cache is too large
+    entry_size = disp_and_loss.nbytes+disp_and_loss_half_step.nbytes
+    if entry_size <= operatorCacheMaxBytes:
+        _operatorCache[key] = (disp_and_loss, disp_and_loss_half_step)
+        total_size = np.sum([full.nbytes+half.nbytes for full, half in _operatorCache.values()])
+        while total_size > operatorCacheMaxBytes:
+            _, (full, half) = _operatorCache.popitem(last=False)
+            total_size -= full.nbytes+half.nbytes
+    
+    return disp_and_loss, disp_and_loss_half_step
+
+
+def propagateFieldThroughFiber(fiber:fiber_class,
+                               timeFreq:timeFreq_class,
+                               pulse,
+                               stepCallback=None,
+                               disp_and_loss_operators=None,
+                               length=None,
+                               numberOfSteps=None,
+                               startStep=0,
+                               initialState=None,
+                               stateCallback=None):
+    """ 
+    Propagates a single field through a single fiber using the SSFM
+    
+    Runs the stepping loop of the SSFM without creating folders, saving
+    files or printing anything, so it can be used by SSFM itself as well as
+    by the parallel schedulers running in worker processes. 
+    
+    Parameters:
+        fiber (fiber_class): Fiber through which the field is propagated
+        timeFreq (timeFreq_class): Contains info about discretized time and freq axes
+        pulse (nparray): Pulse amplitude at the start of the fiber in sqrt(W)
+        stepCallback=None (function) (optional): Called as stepCallback(z_step_index,spectrum) after every step with the spectrum at fiber.z_array[z_step_index+1]
+        disp_and_loss_operators=None (tuple) (optional): Pre-calculated (disp_and_loss, disp_and_loss_half_step) for this fiber, e.g. from shared memory. Computed with getDispersionAndLoss if None. 
+        length=None (float) (optional): Distance in m to propagate. Defaults to fiber.Length. Used to propagate through a segment of the fiber.
+        numberOfSteps=None (int) (optional): Number of steps to take. Defaults to fiber.numberOfSteps
+        startStep=0 (int) (optional): Index of first step to take. Used with initialState to continue an interrupted propagation.
+        initialState=None (nparray) (optional): Internal field at the start of step startStep, as passed to stateCallback. If None, pulse is launched at step 0. 
+        stateCallback=None (function) (optional): Called as stateCallback(z_step_index,state) with the internal field at the start of every step after the first, so the loop can be continued bit-identically from there
+        
+    Returns:
+        nparray: Pulse amplitude at the end of the fiber in sqrt(W)
+    
+    """
+    t = timeFreq.t
+    f = timeFreq.f
+    
+    dz = fiber.dz
+    if length is not None or numberOfSteps is not None:
+        if length is None:
+            length = fiber.Length
+        if numberOfSteps is None:
+            numberOfSteps = fiber.numberOfSteps
+        dz = length/numberOfSteps
+    else:
+        numberOfSteps = fiber.numberOfSteps
+    
+    if disp_and_loss_operators is None:
+        disp_and_loss_operators = getDispersionAndLoss(fiber, timeFreq, dz)
+    disp_and_loss, disp_and_loss_half_step = disp_and_loss_operators
+    
+    #Use simply NL model by default if Raman is ignored
+    NL_function = NL_simple
+    if fiber.ramanModel != "None":
+        NL_function = NL_full
+    
+    #
+    #Apply half dispersion step
+    #Start loop
+    #   Apply full NL step
+    #   Apply full Disp step
+    #End loop
+    #Apply half dispersion step
+    if initialState is None:
+        spectrum = getSpectrumFromPulse(t, pulse)*disp_and_loss_half_step
+        pulse    = getPulseFromSpectrum(f, spectrum)
+        startStep = 0
+    else:
+        pulse    = np.copy(initialState)
+    
+    for z_step_index in range(startStep,numberOfSteps):   
+        
+        #Apply nonlinearity
+        pulse*=NL_function(fiber,timeFreq,pulse,dz) 
+        
+        #Go to spectral domain
+        spectrum = getSpectrumFromPulse(t, pulse)
+        
+        #Apply half dispersion step to spectrum and pass on results 
+        if stepCallback is not None:
+            stepCallback(z_step_index, spectrum*disp_and_loss_half_step)
+        
+        #Apply disp and loss and return to time domain. 
+        #The last step only gets the final half dispersion step. 
+        if z_step_index < numberOfSteps-1:
+            pulse=getPulseFromSpectrum(f, spectrum*disp_and_loss) 
+            
+            if stateCallback is not None:
+                stateCallback(z_step_index+1, pulse)
+    
+    return getPulseFromSpectrum(f, spectrum*disp_and_loss_half_step)
+    
+
+    
+
+import hashlib
+import shutil
+
+#Included in every run hash. Increase whenever a change to the solver changes its results, so old cache entries are no longer used.
+SSFM_solver_version = 3
+
+def getPrefixHashes(fiber_span:fiber_span_class, input_signal:input_signal_class, stepConfig=None):
+    """ 
+    Computes deterministic hashes identifying the output of every fiber in an SSFM run
+    
+    Hashes everything that determines the result of SSFM: the solver 
+    version, the time base, the parameters of the input signal and its 
+    actual amplitude (so custom signals and the particular noise realization
+    are covered), and then the parameters and number of steps of the 
+    fibers one at a time. Entry k identifies the output of fiber k, which
+    only depends on the input and fibers 0 to k, so two spans that share
+    their first fibers share the corresponding prefix hashes.
+    
+    Parameters:
+        fiber_span (fiber_span_class): Class holding fibers through which the signal is propagated
+        input_signal (input_signal_class): Class holding info about initial input signal
+        stepConfig=None (list) (optional): Additional step configuration to include in the hash
+        
+    Returns:
+        list: Hexadecimal SHA-256 hash for each prefix of the span
+    """
+    timeFreq = input_signal.timeFreq
+    
+    run_hash = hashlib.sha256()
+    run_hash.update(f"SSFM solver version {SSFM_solver_version}".encode())
+    run_hash.update(repr( (int(timeFreq.number_of_points), float(timeFreq.time_step), float(timeFreq.centerFrequency)) ).encode())
+    run_hash.update(repr( (float(input_signal.Amax), 
+                           float(input_signal.duration), 
+                           float(input_signal.time_offset_s), 
+                           float(input_signal.freq_offset_Hz), 
+                           float(input_signal.chirp), 
+                           str(input_signal.pulseType), 
+                           int(input_signal.order), 
+                           float(input_signal.noiseAmplitude)) ).encode())
+    run_hash.update(np.ascontiguousarray(input_signal.amplitude, dtype=complex).tobytes())
+    
+    if stepConfig is not None:
+        run_hash.update(repr( tuple(str(entry) for entry in stepConfig) ).encode())
+    
+    prefix_hashes = []
+    for fiber in fiber_span.fiber_list:
+        run_hash.update(repr( (float(fiber.Length), 
+                               int(fiber.numberOfSteps), 
+                               float(fiber.gamma), 
+                               [float(beta_n) for beta_n in fiber.beta_list], 
+                               float(fiber.alpha_dB_per_m), 
+                               str(fiber.ramanModel)) ).encode())
+        prefix_hashes.append(run_hash.hexdigest())
+    
+    return prefix_hashes
+
+
+def getRunHash(fiber_span:fiber_span_class, input_signal:input_signal_class, stepConfig=None):
+    """ 
+    Computes a deterministic hash identifying the result of an SSFM run
+    
+    Parameters:
+        fiber_span (fiber_span_class): Class holding fibers through which the signal is propagated
+        input_signal (input_signal_class): Class holding info about initial input signal
+        stepConfig=None (list) (optional): Additional step configuration to include in the hash
+        
+    Returns:
+        str: Hexadecimal SHA-256 hash. Identical to the prefix hash of the last fiber.
+    """
+    return getPrefixHashes(fiber_span, input_signal, stepConfig)[-1]
+
+
+#Class for caching results of SSFM on disk
+class ssfm_cache_class:
+    """
+    Class for storing results of SSFM runs on disk, keyed on span-prefix hashes. 
+    
+    Every entry holds the result of one fiber and is a folder named after 
+    the prefix hash from getPrefixHashes, containing its pulse and spectrum 
+    matrices as .npy files. The last row of the pulse matrix is the field 
+    at the fiber boundary, so a run can continue from the longest cached 
+    prefix of its span and only simulate the fibers after it. Matrices are
+    memory-mapped when loaded, so a cache hit takes milliseconds. When the
+    total size exceeds maxBytes, the least recently used entries are deleted.
+    
+    Attributes:
+        cacheDirectory (str): Folder holding the cache entries
+        maxBytes (int): Maximum total size of the cache in bytes
+    """
+    def __init__(self,cacheDirectory,maxBytes=10*1024**3):
+        """
+        Constructor for ssfm_cache_class
+        
+        Parameters:
+            self
+            cacheDirectory (str): Folder holding the cache entries. Created if it does not exist.
+            maxBytes=10*1024**3 (int) (optional): Maximum total size of the cache in bytes
+        """
+        self.cacheDirectory = os.path.realpath(cacheDirectory)
+        self.maxBytes = maxBytes
+        os.makedirs(self.cacheDirectory,exist_ok=True)
+    
+    def getEntryPath(self,prefixHash):
+        """
+        Returns:
+            str: Path to the folder holding the entry for prefixHash
+        """
+        return os.path.join(self.cacheDirectory,prefixHash)
+    
+    def contains(self,prefixHash):
+        """
+        Returns:
+            bool: True if an entry for prefixHash exists
+        """
+        return os.path.isfile(os.path.join(self.getEntryPath(prefixHash),"spectrumMatrix.npy"))
+    
+    def getNumberOfCachedFibers(self,prefix_hashes):
+        """
+        Finds the longest prefix of a span whose results are all in the cache
+        
+        Parameters:
+            self
+            prefix_hashes (list): Hashes from getPrefixHashes
+            
+        Returns:
+            int: Number of fibers at the start of the span that can be loaded from the cache 
+        """
+        number_of_cached_fibers = 0
+        for prefixHash in prefix_hashes:
+            if not self.contains(prefixHash):
+                break
+            number_of_cached_fibers += 1
+        return number_of_cached_fibers
+    
+    def load(self,prefixHash):
+        """
+        Loads the matrices stored for prefixHash
+        
+        Parameters:
+            self
+            prefixHash (str): Hash from getPrefixHashes
+            
+        Returns:
+            list(nparray,nparray): pulseMatrix and spectrumMatrix as read-only memory-mapped arrays. None if prefixHash is not in the cache. 
+        """
+        if not self.contains(prefixHash):
+            return None
+        
+        entryPath = self.getEntryPath(prefixHash)
+        
+        #Mark entry as recently used
+        os.utime(entryPath)
+        
+        return (np.load(os.path.join(entryPath,"pulseMatrix.npy"),mmap_mode="r"),
+                np.load(os.path.join(entryPath,"spectrumMatrix.npy"),mmap_mode="r"))
+    
+    def save(self,prefixHash,ssfm_result):
+        """
+        Stores the matrices of ssfm_result under prefixHash and evicts old entries if the cache is too large
+        
+        The entry is written to a temporary folder first and then renamed, so 
+        an interrupted save never leaves a partial entry behind.
+        
+        Parameters:
+            self
+            prefixHash (str): Hash from getPrefixHashes
+            ssfm_result (ssfm_result_class): Result of the last fiber in the prefix
+        """
+        entryPath = self.getEntryPath(prefixHash)
+        if self.contains(prefixHash):
+            return
+        
+        entry_size = ssfm_result.pulseMatrix.nbytes+ssfm_result.spectrumMatrix.nbytes
+        if entry_size > self.maxBytes:
+            print(f"Result is larger than cache size ({entry_size} > {self.maxBytes} bytes) and is not cached")
+            return
+        
+        tempPath = entryPath+f".tmp{os.getpid()}"
+        os.makedirs(tempPath,exist_ok=True)
+        np.save(os.path.join(tempPath,"pulseMatrix.npy"), ssfm_result.pulseMatrix)
+        np.save(os.path.join(tempPath,"spectrumMatrix.npy"), ssfm_result.spectrumMatrix)
+        
+        try:
+            shutil.rmtree(entryPath,ignore_errors=True)
+            os.rename(tempPath,entryPath)
+        except OSError:
+            #Another process stored the same entry in the meantime
+            shutil.rmtree(tempPath,ignore_errors=True)
+        
+        self.evict(keep=prefixHash)
+    
+    def evict(self,keep=None):
+        """
+        Deletes least recently used entries until the cache is no larger than maxBytes
+        
+        Parameters:
+            self
+            keep=None (str) (optional): Hash of entry that must not be deleted
+        """
+        entries = []
+        for entry in os.scandir(self.cacheDirectory):
+            if entry.is_dir() and ".tmp" not in entry.name:
+                size = np.sum([file.stat().st_size for file in os.scandir(entry.path)])
+                entries.append( (entry.stat().st_mtime, entry.name, size) )
+        
+        total_size = np.sum([size for _, _, size in entries])
+        
+        for _, name, size in sorted(entries):
+            if total_size <= self.maxBytes:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(os.path.join(self.cacheDirectory,name),ignore_errors=True)
+            total_size -= size
+
+
+#Class for deciding which z-steps are stored by SSFM
+class snapshot_policy_class:
+    """
+    Class for storing z-steps only where the field changes. 
+    
+    A z-step is stored when a cheap distance metric between it and the last
+    stored z-step exceeds a threshold, so long stretches of nearly linear 
+    propagation are stored sparsely while rapid changes, e.g. during wave 
+    breaking, are stored at every step. 
+    
+    Attributes:
+        threshold (float): Relative change needed to store a z-step
+        metric (str): "spectrum" for the relative L2 change of the spectrum or "peakPower" for the relative change of the peak power of the pulse
+        maxStepsBetweenSnapshots (int): If specified, store at least every this many steps
+    """
+    def __init__(self,threshold=0.01,metric="spectrum",maxStepsBetweenSnapshots=None):
+        """
+        Constructor for snapshot_policy_class
+        
+        Parameters:
+            self
+            threshold=0.01 (float) (optional): Relative change needed to store a z-step
+            metric="spectrum" (str) (optional): "spectrum" or "peakPower"
+            maxStepsBetweenSnapshots=None (int) (optional): If specified, store at least every this many steps
+        """
+        assert metric in ["spectrum","peakPower"], f"ERROR: metric must be 'spectrum' or 'peakPower', not '{metric}'!!!"
+        self.threshold = threshold
+        self.metric = metric
+        self.maxStepsBetweenSnapshots = maxStepsBetweenSnapshots
+    
+    def getPeakPower(self,spectrum):
+        return np.max(getPower(getPulseFromSpectrum(self.timeFreq.f, spectrum)))
+    
+    def reset(self,timeFreq,spectrum):
+        """
+        Starts a new fiber with spectrum as the last stored z-step
+        
+        Parameters:
+            self
+            timeFreq (timeFreq_class): Contains info about discretized time and freq axes
+            spectrum (nparray): Spectrum at the start of the fiber
+        """
+        self.timeFreq = timeFreq
+        self.lastSpectrum = spectrum
+        self.stepsSinceSnapshot = 0
+        if self.metric == "peakPower":
+            self.lastPeakPower = self.getPeakPower(spectrum)
+    
+    def isSnapshot(self,spectrum):
+        """
+        Determines if spectrum differs enough from the last stored z-step to be stored
+        
+        Parameters:
+            self
+            spectrum (nparray): Spectrum at current z-step
+            
+        Returns:
+            bool: True if the z-step should be stored. It then becomes the last stored z-step.
+        """
+        self.stepsSinceSnapshot += 1
+        
+        if self.metric == "spectrum":
+            change = np.linalg.norm(spectrum-self.lastSpectrum)/np.linalg.norm(self.lastSpectrum)
+        else:
+            peakPower = self.getPeakPower(spectrum)
+            change = np.abs(peakPower-self.lastPeakPower)/self.lastPeakPower
+        
+        forced = self.maxStepsBetweenSnapshots is not None and self.stepsSinceSnapshot >= self.maxStepsBetweenSnapshots
+        if change < self.threshold and forced == False:
+            return False
+        
+        self.lastSpectrum = spectrum
+        self.stepsSinceSnapshot = 0
+        if self.metric == "peakPower":
+            self.lastPeakPower = peakPower
+        return True
+
+
+import pickle
+from time import perf_counter
+
+#Class for writing and reading checkpoints of SSFM runs
+class ssfm_checkpoint_class:
+    """
+    Class for periodically saving the state of an SSFM run, so it can be resumed with resume_SSFM.
+    
+    The fiber span and input signal are pickled once when the run starts. 
+    While it runs, results are written directly to memory-mapped .npy files
+    in the result_info folder, and at most every checkpointInterval seconds
+    a small checkpoint file with the fiber index, z-step index, internal 
+    field of the stepping loop and state of the random number generator is
+    written. Checkpoints are always written at the start of the run and at
+    the end of every fiber. Checkpoints are written to a temporary file and then renamed,
+    so an interrupted run always leaves a complete checkpoint behind. 
+    
+    Attributes:
+        runDirectory (str): Output folder of the run
+        checkpointInterval (float): Minimum time in seconds between checkpoints
+        checkpointPath (str): Folder holding checkpoint files
+        resultPath (str): Folder holding memory-mapped results
+    """
+    def __init__(self,runDirectory,checkpointInterval):
+        """
+        Constructor for ssfm_checkpoint_class
+        
+        Parameters:
+            self
+            runDirectory (str): Output folder of the run
+            checkpointInterval (float): Minimum time in seconds between checkpoints
+        """
+        self.runDirectory = runDirectory
+        self.checkpointInterval = checkpointInterval
+        self.checkpointPath = os.path.join(runDirectory,"checkpoint")
+        self.resultPath = os.path.join(runDirectory,"result_info")
+        self.lastSaveTime = perf_counter()
+        
+        os.makedirs(self.checkpointPath,exist_ok=True)
+        os.makedirs(self.resultPath,exist_ok=True)
+    
+    def saveRun(self,fiber_span,input_signal,experimentName):
+        """
+        Stores everything needed to restart the run. Must be called before input_signal is modified by SSFM.
+        """
+        with open(os.path.join(self.checkpointPath,"run.pkl"),"wb") as run_file:
+            pickle.dump({"fiber_span": fiber_span,
+                         "input_signal": input_signal,
+                         "experimentName": experimentName},run_file)
+    
+    def loadRun(self):
+        """
+        Returns:
+            dict: fiber_span, input_signal and experimentName stored by saveRun
+        """
+        with open(os.path.join(self.checkpointPath,"run.pkl"),"rb") as run_file:
+            return pickle.load(run_file)
+    
+    def getMatrix(self,fiber_index,name,shape=None):
+        """
+        Opens a memory-mapped result matrix, creating it if shape is specified
+        
+        Parameters:
+            self
+            fiber_index (int): Index of fiber in span
+            name (str): "pulseMatrix" or "spectrumMatrix"
+            shape=None (tuple) (optional): Shape of new matrix. If None, the existing file is opened.
+            
+        Returns:
+            memmap: Writable matrix backed by .npy file in result_info folder
+        """
+        path = os.path.join(self.resultPath,f"fiber_{fiber_index}_{name}.npy")
+        if shape is None:
+            return np.lib.format.open_memmap(path,mode="r+")
+        return np.lib.format.open_memmap(path,mode="w+",dtype=complex,shape=shape)
+    
+    def save(self,fiber_index,z_step_index,state,ssfm_result_list,force=False):
+        """
+        Writes a checkpoint if checkpointInterval has passed since the last one
+        
+        Parameters:
+            self
+            fiber_index (int): Index of fiber being propagated
+            z_step_index (int): Index of next step to take in that fiber
+            state (nparray): Internal field at the start of step z_step_index. None at the start of a fiber.
+            ssfm_result_list (list): Results written so far. Flushed to disk before the checkpoint is written.
+            force=False (bool) (optional): Write checkpoint regardless of time since the last one
+        """
+        if force == False and perf_counter()-self.lastSaveTime < self.checkpointInterval:
+            return
+        
+        for ssfm_result in ssfm_result_list:
+            if type(ssfm_result.pulseMatrix) == np.memmap:
+                ssfm_result.pulseMatrix.flush()
+                ssfm_result.spectrumMatrix.flush()
+        
+        _, rng_keys, rng_pos, rng_has_gauss, rng_cached_gaussian = np.random.get_state()
+        
+        tempPath = os.path.join(self.checkpointPath,f"checkpoint.tmp{os.getpid()}.npz")
+        with open(tempPath,"wb") as checkpoint_file:
+            np.savez(checkpoint_file,
+                     fiber_index = fiber_index,
+                     z_step_index = z_step_index,
+                     has_state = state is not None,
+                     state = np.zeros(0,dtype=complex) if state is None else state,
+                     rng_keys = rng_keys,
+                     rng_pos = rng_pos,
+                     rng_has_gauss = rng_has_gauss,
+                     rng_cached_gaussian = rng_cached_gaussian)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(tempPath,os.path.join(self.checkpointPath,"checkpoint.npz"))
+        
+        self.lastSaveTime = perf_counter()
+    
+    def load(self):
+        """
+        Reads the latest checkpoint and restores the state of the random number generator
+        
+        Returns:
+            list(int,int,nparray): fiber_index, z_step_index and internal field (None at the start of a fiber)
+        """
+        with np.load(os.path.join(self.checkpointPath,"checkpoint.npz")) as checkpoint:
+            np.random.set_state(("MT19937",
+                                 checkpoint["rng_keys"],
+                                 int(checkpoint["rng_pos"]),
+                                 int(checkpoint["rng_has_gauss"]),
+                                 float(checkpoint["rng_cached_gaussian"])))
+            state = np.array(checkpoint["state"]) if bool(checkpoint["has_state"]) else None
+            return int(checkpoint["fiber_index"]), int(checkpoint["z_step_index"]), state
+    
+    def remove(self):
+        """
+        Deletes checkpoint files once the run has finished
+        """
+        shutil.rmtree(self.checkpointPath,ignore_errors=True)
+
+
+import multiprocessing
+import queue
+
+def _runMonitor(messageQueue, t_ps, f_THz, savePath, showFlag):
+    """ 
+    Main loop of the process started by live_monitor_class
+    
+    Draws current power, current spectrum and the evolution of the power 
+    received so far, and redraws whenever a new message arrives. If 
+    savePath is specified, the figure is also saved there after every 
+    redraw, so runs on headless nodes can be watched too.
+    """
+    if showFlag == False:
+        plt.switch_backend("Agg")
+    
+    fig, (ax_pulse, ax_spectrum, ax_map) = plt.subplots(1,3,figsize=(15,4))
+    
+    pulse_line, = ax_pulse.plot(t_ps,np.zeros_like(t_ps))
+    ax_pulse.set_xlabel('Time [ps]')
+    ax_pulse.set_ylabel('Power [W]')
+    
+    spectrum_line, = ax_spectrum.plot(f_THz,np.zeros_like(f_THz))
+    ax_spectrum.set_xlabel('Freq. [THz]')
+    ax_spectrum.set_ylabel('PSD [dB]')
+    
+    ax_map.set_xlabel('Time [ps]')
+    ax_map.set_ylabel('Distance [m]')
+    image = None
+    
+    zvals = []
+    evolution = []
+    
+    while True:
+        message = messageQueue.get()
+        if message is None:
+            break
+        
+        fiber_index, z, P, Pf = message
+        zvals.append(z)
+        evolution.append(P)
+        
+        pulse_line.set_ydata(P)
+        ax_pulse.set_ylim(0,1.05*np.max(P)+1e-100)
+        ax_pulse.set_title(f'Fiber {fiber_index+1}, z = {z:.3g}m')
+        
+        Pf_dB = 10*np.log10(np.maximum(Pf/np.max(Pf),1e-10))
+        spectrum_line.set_ydata(Pf_dB)
+        ax_spectrum.set_ylim(-100,5)
+        
+        if len(zvals) > 1:
+            if image is not None:
+                image.remove()
+            image = drawEvolutionMap(ax_map,t_ps,np.array(zvals),np.array(evolution),cmap="jet")
+        
+        if savePath is not None:
+            fig.savefig(savePath,dpi=100)
+        if showFlag == True:
+            plt.pause(0.001)
+    
+    if showFlag == True:
+        plt.show()
+
+
+#Class for watching SSFM while it runs
+class live_monitor_class:
+    """
+    Class for showing the field while SSFM propagates it. 
+    
+    A separate process draws the plots, fed through a bounded queue. The 
+    solver only checks the time on each z-step, and at most every 
+    updateInterval seconds sends the current power and spectrum, max-pooled
+    to a few hundred points. If the drawing process falls behind, updates 
+    are dropped instead of waiting, so the monitor never slows the solver.
+    
+    Attributes:
+        nrange_pulse (int): Points on either side of the center shown in time domain
+        nrange_spectrum (int): Points on either side of the center shown in freq. domain
+        updateInterval (float): Smallest time in seconds between updates
+        points (int): Number of points sent for power and spectrum
+        savePath (str): If not None, the monitor figure is saved here on every update
+        showFlag (bool): Show the monitor window
+    """
+    def __init__(self, nrange_pulse, nrange_spectrum, updateInterval = 1.0, points = 512, maxQueueSize = 4, savePath = None, showFlag = True):
+        """
+        Constructor for live_monitor_class
+        
+        Parameters:
+            self
+            nrange_pulse (int): Points on either side of the center shown in time domain
+            nrange_spectrum (int): Points on either side of the center shown in freq. domain
+            updateInterval = 1.0 (float) (optional): Smallest time in seconds between updates
+            points = 512 (int) (optional): Number of points sent for power and spectrum
+            maxQueueSize = 4 (int) (optional): Number of updates that can wait to be drawn
+            savePath = None (str) (optional): If specified, the monitor figure is saved to this file on every update
+            showFlag = True (optional): Show the monitor window. Set to False on headless nodes and use savePath.
+        """
+        self.nrange_pulse = nrange_pulse
+        self.nrange_spectrum = nrange_spectrum
+        self.updateInterval = updateInterval
+        self.points = points
+        self.maxQueueSize = maxQueueSize
+        self.savePath = None if savePath is None else os.path.realpath(savePath)
+        self.showFlag = showFlag
+        
+        self.process = None
+        self.lastUpdate = -np.inf
+    
+    def start(self, timeFreq:timeFreq_class):
+        """
+        Starts the drawing process
+        
+        Parameters:
+            self
+            timeFreq (timeFreq_class): timeFreq for simulation
+        """
+        self.Nmin_pulse = np.max([int(timeFreq.number_of_points/2-self.nrange_pulse),0])
+        self.Nmax_pulse = np.min([int(timeFreq.number_of_points/2+self.nrange_pulse),timeFreq.number_of_points-1])
+        self.Nmin_spectrum = np.max([int(timeFreq.number_of_points/2-self.nrange_spectrum),0])
+        self.Nmax_spectrum = np.min([int(timeFreq.number_of_points/2+self.nrange_spectrum),timeFreq.number_of_points-1])
+        
+        self.pulseEdges = getBlockEdges(self.Nmax_pulse-self.Nmin_pulse,self.points)
+        self.spectrumEdges = getBlockEdges(self.Nmax_spectrum-self.Nmin_spectrum,self.points)
+        
+        t_ps = getBlockCenters(timeFreq.t[self.Nmin_pulse:self.Nmax_pulse]*1e12,self.pulseEdges)
+        f_THz = getBlockCenters((timeFreq.f[self.Nmin_spectrum:self.Nmax_spectrum]+timeFreq.centerFrequency)/1e12,self.spectrumEdges)
+        
+        self.f = timeFreq.f
+        self.queue = multiprocessing.Queue(self.maxQueueSize)
+        self.process = multiprocessing.Process(target = _runMonitor, 
+                                               args = (self.queue, t_ps, f_THz, self.savePath, self.showFlag),
+                                               daemon = True)
+        self.process.start()
+        self.lastUpdate = -np.inf
+    
+    def update(self, fiber_index, z, spectrum, force = False):
+        """
+        Sends the current field to the drawing process if updateInterval has passed
+        
+        Parameters:
+            self
+            fiber_index (int): Index of fiber in span
+            z (float): Distance from the start of the span in m
+            spectrum (nparray): Current spectrum
+            force = False (optional): Send regardless of the time since the last update
+        """
+        now = perf_counter()
+        if force == False and now-self.lastUpdate < self.updateInterval:
+            return
+        self.lastUpdate = now
+        
+        P = np.maximum.reduceat(getPower(getPulseFromSpectrum(self.f, spectrum)[self.Nmin_pulse:self.Nmax_pulse]),self.pulseEdges)
+        Pf = np.maximum.reduceat(getPower(spectrum[self.Nmin_spectrum:self.Nmax_spectrum]),self.spectrumEdges)
+        
+        try:
+            self.queue.put_nowait((fiber_index, float(z), P, Pf))
+        except queue.Full:
+            pass
+    
+    def close(self):
+        """
+        Tells the drawing process that the run has finished
+        
+        The window stays open until it is closed by the user or the Python 
+        session that ran SSFM exits, since the drawing process is a daemon 
+        and is stopped together with its parent. 
+        
+        Parameters:
+            self
+        """
+        if self.process is None:
+            return
+        try:
+            self.queue.put(None, timeout = 10*self.updateInterval)
+        except queue.Full:
+            self.process.terminate()
+        self.process = None
+
+
+def SSFM(fiber_span:fiber_span_class,
+         input_signal:input_signal_class,
+         experimentName ="most_recent_run",
+         showProgressFlag = False,
+         resultCache = None,
+         saveResultsFlag = False,
+         resultCompression = None,
+         checkpointInterval = None,
+         timeWindow = None,
+         frequencyWindow = None,
+         snapshotPolicy = None,
+         resultErrorBound = None,
+         buildPyramidsFlag = False,
+         monitor = None):
+    """ 
+    Runs the Split-Step Fourier method and calculates field throughout fiber
+    
+    Runs the SSFM to solve the NLSE with the specified parameters. Goes through the following steps:
+        1) Create folder for saving input config and results
+        2) Loops over fibers in fiber_span. Gets zsteps for each and runs the SSFM
+        3) Stores results of each fiber in a separate ssfm_result_class and uses pulse at the end as input to next one
+        4) Saves the matrices of all fibers and returns list of ssfm_result_class objects
+    
+    Parameters:
+        fiber_span (fiber_span_class): Class holding fibers through which the signal is propagated
+        input_signal (input_signal_class): Class holding info about initial input signal
+        numberOfSteps = 2**10 (optional): Number of z-steps taken during SSFM. 
+        experimentName ="most_recent_run" (optional): Name of folder for present simulation.
+        showProgressFlag = False (optional): Print progress through each fiber
+        resultCache = None (ssfm_cache_class) (optional): If specified, results for the longest prefix of the span that has been simulated before with the same input are loaded from this cache, so only the remaining fibers are simulated. New results are stored in it.
+        saveResultsFlag = False (optional): Save pulse and spectrum matrices to the result_info folder so they can be loaded with load_results. Implied by resultCompression, resultErrorBound and buildPyramidsFlag.
+        resultCompression = None (str) (optional): If specified, save results as chunked archives with this compression instead of .npy files. See saveResults.
+        checkpointInterval = None (float) (optional): If specified, write a checkpoint at most this often in seconds, so the run can be continued with resume_SSFM if it is interrupted. Results are then always stored as .npy files in the result_info folder. 
+        timeWindow = None (storage_window_class) (optional): If specified, only store this window of the pulse for every z-step. Cannot be combined with checkpointInterval.
+        frequencyWindow = None (storage_window_class) (optional): If specified, only store this window of the spectrum for every z-step. Cannot be combined with checkpointInterval.
+        snapshotPolicy = None (snapshot_policy_class) (optional): If specified, only store z-steps where the field has changed enough since the last stored one. Cannot be combined with checkpointInterval.
+        resultErrorBound = None (float) (optional): If specified, save results as keyframes and quantized differences between z-steps with this error bound relative to the largest value. See saveDeltaMatrix.
+        buildPyramidsFlag = False (optional): Build power pyramids of every result after propagation and save them with the results, so plots can read reduced resolutions. See buildPowerPyramid.
+        monitor = None (live_monitor_class) (optional): If specified, show the current power, spectrum and evolution while the run progresses
+        
+    Returns:
+        list: List of ssfm_result_class corresponding to each fiber segment.  
+    
+    """
+    print("########### Initializing SSFM!!! ###########")
+    
+    assert checkpointInterval is None or (timeWindow is None and frequencyWindow is None and snapshotPolicy is None), "ERROR: Storage windows and snapshot policies cannot be combined with checkpoints!!!"
+    
+    #Hashes must be computed before input_signal is modified below
+    prefix_hashes = None
+    if resultCache is not None:
+        prefix_hashes = getPrefixHashes(fiber_span, input_signal)
+    
+    
+    #Create output directory, switch to it and return appropriate paths and current time
+    dirs , current_time = createOutputDirectory(experimentName)
+    
+    
+    #Make new folder to hold info about the input signal and fiber span
+    current_dir = dirs[1]
+    
+    newFolderName = "input_info\\"
+    newFolderPath = newFolderName
+    os.makedirs(newFolderPath,exist_ok=True)
+    os.chdir(newFolderPath)
+
+    #Save parameters of fiber span to file in directory
+    fiber_span.saveFiberSpan()
+    
+    #Save input signal parameters
+    input_signal.saveInputSignal()
+    
+    
+    
+    #Return to main output directory
+    os.chdir(current_dir)
+    
+    checkpoint = None
+    if checkpointInterval is not None:
+        checkpoint = ssfm_checkpoint_class(current_dir,checkpointInterval)
+        checkpoint.saveRun(fiber_span,input_signal,experimentName)
+        checkpoint.save(0,0,None,[],force=True)
+    
+    return propagateThroughSpan(fiber_span,
+                                input_signal,
+                                experimentName,
+                                dirs,
+                                current_time,
+                                showProgressFlag,
+                                resultCache,
+                                prefix_hashes,
+                                saveResultsFlag,
+                                resultCompression,
+                                checkpoint,
+                                timeWindow = timeWindow,
+                                frequencyWindow = frequencyWindow,
+                                snapshotPolicy = snapshotPolicy,
+                                resultErrorBound = resultErrorBound,
+                                buildPyramidsFlag = buildPyramidsFlag,
+                                monitor = monitor)
+
+
+def resume_SSFM(basePath, showProgressFlag = False, resultCache = None, monitor = None):
+    """ 
+    Continues an interrupted SSFM run from its latest checkpoint
+    
+    The run must have been started with checkpointInterval specified. 
+    Results are bit-identical to those of an uninterrupted run. 
+    
+    Parameters:
+        basePath (str): Output folder of the interrupted run
+        showProgressFlag = False (optional): Print progress through each fiber
+        resultCache = None (ssfm_cache_class) (optional): If specified, results of the remaining fibers are stored in it.
+        monitor = None (live_monitor_class) (optional): If specified, show the current power, spectrum and evolution while the run progresses
+        
+    Returns:
+        list: List of ssfm_result_class corresponding to each fiber segment.  
+    """
+    print(f"########### Resuming SSFM in {basePath} ###########")
+    
+    dirs = (os.getcwd(), os.path.join(os.path.realpath(basePath),''))
+    os.chdir(dirs[1])
+    
+    checkpoint = ssfm_checkpoint_class(dirs[1],0.0)
+    run = checkpoint.loadRun()
+    fiber_index, z_step_index, state = checkpoint.load()
+    
+    print(f"Continuing from step {z_step_index} in fiber number {fiber_index+1}")
+    
+    prefix_hashes = None
+    if resultCache is not None:
+        prefix_hashes = getPrefixHashes(run["fiber_span"], run["input_signal"])
+    
+    return propagateThroughSpan(run["fiber_span"],
+                                run["input_signal"],
+                                run["experimentName"],
+                                dirs,
+                                datetime.now(),
+                                showProgressFlag,
+                                resultCache,
+                                prefix_hashes,
+                                True,
+                                None,
+                                checkpoint,
+                                (fiber_index, z_step_index, state),
+                                monitor = monitor)
+
+
+def propagateThroughSpan(fiber_span:fiber_span_class,
+                         input_signal:input_signal_class,
+                         experimentName,
+                         dirs,
+                         current_time,
+                         showProgressFlag,
+                         resultCache,
+                         prefix_hashes,
+                         saveResultsFlag,
+                         resultCompression,
+                         checkpoint,
+                         start = None,
+                         timeWindow = None,
+                         frequencyWindow = None,
+                         snapshotPolicy = None,
+                         resultErrorBound = None,
+                         buildPyramidsFlag = False,
+                         monitor = None):
+    """ 
+    Runs the loop over fibers for SSFM and resume_SSFM
+    
+    Parameters:
+        fiber_span (fiber_span_class): Class holding fibers through which the signal is propagated
+        input_signal (input_signal_class): Class holding info about initial input signal
+        experimentName (str): Name of experiment
+        dirs (tuple): Directory where current script is located and the directory where output is saved. Output directory must be the current directory.
+        current_time (datetime): Start time of run
+        showProgressFlag (bool): Print progress through each fiber
+        resultCache (ssfm_cache_class): Cache to load and store results. May be None.
+        prefix_hashes (list): Hashes from getPrefixHashes for original input_signal. None if resultCache is None.
+        saveResultsFlag (bool): Save pulse and spectrum matrices to the result_info folder
+        resultCompression (str): Compression for saveResults. May be None.
+        checkpoint (ssfm_checkpoint_class): Writes checkpoints and stores results in memory-mapped files. May be None.
+        start = None (tuple) (optional): fiber_index, z_step_index and internal field from checkpoint to continue from
+        timeWindow = None (storage_window_class) (optional): Window of the pulse stored for every z-step
+        frequencyWindow = None (storage_window_class) (optional): Window of the spectrum stored for every z-step
+        snapshotPolicy = None (snapshot_policy_class) (optional): Selects which z-steps are stored
+        resultErrorBound = None (float) (optional): Error bound for saving results with saveDeltaMatrix
+        buildPyramidsFlag = False (optional): Build power pyramids of every result after propagation
+        monitor = None (live_monitor_class) (optional): Receives the spectrum after every z-step
+        
+    Returns:
+        list: List of ssfm_result_class corresponding to each fiber segment.  
+    """
+    base_dir    = dirs[0]
+    current_dir = dirs[1]
+    
+    f = input_signal.timeFreq.f
+    
+    number_of_cached_fibers = 0
+    if resultCache is not None:
+        number_of_cached_fibers = resultCache.getNumberOfCachedFibers(prefix_hashes)
+    
+    start_fiber_index, start_step, start_state = 0, 0, None
+    if start is not None:
+        start_fiber_index, start_step, start_state = start
+    
+    #TODO: Make sure code handles current_input_signal correctly for concatenated fibers!!!
+    current_input_signal = input_signal
+    
+    ssfm_result_list = []
+    
+    if number_of_cached_fibers > 0:
+        print(f"Loading results of first {number_of_cached_fibers} out of {fiber_span.number_of_fibers_in_span} fibers from cache")
+    
+    print(f"Starting SSFM loop over {len(fiber_span.fiber_list)} fibers")
+    
+    if monitor is not None:
+        monitor.start(input_signal.timeFreq)
+    
+    #Close the monitor even if propagation fails or is interrupted
+    try:
+        for fiber_index, fiber in enumerate(fiber_span.fiber_list):
+    
+            #Fibers completed before the checkpoint are read from the result_info folder
+            if fiber_index < start_fiber_index:
+                pulseMatrix, spectrumMatrix = checkpoint.getMatrix(fiber_index,"pulseMatrix"), checkpoint.getMatrix(fiber_index,"spectrumMatrix")
+                ssfm_result_list.append( ssfm_result_class(current_input_signal,fiber,experimentName,dirs,pulseMatrix,spectrumMatrix) )
+            
+                current_input_signal.amplitude = np.copy(pulseMatrix[-1,:])
+                current_input_signal.spectrum  = np.copy(spectrumMatrix[-1,:])
+                continue
+    
+            #Resume from the longest prefix of the span found in the cache
+            if fiber_index < number_of_cached_fibers:
+                pulseMatrix, spectrumMatrix = resultCache.load(prefix_hashes[fiber_index])
+                if checkpoint is not None:
+                    pulseMatrix, spectrumMatrix = np.copy(pulseMatrix), np.copy(spectrumMatrix)
+                    checkpoint.getMatrix(fiber_index,"pulseMatrix",pulseMatrix.shape)[:] = pulseMatrix
+                    checkpoint.getMatrix(fiber_index,"spectrumMatrix",spectrumMatrix.shape)[:] = spectrumMatrix
+                ssfm_result_list.append( ssfm_result_class(current_input_signal,fiber,experimentName,dirs,pulseMatrix,spectrumMatrix) )
+            
+                current_input_signal.amplitude = np.copy(pulseMatrix[-1,:])
+                current_input_signal.spectrum  = np.copy(spectrumMatrix[-1,:])
+                continue
+    
+            print(f"Propagating through fiber number {fiber_index+1} out of {fiber_span.number_of_fibers_in_span}")
+ 
+    
+        
+            #Initialize arrays to store pulse and spectrum throughout fiber.
+            #With a snapshot policy, the number of stored z-steps is only known afterwards.
+            if snapshotPolicy is not None:
+                ssfm_result = None
+                snapshot_z_list = []
+                snapshot_spectrum_list = []
+                snapshotPolicy.reset(input_signal.timeFreq, current_input_signal.spectrum)
+            elif checkpoint is None:
+                ssfm_result = ssfm_result_class(current_input_signal,fiber,experimentName,dirs,timeWindow=timeWindow,frequencyWindow=frequencyWindow)
+            elif fiber_index == start_fiber_index and start_state is not None:
+                ssfm_result = ssfm_result_class(current_input_signal,fiber,experimentName,dirs,
+                                                checkpoint.getMatrix(fiber_index,"pulseMatrix"),
+                                                checkpoint.getMatrix(fiber_index,"spectrumMatrix"))
+            else:
+                shape = (len(fiber.z_array),input_signal.timeFreq.number_of_points)
+                ssfm_result = ssfm_result_class(current_input_signal,fiber,experimentName,dirs,
+                                                checkpoint.getMatrix(fiber_index,"pulseMatrix",shape),
+                                                checkpoint.getMatrix(fiber_index,"spectrumMatrix",shape))
+                ssfm_result.pulseMatrix[0,:] = np.copy(current_input_signal.amplitude)
+                ssfm_result.spectrumMatrix[0,:] = np.copy(current_input_signal.spectrum)
+
+    
+            newFolderName = "Length_info\\"
+            newFolderPath = newFolderName
+            os.makedirs(newFolderPath,exist_ok=True)
+            os.chdir(newFolderPath)
+
+            #Print simulation info to both terminal and .txt file in output folder
+            describeInputConfig(current_time, fiber,  current_input_signal,fiber_index)
+        
+            #Return to main output directory
+            os.chdir(current_dir)
+        
+            print(f"Running SSFM with {fiber.numberOfSteps} steps")
+            updates = 0
+            z_offset = np.sum([previous_fiber.Length for previous_fiber in fiber_span.fiber_list[:fiber_index]])
+        
+            def storeStep(z_step_index,spectrum):
+                nonlocal updates
+            
+                #Store results
+                if snapshotPolicy is None:
+                    ssfm_result.spectrumMatrix[z_step_index+1,:]=spectrum
+                    ssfm_result.pulseMatrix[z_step_index+1,:]=getPulseFromSpectrum(f, spectrum)
+                elif snapshotPolicy.isSnapshot(spectrum) or z_step_index == fiber.numberOfSteps-1:
+                    snapshot_z_list.append(fiber.z_array[z_step_index+1])
+                    snapshot_spectrum_list.append(spectrum)
+            
+                if monitor is not None:
+                    monitor.update(fiber_index, z_offset+fiber.z_array[z_step_index+1], spectrum, force = z_step_index == fiber.numberOfSteps-1)
+
+                finished = 100*(z_step_index/fiber.numberOfSteps)
+                if divmod(finished, 10)[0] > updates and showProgressFlag == True:
+                    updates += 1
+                    print(f"SSFM progress through fiber number {fiber_index+1} = {np.floor(finished):.2f}%")
+        
+            def storeState(z_step_index,state):
+                checkpoint.save(fiber_index,z_step_index,state,ssfm_result_list+[ssfm_result])
+        
+            if fiber_index == start_fiber_index and start_state is not None:
+                propagateFieldThroughFiber(fiber,
+                                           input_signal.timeFreq,
+                                           current_input_signal.amplitude,
+                                           stepCallback=storeStep,
+                                           startStep=start_step,
+                                           initialState=start_state,
+                                           stateCallback=storeState)
+            else:
+                propagateFieldThroughFiber(fiber,
+                                           input_signal.timeFreq,
+                                           current_input_signal.amplitude,
+                                           stepCallback=storeStep,
+                                           stateCallback=None if checkpoint is None else storeState)
+        
+            if snapshotPolicy is not None:
+                ssfm_result = ssfm_result_class(current_input_signal,fiber,experimentName,dirs,
+                                                timeWindow=timeWindow,
+                                                frequencyWindow=frequencyWindow,
+                                                z_array=np.append(fiber.z_array[0],snapshot_z_list))
+                for row_index, spectrum in enumerate(snapshot_spectrum_list):
+                    ssfm_result.spectrumMatrix[row_index+1,:]=spectrum
+                    ssfm_result.pulseMatrix[row_index+1,:]=getPulseFromSpectrum(f, spectrum)
+            
+                print(f"Stored {len(ssfm_result.z_array)} out of {len(fiber.z_array)} z-steps")
+            
+            
+            #Append list of output results
+        
+            ssfm_result_list.append(ssfm_result)
+        
+            #Windowed or thinned results are incomplete and must not be loaded by runs without them
+            if resultCache is not None and timeWindow is None and frequencyWindow is None and snapshotPolicy is None:
+                resultCache.save(prefix_hashes[fiber_index], ssfm_result)
+        
+            #Take signal at output of this fiber and feed it into the next one
+            current_input_signal.amplitude = np.copy(ssfm_result.pulseMatrix[-1,:])
+            current_input_signal.spectrum  = np.copy(ssfm_result.spectrumMatrix[-1,:])
+        
+            if checkpoint is not None:
+                checkpoint.save(fiber_index+1,0,None,ssfm_result_list,force=True)
+        
+    finally:
+        if monitor is not None:
+            monitor.close()
+
+    print("Finished running SSFM!!!")
+    
+    if buildPyramidsFlag == True:
+        for ssfm_result in ssfm_result_list:
+            ssfm_result.buildPyramids()
+    
+    #Save computed matrices so the run can be plotted later without recomputing it
+    if checkpoint is not None:
+        for fiber_index, ssfm_result in enumerate(ssfm_result_list):
+            if type(ssfm_result.pulseMatrix) == np.memmap:
+                ssfm_result.pulseMatrix.flush()
+                ssfm_result.spectrumMatrix.flush()
+            savePyramids(ssfm_result, checkpoint.resultPath, fiber_index)
+        saveResultManifest(ssfm_result_list, checkpoint.resultPath, "npy")
+        checkpoint.remove()
+    elif saveResultsFlag == True or resultCompression is not None or resultErrorBound is not None or buildPyramidsFlag == True:
+        saveResults(ssfm_result_list, os.path.join(current_dir,"result_info"), resultCompression, deltaErrorBound = resultErrorBound)
+    
+    #Exit current output directory and return to base directory.
+    os.chdir(base_dir)
+
+             
+    return ssfm_result_list
+
+
+
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+
+
+def attachSharedMemory(name):
+    """ 
+    Attaches to an existing block of shared memory without taking ownership
+    
+    Before Python 3.13, every process that attaches to a SharedMemory block
+    registers it with the resource tracker, which then unlinks it when that
+    process exits. Worker processes must not do this, as the block is owned
+    and unlinked by the process that created it.
+    
+    Parameters:
+        name (str): Name of the shared memory block
+        
+    Returns:
+        SharedMemory: Handle to the shared memory block
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        #Older Python versions have no track argument, so skip registration instead
+        from multiprocessing import resource_tracker
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class shared_array_class:
+    """
+    Class for storing a numpy array in shared memory. 
+    
+    When an instance is pickled, e.g. to be sent to a worker process, only 
+    the name, shape and dtype of the shared memory block are sent. Unpickling
+    attaches to the existing block, so workers read and write the same memory
+    as the process that created it without any copying.
+    
+    Attributes:
+        name (str): Name of the shared memory block
+        shape (tuple): Shape of array
+        dtype (np.dtype): Data type of array
+        owner (bool): True in the process that created the block and is responsible for unlinking it
+        shm (SharedMemory): Handle to the shared memory block
+        array (nparray): Numpy array backed by the shared memory block
+    """
+    def __init__(self,shape,dtype=complex):
+        """
+        Constructor for shared_array_class. Allocates a new shared memory block.
+        
+        Parameters:
+            self
+            shape (tuple): Shape of array
+            dtype=complex (np.dtype) (optional): Data type of array
+        """
+        self.shape = tuple(int(n) for n in shape)
+        self.dtype = np.dtype(dtype)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(self.shape))*self.dtype.itemsize,1))
+        self.name = self.shm.name
+        self.owner = True
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+    
+    def __getstate__(self):
+        return {"name":self.name, "shape":self.shape, "dtype":self.dtype.str}
+    
+    def __setstate__(self,state):
+        self.name  = state["name"]
+        self.shape = state["shape"]
+        self.dtype = np.dtype(state["dtype"])
+        self.shm = attachSharedMemory(self.name)
+        self.owner = False
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+    
+    def release(self):
+        """
+        Detaches from the shared memory block and frees it if this process owns it.
+        
+        Any views of self.array must be deleted before calling this function. 
+        
+        Parameters:
+            self
+        """
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def shareArray(array):
+    """ 
+    Copies a numpy array into a new block of shared memory
+    
+    Parameters:
+        array (nparray): Array to be shared
+        
+    Returns:
+        shared_array_class: Shared copy of array
+    """
+    shared_array = shared_array_class(np.shape(array),np.asarray(array).dtype)
+    shared_array.array[...] = array
+    return shared_array
+
+
+class shared_timeFreq_class(timeFreq_class):
+    """
+    Class for sharing a timeFreq_class between processes. 
+    
+    Behaves exactly like the timeFreq_class it is constructed from, but 
+    self.t and self.f are stored in shared memory, so worker processes
+    attach to them instead of receiving pickled copies.
+    
+    Attributes:
+        shared_t (shared_array_class): Shared memory holding self.t
+        shared_f (shared_array_class): Shared memory holding self.f
+    """
+    def __init__(self,timeFreq:timeFreq_class):
+        """
+        Constructor for shared_timeFreq_class
+        
+        Parameters:
+            self
+            timeFreq (timeFreq_class): timeFreq whose time and freq. arrays are to be shared
+        """
+        self.__dict__.update(timeFreq.__dict__)
+        self.shared_t = shareArray(timeFreq.t)
+        self.shared_f = shareArray(timeFreq.f)
+        self.t = self.shared_t.array
+        self.f = self.shared_f.array
+        
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["t"], state["f"]
+        return state
+    
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self.t = self.shared_t.array
+        self.f = self.shared_f.array
+        
+    def release(self):
+        """
+        Releases the shared memory holding the time and freq. arrays
+        
+        Parameters:
+            self
+        """
+        self.t = None
+        self.f = None
+        self.shared_t.release()
+        self.shared_f.release()
+
+
+def shareDispersionAndLoss(fiber_span:fiber_span_class, timeFreq:timeFreq_class):
+    """ 
+    Pre-calculates linear operators for all fibers in span and stores them in shared memory
+    
+    Parameters:
+        fiber_span (fiber_span_class): Class holding fibers in span
+        timeFreq (timeFreq_class): Contains info about discretized time and freq axes
+        
+    Returns:
+        shared_array_class: Array of shape (number_of_fibers_in_span,2,number_of_points). Entry [k,0] is disp_and_loss for fiber k and [k,1] is disp_and_loss_half_step.
+    """
+    operators = shared_array_class((fiber_span.number_of_fibers_in_span,2,timeFreq.number_of_points))
+    for fiber_index, fiber in enumerate(fiber_span.fiber_list):
+        operators.array[fiber_index,0,:], operators.array[fiber_index,1,:] = getDispersionAndLoss(fiber, timeFreq, fiber.dz)
+    return operators
+
+
+#Per-process state of worker processes. Set once by _initWorker
+_workerState = {}
+
+def _initWorker(state):
+    """ 
+    Initializer for worker processes used by the parallel SSFM functions
+    
+    Stores fiber span, shared time base, shared operators and shared 
+    buffers once per worker, so tasks only need to send indices.
+    """
+    _workerState.update(state)
+
+
+def _runPipelineTask(slot, fiber_index):
+    """ 
+    Propagates the field stored in one slot of the shared buffer through one fiber
+    
+    The output field overwrites the input field in place, so only the slot
+    index has to be sent back to the scheduler.
+    """
+    field_buffer = _workerState["buffer"].array
+    operators = _workerState["operators"].array[fiber_index]
+    fiber = _workerState["fiber_span"].fiber_list[fiber_index]
+    
+    field_buffer[slot,:] = propagateFieldThroughFiber(fiber,
+                                                      _workerState["timeFreq"],
+                                                      field_buffer[slot,:],
+                                                      disp_and_loss_operators = operators)
+    return slot, fiber_index
+
+
+def SSFM_pipeline(fiber_span:fiber_span_class,
+                  timeFreq:timeFreq_class,
+                  input_amplitudes,
+                  number_of_workers = None,
+                  max_realizations_in_flight = None,
+                  outputCallback = None):
+    """ 
+    Propagates an ensemble of input fields through a fiber span in parallel
+    
+    Treats every (realization, fiber) pair as a task. Each realization 
+    occupies a slot in a shared memory buffer and is handed from one fiber
+    to the next as soon as the previous stage finishes, so fiber k of one 
+    realization runs at the same time as fiber k+1 of another. Only the
+    fields at the end of the span are kept, and at most 
+    max_realizations_in_flight fields are held in memory at any time.
+    
+    Parameters:
+        fiber_span (fiber_span_class): Class holding fibers through which the signals are propagated
+        timeFreq (timeFreq_class): Contains info about discretized time and freq axes
+        input_amplitudes (iterable): Input pulse amplitudes in sqrt(W) or input_signal_class objects. Consumed lazily, so a generator can be used for large ensembles.
+        number_of_workers = None (int) (optional): Number of worker processes. Defaults to os.cpu_count()
+        max_realizations_in_flight = None (int) (optional): Number of slots in the shared buffer. Defaults to 2*number_of_workers
+        outputCallback = None (function) (optional): Called as outputCallback(realization_index,output_amplitude) as soon as a realization reaches the end of the span. 
+        
+    Returns:
+        nparray: Array of shape (number_of_realizations, number_of_points) with the output amplitudes in sqrt(W). None if outputCallback is specified.  
+    
+    """
+    if number_of_workers is None:
+        number_of_workers = os.cpu_count()
+    if max_realizations_in_flight is None:
+        max_realizations_in_flight = 2*number_of_workers
+    
+    number_of_fibers = fiber_span.number_of_fibers_in_span
+    buffer_shape = (max_realizations_in_flight, timeFreq.number_of_points)
+    
+    shared_buffer = shared_array_class(buffer_shape)
+    field_buffer = shared_buffer.array
+    shared_timeFreq = shared_timeFreq_class(timeFreq)
+    operators = shareDispersionAndLoss(fiber_span, timeFreq)
+    
+    amplitude_iterator = iter(input_amplitudes)
+    free_slots = list(range(max_realizations_in_flight))
+    realization_in_slot = {}
+    outputs = {}
+    number_of_realizations = 0
+    
+    try:
+        with ProcessPoolExecutor(max_workers = number_of_workers,
+                                 initializer = _initWorker,
+                                 initargs = ({"fiber_span":fiber_span,
+                                              "timeFreq":shared_timeFreq,
+                                              "operators":operators,
+                                              "buffer":shared_buffer},)) as executor:
+            
+            pending = set()
+            
+            #Load a new realization into every free slot and start it in the first fiber 
+            def fillFreeSlots():
+                nonlocal number_of_realizations
+                while len(free_slots) > 0:
+                    next_input = next(amplitude_iterator, None)
+                    if next_input is None:
+                        return
+                    
+                    slot = free_slots.pop()
+                    field_buffer[slot,:] = getattr(next_input, "amplitude", next_input)
+                    realization_in_slot[slot] = number_of_realizations
+                    number_of_realizations += 1
+                    pending.add( executor.submit(_runPipelineTask, slot, 0) )
+            
+            fillFreeSlots()
+            
+            while len(pending) > 0:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                
+                for future in done:
+                    slot, fiber_index = future.result()
+                    
+                    #Pass field on to the next fiber
+                    if fiber_index+1 < number_of_fibers:
+                        pending.add( executor.submit(_runPipelineTask, slot, fiber_index+1) )
+                        continue
+                    
+                    #Realization has reached the end of the span, so free its slot
+                    realization_index = realization_in_slot.pop(slot)
+                    if outputCallback is None:
+                        outputs[realization_index] = np.copy(field_buffer[slot,:])
+                    else:
+                        outputCallback(realization_index, np.copy(field_buffer[slot,:]))
+                    free_slots.append(slot)
+                
+                fillFreeSlots()
+    finally:
+        del field_buffer
+        shared_buffer.release()
+        shared_timeFreq.release()
+        operators.release()
+    
+    if outputCallback is not None:
+        return None
+    
+    return np.array([outputs[i] for i in range(number_of_realizations)])
+
+
+
+def _runEnsembleTask(realization_index):
+    """ 
+    Propagates one realization through the whole span, writing every row of its pulse and spectrum matrices directly into shared memory
+    """
+    timeFreq = _workerState["timeFreq"]
+    f = timeFreq.f
+    pulse = _workerState["inputs"].array[realization_index,:]
+    
+    for fiber_index, fiber in enumerate(_workerState["fiber_span"].fiber_list):
+        pulseMatrix    = _workerState["pulseMatrices"][fiber_index].array[realization_index]
+        spectrumMatrix = _workerState["spectrumMatrices"][fiber_index].array[realization_index]
+        
+        pulseMatrix[0,:]    = pulse
+        spectrumMatrix[0,:] = getSpectrumFromPulse(timeFreq.t, pulse)
+        
+        def storeStep(z_step_index,spectrum):
+            spectrumMatrix[z_step_index+1,:] = spectrum
+            pulseMatrix[z_step_index+1,:]    = getPulseFromSpectrum(f, spectrum)
+        
+        propagateFieldThroughFiber(fiber,
+                                   timeFreq,
+                                   pulse,
+                                   stepCallback = storeStep,
+                                   disp_and_loss_operators = _workerState["operators"].array[fiber_index])
+        
+        #Feed output of this fiber into the next one
+        pulse = pulseMatrix[-1,:]
+        
+    return realization_index
+
+
+def SSFM_ensemble(fiber_span:fiber_span_class,
+                  timeFreq:timeFreq_class,
+                  input_amplitudes,
+                  number_of_workers = None):
+    """ 
+    Propagates an ensemble of input fields through a fiber span in parallel and keeps the full results
+    
+    Each realization is a task on a process pool. The time base, the 
+    pre-calculated dispersion and loss operators, the input amplitudes and 
+    the result matrices all live in shared memory, so workers attach to 
+    them zero-copy and write their pulse and spectrum matrices in place 
+    instead of pickling them back to the main process.
+    
+    Parameters:
+        fiber_span (fiber_span_class): Class holding fibers through which the signals are propagated
+        timeFreq (timeFreq_class): Contains info about discretized time and freq axes
+        input_amplitudes (nparray): Array of shape (number_of_realizations, number_of_points) with input amplitudes in sqrt(W)
+        number_of_workers = None (int) (optional): Number of worker processes. Defaults to os.cpu_count()
+        
+    Returns:
+        list(list,list): pulseMatrices and spectrumMatrices. Entry k of each list is an nparray of shape (number_of_realizations, len(fiber.z_array), number_of_points) holding the results for fiber k.
+    
+    """
+    if number_of_workers is None:
+        number_of_workers = os.cpu_count()
+    
+    inputs = shareArray(np.asarray(input_amplitudes, dtype=complex))
+    number_of_realizations = inputs.shape[0]
+    shared_timeFreq = shared_timeFreq_class(timeFreq)
+    operators = shareDispersionAndLoss(fiber_span, timeFreq)
+    
+    pulseMatrices = []
+    spectrumMatrices = []
+    
+    try:
+        for fiber in fiber_span.fiber_list:
+            pulseMatrices.append( shared_array_class((number_of_realizations, len(fiber.z_array), timeFreq.number_of_points)) )
+            spectrumMatrices.append( shared_array_class((number_of_realizations, len(fiber.z_array), timeFreq.number_of_points)) )
+        
+        with ProcessPoolExecutor(max_workers = number_of_workers,
+                                 initializer = _initWorker,
+                                 initargs = ({"fiber_span":fiber_span,
+                                              "timeFreq":shared_timeFreq,
+                                              "operators":operators,
+                                              "inputs":inputs,
+                                              "pulseMatrices":pulseMatrices,
+                                              "spectrumMatrices":spectrumMatrices},)) as executor:
+            for future in [executor.submit(_runEnsembleTask, i) for i in range(number_of_realizations)]:
+                future.result()
+        
+        #Copy results out of shared memory, so callers get ordinary arrays and the blocks can be freed
+        pulseResults    = [np.copy(matrix.array) for matrix in pulseMatrices]
+        spectrumResults = [np.copy(matrix.array) for matrix in spectrumMatrices]
+    finally:
+        inputs.release()
+        shared_timeFreq.release()
+        operators.release()
+        for matrix in pulseMatrices+spectrumMatrices:
+            matrix.release()
+        
+    return pulseResults, spectrumResults
+
+
+
+
+def _runPararealFineTask(segment_index):
+    """ 
+    Runs the fine propagator on one segment, reading its start field from shared memory and writing its end field in place
+    """
+    t_start = perf_counter()
+    _workerState["fineOutputs"].array[segment_index,:] = propagateFieldThroughFiber(_workerState["fiber"],
+                                                                                   _workerState["timeFreq"],
+                                                                                   _workerState["boundaryFields"].array[segment_index,:],
+                                                                                   disp_and_loss_operators = _workerState["operators"].array,
+                                                                                   length = _workerState["segmentLength"],
+                                                                                   numberOfSteps = _workerState["fineSteps"])
+    return segment_index, perf_counter()-t_start
+
+
+def SSFM_parareal(fiber:fiber_class,
+                  timeFreq:timeFreq_class,
+                  pulse,
+                  number_of_segments,
+                  coarsePropagator = "fewSteps",
+                  coarseSteps = 1,
+                  tolerance = 1e-6,
+                  max_iterations = None,
+                  number_of_workers = None):
+    """ 
+    Propagates a single field through a long fiber using the parallel-in-z parareal method
+    
+    The fiber is divided into number_of_segments segments. A cheap coarse 
+    propagator G predicts the field at the segment boundaries serially, 
+    while the fine propagator F (the regular SSFM with fiber.numberOfSteps 
+    steps in total) runs on all segments in parallel. The boundary fields 
+    are corrected via
+    
+        U[n+1] <- G(U_new[n]) + F(U_old[n]) - G(U_old[n])
+        
+    until the largest relative change of any boundary field is below 
+    tolerance. After k iterations the first k segments are exact, so at most
+    number_of_segments iterations are needed to reproduce the serial result.
+    
+    Parameters:
+        fiber (fiber_class): Fiber through which the field is propagated
+        timeFreq (timeFreq_class): Contains info about discretized time and freq axes
+        pulse (nparray): Pulse amplitude at the start of the fiber in sqrt(W)
+        number_of_segments (int): Number of segments the fiber is divided into. Must divide fiber.numberOfSteps
+        coarsePropagator = "fewSteps" (str) (optional): "fewSteps" runs the SSFM with coarseSteps steps per segment. "linear" only applies dispersion and loss in a single step.
+        coarseSteps = 1 (int) (optional): Number of steps per segment taken by the "fewSteps" coarse propagator
+        tolerance = 1e-6 (float) (optional): Convergence criterion for the relative change of the boundary fields 
+        max_iterations = None (int) (optional): Maximum number of parareal iterations. Defaults to number_of_segments
+        number_of_workers = None (int) (optional): Number of worker processes. Defaults to min(os.cpu_count(),number_of_segments)
+        
+    Returns:
+        nparray: Pulse amplitude at the end of the fiber in sqrt(W)
+        dict: Diagnostics with the number of iterations, the residual after each iteration, whether the method converged, the time spent on coarse and fine propagation and the estimated speedup compared to a serial run
+    
+    """
+    assert fiber.numberOfSteps % number_of_segments == 0, f"Error: number_of_segments = {number_of_segments} must divide fiber.numberOfSteps = {fiber.numberOfSteps}"
+    
+    if max_iterations is None:
+        max_iterations = number_of_segments
+    if number_of_workers is None:
+        number_of_workers = min(os.cpu_count(),number_of_segments)
+    
+    t_start = perf_counter()
+    
+    segmentLength = fiber.Length/number_of_segments
+    fineSteps = fiber.numberOfSteps//number_of_segments
+    
+    #Set up coarse propagator
+    if coarsePropagator.lower() == "linear":
+        linear_segment_step = getDispersionAndLoss(fiber, timeFreq, segmentLength)[0]
+        G = lambda field: getPulseFromSpectrum(timeFreq.f, getSpectrumFromPulse(timeFreq.t, field)*linear_segment_step)
+    elif coarsePropagator.lower() == "fewsteps":
+        coarse_operators = getDispersionAndLoss(fiber, timeFreq, segmentLength/coarseSteps)
+        G = lambda field: propagateFieldThroughFiber(fiber, timeFreq, field, 
+                                                     disp_and_loss_operators = coarse_operators, 
+                                                     length = segmentLength, 
+                                                     numberOfSteps = coarseSteps)
+    else:
+        raise ValueError(f"Unknown coarsePropagator '{coarsePropagator}'. Use 'fewSteps' or 'linear'")
+    
+    boundaryFields = shared_array_class((number_of_segments+1,timeFreq.number_of_points))
+    fineOutputs    = shared_array_class((number_of_segments,timeFreq.number_of_points))
+    shared_timeFreq = shared_timeFreq_class(timeFreq)
+    fine_operators = shareArray(np.array(getDispersionAndLoss(fiber, timeFreq, segmentLength/fineSteps)))
+    
+    U = boundaryFields.array
+    
+    #Initial prediction with coarse propagator
+    t_coarse = perf_counter()
+    U[0,:] = pulse
+    G_old = np.zeros((number_of_segments,timeFreq.number_of_points))*(1+0j)
+    for n in range(number_of_segments):
+        G_old[n,:] = G(U[n,:])
+        U[n+1,:] = G_old[n,:]
+    time_coarse = perf_counter()-t_coarse
+    
+    time_fine_tasks = np.zeros(number_of_segments)
+    residual_list = []
+    converged = False
+    iterations = 0
+    
+    try:
+        with ProcessPoolExecutor(max_workers = number_of_workers,
+                                 initializer = _initWorker,
+                                 initargs = ({"fiber":fiber,
+                                              "timeFreq":shared_timeFreq,
+                                              "operators":fine_operators,
+                                              "boundaryFields":boundaryFields,
+                                              "fineOutputs":fineOutputs,
+                                              "segmentLength":segmentLength,
+                                              "fineSteps":fineSteps},)) as executor:
+            
+            for k in range(max_iterations):
+                iterations += 1
+                
+                #Fine propagation of all segments that are not yet exact
+                for future in [executor.submit(_runPararealFineTask, n) for n in range(k,number_of_segments)]:
+                    n, duration = future.result()
+                    time_fine_tasks[n] += duration
+                
+                #Serial correction sweep
+                t_coarse = perf_counter()
+                residual = 0.0
+                for n in range(k,number_of_segments):
+                    G_new = G(U[n,:])
+                    U_new = G_new + fineOutputs.array[n,:] - G_old[n,:]
+                    
+                    residual = np.max([residual, np.linalg.norm(U_new-U[n+1,:])/np.linalg.norm(U[n+1,:])])
+                    
+                    G_old[n,:] = G_new
+                    U[n+1,:] = U_new
+                time_coarse += perf_counter()-t_coarse
+                
+                residual_list.append(residual)
+                
+                if residual < tolerance:
+                    converged = True
+                    break
+            
+            output_amplitude = np.copy(U[-1,:])
+    finally:
+        del U
+        boundaryFields.release()
+        fineOutputs.release()
+        shared_timeFreq.release()
+        fine_operators.release()
+    
+    time_total = perf_counter()-t_start
+    
+    #A serial run costs the same as one fine propagation of every segment
+    number_of_fine_solves = np.sum([number_of_segments-k for k in range(iterations)])
+    time_fine_per_segment = np.sum(time_fine_tasks)/number_of_fine_solves
+    time_serial_estimate  = number_of_segments*time_fine_per_segment
+    
+    diagnostics = {"iterations":iterations,
+                   "converged":converged,
+                   "residuals":residual_list,
+                   "time_total_s":time_total,
+                   "time_coarse_s":time_coarse,
+                   "time_fine_per_segment_s":time_fine_per_segment,
+                   "time_serial_estimate_s":time_serial_estimate,
+                   "speedup_estimate":time_serial_estimate/time_total,
+                   "speedup_bound":number_of_segments/iterations}
+    
+    print(f"Parareal finished after {iterations} iterations (converged = {converged}, residual = {residual_list[-1]:.2e})")
+    print(f"Estimated speedup compared to serial SSFM = {diagnostics['speedup_estimate']:.2f} (upper bound = {diagnostics['speedup_bound']:.2f})")
+    
+    return output_amplitude, diagnostics
+
+
+
+#Class for accumulating statistics over an ensemble of noisy realizations
+class ensemble_statistics_class:
+    """
+    Class for computing ensemble statistics of SSFM results on the fly. 
+    
+    Realizations are added one at a time, e.g. from the outputCallback of
+    SSFM_pipeline, and all statistics are updated online, so memory use 
+    does not grow with the number of realizations. Mean and variance of 
+    the PSD are computed with Welford's method. The first-order coherence
+    
+        |g12(f)| = |<A_i*(f) A_j(f)>_(i!=j)| / <|A(f)|^2>
+    
+    is computed from the running sums S = sum(A_i) and P = sum(|A_i|^2) 
+    using sum_(i!=j)(A_i* A_j) = |S|^2 - P, which avoids the O(M^2) pairwise 
+    products for M realizations.
+    
+    Fields can be 1D (e.g. fiber output) or 2D with one row per snapshot
+    (e.g. a pulseMatrix), in which case statistics are kept for every row.
+    
+    Attributes:
+        timeFreq (timeFreq_class): Contains info about discretized time and freq axes
+        number_of_realizations (int): Number of realizations added so far
+        meanPSD (nparray): Running mean of the PSD 
+        M2_PSD (nparray): Running sum of squared deviations of the PSD from the mean
+        sumSpectrum (nparray): Running sum of the complex spectral amplitudes
+        sumPSD (nparray): Running sum of the PSD
+        peakPowerBins (nparray): Edges of bins for the histogram of peak powers in W
+        peakPowerCounts (nparray): Number of realizations with peak power in each bin
+        peakPowerOverflow (nparray): Number of realizations with peak power above the last bin edge
+        maxPeakPower (nparray): Largest peak power seen so far in W
+    """
+    def __init__(self,timeFreq:timeFreq_class,peakPowerBins=None):
+        """
+        Constructor for ensemble_statistics_class
+        
+        Parameters:
+            self
+            timeFreq (timeFreq_class): Contains info about discretized time and freq axes
+            peakPowerBins=None (nparray) (optional): Edges of histogram bins for peak powers in W. If None, 1000 bins from 0 to 10 times the peak power of the first realization are used.
+        """
+        self.timeFreq = timeFreq
+        self.number_of_realizations = 0
+        self.peakPowerBins = peakPowerBins
+        
+    def addRealization(self,pulse):
+        """
+        Updates all statistics with a new realization
+        
+        Parameters:
+            self
+            pulse (nparray): Pulse amplitude in sqrt(W). Either a single field of shape (number_of_points,) or snapshots of shape (number_of_snapshots,number_of_points)
+        """
+        pulse = np.asarray(pulse)
+        
+        #Same scaling as getSpectrumFromPulse, but applied to every row at once
+        spectrum = fftshift(fft(pulse,axis=-1),axes=-1)*(self.timeFreq.t[1]-self.timeFreq.t[0])
+        PSD = getPower(spectrum)
+        peakPower = np.max(getPower(pulse),axis=-1)
+        
+        if self.number_of_realizations == 0:
+            self.meanPSD = np.zeros_like(PSD)
+            self.M2_PSD = np.zeros_like(PSD)
+            self.sumSpectrum = np.zeros_like(spectrum)
+            self.sumPSD = np.zeros_like(PSD)
+            
+            if self.peakPowerBins is None:
+                self.peakPowerBins = np.linspace(0,10*np.max(peakPower),1001)
+            self.peakPowerBins = np.asarray(self.peakPowerBins)
+            self.peakPowerCounts = np.zeros( np.shape(peakPower)+(len(self.peakPowerBins)-1,), dtype=int)
+            self.peakPowerOverflow = np.zeros( np.shape(peakPower), dtype=int)
+            self.maxPeakPower = np.zeros( np.shape(peakPower) )
+        
+        self.number_of_realizations += 1
+        
+        #Welford update of mean and variance
+        delta = PSD-self.meanPSD
+        self.meanPSD += delta/self.number_of_realizations
+        self.M2_PSD += delta*(PSD-self.meanPSD)
+        
+        #Running sums for coherence
+        self.sumSpectrum += spectrum
+        self.sumPSD += PSD
+        
+        #Update histogram of peak powers in place
+        bin_index = np.searchsorted(self.peakPowerBins, peakPower, side="right")-1
+        in_range = (bin_index >= 0) & (bin_index < len(self.peakPowerBins)-1)
+        counts = self.peakPowerCounts.reshape(-1,len(self.peakPowerBins)-1)
+        rows = np.arange(counts.shape[0])
+        np.add.at(counts, (rows[in_range.ravel()], bin_index.ravel()[in_range.ravel()]), 1)
+        self.peakPowerOverflow += (bin_index >= len(self.peakPowerBins)-1)
+        self.maxPeakPower = np.maximum(self.maxPeakPower, peakPower)
+        
+    def getMeanSpectrum(self):
+        """
+        Returns:
+            nparray: Mean PSD over all realizations 
+        """
+        return np.copy(self.meanPSD)
+    
+    def getSpectralVariance(self):
+        """
+        Returns:
+            nparray: Sample variance of the PSD over all realizations. NaN if fewer than 2 realizations have been added.  
+        """
+        if self.number_of_realizations < 2:
+            return np.ones_like(self.meanPSD)*np.nan
+        return self.M2_PSD/(self.number_of_realizations-1)
+    
+    def getCoherence(self):
+        """
+        Returns:
+            nparray: First-order coherence |g12(f)| between all pairs of realizations. NaN if fewer than 2 realizations have been added. 
+        """
+        M = self.number_of_realizations
+        if M < 2:
+            return np.ones_like(self.meanPSD)*np.nan
+        
+        sum_of_pairs = getPower(self.sumSpectrum)-self.sumPSD
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.abs(sum_of_pairs)/((M-1)*self.sumPSD)
+    
+    def getPeakPowerHistogram(self,density=False):
+        """
+        Parameters:
+            density=False (bool) (optional): If True, normalize histogram to a probability density like np.histogram
+            
+        Returns:
+            nparray: Counts (or prob. density) in each bin
+            nparray: Bin edges in W
+        """
+        if density == False:
+            return np.copy(self.peakPowerCounts), self.peakPowerBins
+        
+        number_of_samples = np.sum(self.peakPowerCounts,axis=-1,keepdims=True)
+        return self.peakPowerCounts/number_of_samples/np.diff(self.peakPowerBins), self.peakPowerBins
+
+
+
+from scipy.ndimage import maximum_filter1d
+
+def getLocalMaxima(power,threshold=0.0,neighbourhood=1):
+    """ 
+    Finds local maxima in a whole batch of power traces at once
+    
+    Vectorized replacement for calling scipy.signal.find_peaks row by row.
+    A sample is a peak if it is at least threshold, is the largest value 
+    within neighbourhood samples on either side and is strictly larger than 
+    the sample before it, so plateaus only count once. The first and last 
+    samples of each trace are never counted as peaks. 
+    
+    Parameters:
+        power (nparray): Power traces in W. The last axis is time (or freq.), any leading axes are treated as a batch, e.g. (number_of_realizations, number_of_points) or a pulseMatrix. 
+        threshold=0.0 (float) (optional): Smallest power in W counted as a peak
+        neighbourhood=1 (int) (optional): Peaks must be the largest value within this many samples on either side. Increase to ignore small ripples on top of broad peaks.
+        
+    Returns:
+        tuple: Indices of peaks as returned by np.nonzero, with one array per axis of power
+        nparray: Power of each peak in W
+    """
+    power = np.asarray(power)
+    
+    is_peak = power >= threshold
+    is_peak &= power >= maximum_filter1d(power, size=2*neighbourhood+1, axis=-1, mode="nearest")
+    is_peak[...,1:] &= power[...,1:] > power[...,:-1]
+    is_peak[...,0]  = False
+    is_peak[...,-1] = False
+    
+    peak_indices = np.nonzero(is_peak)
+    return peak_indices, power[peak_indices]
+
+
+#Class for accumulating statistics of peak powers 
+class peak_statistics_class:
+    """
+    Class for accumulating peak powers from many realizations in constant memory. 
+    
+    Peak powers are streamed into a histogram with preallocated bins, while 
+    the number of peaks, their mean and spread, and the largest peaks seen 
+    so far are kept for extreme-value (rogue wave) statistics. Mean and 
+    variance are updated batch-wise with the parallel form of Welford's 
+    method, like ensemble_statistics_class, so they do not lose precision 
+    for many peaks. 
+    
+    Attributes:
+        bins (nparray): Edges of histogram bins in W
+        counts (nparray): Number of peaks in each bin
+        overflow (int): Number of peaks above the last bin edge
+        number_of_peaks (int): Total number of peaks added
+        meanPeakPower (float): Running mean of all peak powers in W
+        M2_peakPower (float): Running sum of squared deviations of the peak powers from the mean in W^2
+        number_of_largest (int): Number of largest peaks to keep
+        largestPeaks (nparray): The largest peak powers seen so far in W, in descending order
+    """
+    def __init__(self,bins,number_of_largest=100):
+        """
+        Constructor for peak_statistics_class
+        
+        Parameters:
+            self
+            bins (nparray): Edges of histogram bins in W
+            number_of_largest=100 (int) (optional): Number of largest peaks to keep
+        """
+        self.bins = np.asarray(bins)
+        self.counts = np.zeros(len(self.bins)-1,dtype=int)
+        self.overflow = 0
+        self.number_of_peaks = 0
+        self.meanPeakPower = 0.0
+        self.M2_peakPower = 0.0
+        self.number_of_largest = number_of_largest
+        self.largestPeaks = np.array([])
+        
+    def addPeaks(self,peakPowers):
+        """
+        Adds peak powers to the statistics
+        
+        Parameters:
+            self
+            peakPowers (nparray): Peak powers in W
+        """
+        peakPowers = np.ravel(peakPowers)
+        
+        self.counts += np.histogram(peakPowers, self.bins)[0]
+        self.overflow += int(np.sum(peakPowers > self.bins[-1]))
+        
+        #Welford update, combining the statistics of this batch with the previous ones
+        if len(peakPowers) > 0:
+            batch_mean = np.mean(peakPowers)
+            batch_M2 = np.sum((peakPowers-batch_mean)**2)
+            number_of_peaks = self.number_of_peaks+len(peakPowers)
+            delta = batch_mean-self.meanPeakPower
+            self.meanPeakPower += delta*len(peakPowers)/number_of_peaks
+            self.M2_peakPower += batch_M2+delta**2*self.number_of_peaks*len(peakPowers)/number_of_peaks
+            self.number_of_peaks = number_of_peaks
+        
+        candidates = np.append(self.largestPeaks, peakPowers)
+        if len(candidates) > self.number_of_largest:
+            candidates = np.partition(candidates, -self.number_of_largest)[-self.number_of_largest:]
+        self.largestPeaks = np.sort(candidates)[::-1]
+        
+    def addPowerTraces(self,power,threshold=0.0,neighbourhood=1):
+        """
+        Extracts local maxima from a batch of power traces with getLocalMaxima and adds them to the statistics
+        
+        Parameters:
+            self
+            power (nparray): Power traces in W with time (or freq.) along the last axis
+            threshold=0.0 (float) (optional): Smallest power in W counted as a peak
+            neighbourhood=1 (int) (optional): Peaks must be the largest value within this many samples on either side
+            
+        Returns:
+            int: Number of peaks found
+        """
+        peak_indices, peakPowers = getLocalMaxima(power, threshold, neighbourhood)
+        self.addPeaks(peakPowers)
+        return len(peakPowers)
+    
+    def getHistogram(self,density=False):
+        """
+        Parameters:
+            density=False (bool) (optional): If True, normalize histogram to a probability density like np.histogram
+            
+        Returns:
+            nparray: Counts (or prob. density) in each bin
+            nparray: Bin edges in W
+        """
+        if density == False:
+            return np.copy(self.counts), self.bins
+        return self.counts/np.sum(self.counts)/np.diff(self.bins), self.bins
+    
+    def getMeanAndStDev(self):
+        """
+        Returns:
+            float: Mean peak power in W
+            float: Standard deviation of peak powers in W
+        """
+        return self.meanPeakPower, np.sqrt(self.M2_peakPower/self.number_of_peaks)
+
+
+#Export settings used by saveplot and showplot. Changed by renderEverythingAboutResult in its worker processes 
+#and by startExportQueue. While savedPlots is a list, saveplot appends the path of every plot it saves.
+plotSettings = {"format": "png",
+                "dpi": 500,
+                "show": True,
+                "exportQueue": None,
+                "savedPlots": None}
+
+
+def saveplot(basename):
+    """ 
+    Helper function for adding file type suffix to name of plot
+    
+    Helper function for adding file type suffix to name of plot. File type 
+    and resolution are taken from plotSettings. If an export queue has been
+    started with startExportQueue, the figure is handed to it and encoded 
+    in the background, so this function returns immediately.
+    
+    Parameters:
+        basename (str): Name to which a file extension is to be appended if not already present. 
+        
+    Returns:
+        
+    
+    """
+    
+    if basename.lower().endswith(('.pdf','.png','.jpg','.svg')) == False:
+        basename+='.'+plotSettings["format"]
+    
+    if plotSettings["savedPlots"] is not None:
+        plotSettings["savedPlots"].append(os.path.realpath(basename))
+        
+    if plotSettings["exportQueue"] is not None:
+        plotSettings["exportQueue"].submit(plt.gcf(), basename, bbox_inches='tight', pad_inches=0, transparent=True, dpi=plotSettings["dpi"])
+        return
+    
+    plt.savefig(basename, bbox_inches='tight', pad_inches=0, transparent=True, dpi=plotSettings["dpi"])
+
+
+def _saveFigureTask(figure_bytes, path, savefig_kwargs):
+    """ 
+    Saves a pickled figure. Runs in the worker processes of figure_export_queue_class.
+    """
+    plt.switch_backend("Agg")
+    fig = pickle.loads(figure_bytes)
+    fig.savefig(path, **savefig_kwargs)
+    plt.close(fig)
+    return path
+
+
+class figure_export_queue_class:
+    """
+    Class for saving figures in background processes. 
+    
+    Figures are pickled when they are submitted, so they can be changed, 
+    shown or closed right away, and are encoded by worker processes while 
+    the caller continues. Call wait before relying on the files existing.
+    
+    Attributes:
+        executor (ProcessPoolExecutor): Worker processes encoding the figures
+        futures (list): Pending saves
+        savedPaths (list): Paths of all figures saved so far
+    """
+    def __init__(self, number_of_workers = 1):
+        """
+        Constructor for figure_export_queue_class
+        
+        Parameters:
+            self
+            number_of_workers = 1 (int) (optional): Number of figures encoded at the same time
+        """
+        self.executor = ProcessPoolExecutor(max_workers = number_of_workers)
+        self.futures = []
+        self.savedPaths = []
+    
+    def submit(self, fig, path, **savefig_kwargs):
+        """
+        Queues a figure to be saved
+        
+        Parameters:
+            self
+            fig (Figure): Figure to be saved
+            path (str): File name. Relative paths are resolved now, not when the figure is saved.
+            **savefig_kwargs: Passed to fig.savefig
+        """
+        self.futures.append(self.executor.submit(_saveFigureTask, pickle.dumps(fig), os.path.realpath(path), savefig_kwargs))
+    
+    def wait(self):
+        """
+        Waits until all queued figures have been saved
+        
+        Errors raised while saving are raised here.
+        
+        Parameters:
+            self
+            
+        Returns:
+            list: Paths of figures saved since the last call to wait
+        """
+        futures, self.futures = self.futures, []
+        paths = [future.result() for future in futures]
+        self.savedPaths += paths
+        return paths
+    
+    def close(self):
+        """
+        Waits for all queued figures and stops the worker processes
+        
+        Parameters:
+            self
+            
+        Returns:
+            list: Paths of all figures saved by the queue
+        """
+        self.wait()
+        self.executor.shutdown()
+        return self.savedPaths
+
+
+def startExportQueue(number_of_workers = 1):
+    """ 
+    Makes saveplot save figures in the background until waitForExports is called
+    
+    Parameters:
+        number_of_workers = 1 (int) (optional): Number of figures encoded at the same time
+        
+    Returns:
+        figure_export_queue_class: Queue used by saveplot
+    """
+    if plotSettings["exportQueue"] is None:
+        plotSettings["exportQueue"] = figure_export_queue_class(number_of_workers)
+    return plotSettings["exportQueue"]
+
+
+def waitForExports():
+    """ 
+    Waits for all figures queued by saveplot and makes it save figures directly again
+    
+    Returns:
+        list: Paths of all figures saved by the queue, including those already waited for
+    """
+    exportQueue, plotSettings["exportQueue"] = plotSettings["exportQueue"], None
+    if exportQueue is None:
+        return []
+    
+    paths = exportQueue.close()
+    print(f"Saved {len(paths)} queued figures")
+    return paths
+
+
+def showplot():
+    """ 
+    Shows the current figure, or closes it if plotSettings["show"] is False
+    
+    Closing figures that are not shown keeps memory use constant when many 
+    plots are made headless.
+    """
+    if plotSettings["show"] == True:
+        plt.show()
+    else:
+        plt.close()
+
+
+def getResultHash(ssfm_result_list, rowsPerMatrix=32):
+    """ 
+    Computes a hash identifying the content of SSFM results
+    
+    Hashes the solver version, the time and frequency arrays, the 
+    parameters of the fibers and input signal (see getPrefixHashes), the 
+    z-values and shapes of every result and up to rowsPerMatrix evenly 
+    spaced rows of each pulse and spectrum matrix, always including the 
+    first and last rows. Reading a few rows keeps this cheap for large, 
+    lazily loaded matrices. The parameters are hashed as well, since the 
+    axes and labels of plots depend on them even where the sampled rows 
+    do not change.
+    
+    Parameters:
+        ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
+        rowsPerMatrix=32 (int) (optional): Largest number of rows hashed from each matrix
+        
+    Returns:
+        str: Hexadecimal SHA-256 hash
+    """
+    timeFreq = ssfm_result_list[0].input_signal.timeFreq
+    
+    result_hash = hashlib.sha256()
+    result_hash.update(f"SSFM solver version {SSFM_solver_version}".encode())
+    result_hash.update(np.ascontiguousarray(timeFreq.t, dtype=float).tobytes())
+    result_hash.update(np.ascontiguousarray(timeFreq.f, dtype=float).tobytes())
+    result_hash.update(repr(float(timeFreq.centerFrequency)).encode())
+    result_hash.update(getPrefixHashes(fiber_span_class([ssfm_result.fiber for ssfm_result in ssfm_result_list]), ssfm_result_list[0].input_signal)[-1].encode())
+    
+    for ssfm_result in ssfm_result_list:
+        result_hash.update(np.ascontiguousarray(ssfm_result.z_array, dtype=float).tobytes())
+        
+        for matrix in [ssfm_result.pulseMatrix, ssfm_result.spectrumMatrix]:
+            result_hash.update(repr(tuple(matrix.shape)).encode())
+            rows = np.unique(np.round(np.linspace(0,matrix.shape[0]-1,rowsPerMatrix)).astype(int))
+            for row_index in rows:
+                result_hash.update(np.ascontiguousarray(matrix[row_index,:], dtype=complex).tobytes())
+    
+    return result_hash.hexdigest()
+
+
+def getArgumentKey(value):
+    """ 
+    Returns a string identifying a plot argument for render_cache_class
+    
+    numpy arrays are identified by their dtype, shape and a hash of their 
+    bytes, since repr abbreviates large arrays with "..." so different 
+    arrays could give the same key.
+    
+    Parameters:
+        value: Argument passed to a plot function
+        
+    Returns:
+        str: Key of argument
+    """
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        return repr( ("ndarray", str(array.dtype), tuple(array.shape), hashlib.sha256(array.tobytes()).hexdigest()) )
+    return repr(value)
+
+
+#Class for caching saved plots on disk
+class render_cache_class:
+    """
+    Class for storing plots saved by saveplot on disk, keyed on result and plot arguments. 
+    
+    Every entry is a folder named after a hash of the result content from
+    getResultHash, the name of the plot function, its arguments and the 
+    file type and resolution in plotSettings. It holds the image files 
+    the plot function saved. On a hit, the files are copied into the 
+    output directory of the result instead of making the plot again. 
+    Changed results have a different hash, so old entries are never used 
+    for them.
+    
+    Attributes:
+        cacheDirectory (str): Folder holding the cache entries
+    """
+    def __init__(self,cacheDirectory):
+        """
+        Constructor for render_cache_class
+        
+        Parameters:
+            self
+            cacheDirectory (str): Folder holding the cache entries. Created if it does not exist.
+        """
+        self.cacheDirectory = os.path.realpath(cacheDirectory)
+        os.makedirs(self.cacheDirectory,exist_ok=True)
+    
+    def getKey(self,plotFunction,ssfm_result_list,args,kwargs):
+        """
+        Returns:
+            str: Hexadecimal SHA-256 hash identifying the plot
+        """
+        plot_hash = hashlib.sha256()
+        plot_hash.update(getResultHash(ssfm_result_list).encode())
+        plot_hash.update(repr( (plotFunction.__name__, 
+                                [getArgumentKey(arg) for arg in args], 
+                                sorted((key, getArgumentKey(value)) for key, value in kwargs.items()), 
+                                plotSettings["format"], 
+                                plotSettings["dpi"]) ).encode())
+        return plot_hash.hexdigest()
+    
+    def plot(self,plotFunction,ssfm_result_list,*args,**kwargs):
+        """
+        Copies cached files of a plot into the output directory, or makes the plot and caches its files
+        
+        Parameters:
+            self
+            plotFunction (function): Plot function taking ssfm_result_list as first argument, e.g. plotPulseMatrix2D
+            ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
+            *args, **kwargs: Passed to plotFunction
+            
+        Returns:
+            list: Paths of the saved plots in the output directory
+        """
+        entryPath = os.path.join(self.cacheDirectory,self.getKey(plotFunction,ssfm_result_list,args,kwargs))
+        outputPath = ssfm_result_list[0].dirs[1]
+        
+        if os.path.isdir(entryPath):
+            paths = []
+            for fileName in sorted(os.listdir(entryPath)):
+                paths.append(shutil.copy2(os.path.join(entryPath,fileName),os.path.join(outputPath,fileName)))
+            print(f"Loaded {plotFunction.__name__} from render cache")
+            return paths
+        
+        plotSettings["savedPlots"] = []
+        try:
+            plotFunction(ssfm_result_list,*args,**kwargs)
+            paths = plotSettings["savedPlots"]
+        finally:
+            plotSettings["savedPlots"] = None
+        
+        #Queued figures must be written before they can be copied
+        if plotSettings["exportQueue"] is not None:
+            plotSettings["exportQueue"].wait()
+        
+        tempPath = entryPath+f".tmp{os.getpid()}"
+        os.makedirs(tempPath,exist_ok=True)
+        for path in paths:
+            shutil.copy2(path,os.path.join(tempPath,os.path.basename(path)))
+        
+        try:
+            os.rename(tempPath,entryPath)
+        except OSError:
+            #Another process stored the same entry in the meantime
+            shutil.rmtree(tempPath,ignore_errors=True)
+        
+        return paths
+
+
+def callPlot(renderCache,plotFunction,ssfm_result_list,*args,**kwargs):
+    """ 
+    Calls a plot function directly, or through renderCache if it is not None
+    
+    Parameters:
+        renderCache (render_cache_class): Cache of saved plots. May be None.
+        plotFunction (function): Plot function taking ssfm_result_list as first argument
+        ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
+        *args, **kwargs: Passed to plotFunction
+    """
+    if renderCache is None:
+        plotFunction(ssfm_result_list,*args,**kwargs)
+    else:
+        renderCache.plot(plotFunction,ssfm_result_list,*args,**kwargs)
+
+
+def unpackZvals(ssfm_result_list):
+    """ 
+    Unpacks z_values of individual fibers in ssfm_result_list into single array
+    
+    For a span of 5 fibers with 100 steps each, this function concatenates the
+    arrays like this:
+        
+        Merge A[0:98] with (B[0:98] + A[end])      to create z_temp
+        Merge z_temp with  (C[0:98] + z_temp[end]) to create z_temp
+        Merge z_temp with  (D[0:98] + z_temp[end]) to create z_temp
+        Merge z_temp with  (E[0:99] + z_temp[end]) to create z_temp
+        
+    Note that the final entry in the first 4 arrays are discarded as they are
+    identical to the first element in the next one.
+    
+    
+    Parameters:
+        ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
+        
+    Returns:
+        nparray: z_values for each fiber concatenated together.  
+    
+    """    
+    number_of_fibers = len(ssfm_result_list)
+    if number_of_fibers==1:
+        return ssfm_result_list[0].z_array
+    
+    zvals =np.array([])
+    
+    previous_length = 0
+    for i, ssfm_result in enumerate(ssfm_result_list):
+        
+    
+        if i==0:
+            zvals = np.copy(ssfm_result.z_array[0:-1])
+            
+        elif  (i>0) and (i< number_of_fibers-1):
+            zvals = np.append(zvals,ssfm_result.z_array[0:-1]+previous_length) 
+            
+            
+        elif i==number_of_fibers-1:
+            zvals = np.append(zvals,ssfm_result.z_array+previous_length) 
+
+       
+        previous_length += ssfm_result.fiber.Length    
+       
+    return zvals
+
+def unpackMatrix(ssfm_result_list,zvals,timeFreq,pulse_or_spectrum,Nmin=None,Nmax=None):
+    """ 
+    Unpacks pulseMatrix or spectrumMatrix for individual fibers in ssfm_result_list into single array
+    
+    For a span of 5 fibers with 100 steps each, this function concatenates the
+    arrays like this:
+        
+        Merge A[0:98,:] with B[0:98,:]  to create mat_temp
+        Merge mat_temp with  C[0:98,:]  to create mat_temp
+        Merge mat_temp with  D[0:98,:]  to create mat_temp
+        Merge mat_temp with  E[0:99,:]  to create mat_temp
+        
+    Note that the final entry in the first 4 arrays are discarded as they are
+    identical to the first element in the next one.
+    
+    
+    Parameters:
+        ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
         zvals (nparray) : Array of unpacked z_values from unpackZvals. Needed for pre-allocating returned matrix
         timeFreq (timeFreq_class): timeFreq for simulation. Needed for pre-allocation
         pulse_or_spectrum (str) : Indicates if we want to unpack pulseMatrix or spectrumMatrix
+        Nmin=None (int) (optional): First time or frequency index to unpack. Defaults to 0.
+        Nmax=None (int) (optional): Unpack indices up to but not including Nmax. Defaults to number of points. 
         
     Returns:
-        nparray: Array of size (n_z_steps,n_time_steps) describing pulse amplitude or spectrum for whole fiber span.
+        nparray: Array of size (n_z_steps,Nmax-Nmin) describing pulse amplitude or spectrum for whole fiber span.
+        
+    Only columns Nmin:Nmax are read from each matrix, so for chunked 
+    archives only the chunks overlapping the window are decompressed.
     
     """  
     number_of_fibers = len(ssfm_result_list)
     
     print(f"number_of_fibers = {number_of_fibers}")
     
-    matrix=np.zeros( ( len(zvals), len(  timeFreq.t )  ) )*(1+0j)
+    if Nmin is None:
+        Nmin = 0
+    if Nmax is None:
+        Nmax = len(timeFreq.t)
+    
+    matrix=np.zeros( ( len(zvals), Nmax-Nmin  ) )*(1+0j)
     
     starting_row  = 0
     
@@ -1768,27 +5029,288 @@ def unpackMatrix(ssfm_result_list,zvals,timeFreq,pulse_or_spectrum):
             return
         
         if number_of_fibers == 1:
-            return sourceMatrix
+            return np.asarray(sourceMatrix[:,Nmin:Nmax])
+        
+
+        
+        if i==0:
+            matrix[0: len(ssfm_result.z_array)-1, :] = sourceMatrix[0: len(ssfm_result.z_array)-1, Nmin:Nmax]
+            
+        elif  (i>0) and (i< number_of_fibers-1):
+
+            matrix[starting_row : starting_row + len(ssfm_result.z_array)-1, :] = sourceMatrix[0: len(ssfm_result.z_array)-1, Nmin:Nmax]
+
+        elif i==number_of_fibers-1:
+
+            matrix[starting_row : starting_row + len(ssfm_result.z_array), :] = sourceMatrix[0:len(ssfm_result.z_array), Nmin:Nmax]
+            
+        starting_row +=len(ssfm_result.z_array)-1
+    
+    
+
+    
+    return matrix        
+
+
+
+def unpackPowerMatrix(ssfm_result_list,zvals,timeFreq,pulse_or_spectrum,Nmin,Nmax,rows,cols):
+    """ 
+    Unpacks the power of pulseMatrix or spectrumMatrix at reduced resolution
+    
+    If every result has a power pyramid, the coarsest level with at least 
+    rows x cols blocks for the window Nmin:Nmax is read instead of the 
+    full matrices, using the largest power in each block so peaks survive. 
+    Otherwise, the full matrices are unpacked with unpackMatrix. 
+    
+    Parameters:
+        ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
+        zvals (nparray) : Array of unpacked z_values from unpackZvals
+        timeFreq (timeFreq_class): timeFreq for simulation
+        pulse_or_spectrum (str) : Indicates if we want to unpack pulseMatrix or spectrumMatrix
+        Nmin (int): First time or frequency index to unpack
+        Nmax (int): Unpack indices up to but not including Nmax
+        rows (int): Smallest number of z-values needed
+        cols (int): Smallest number of time or frequency values needed
+        
+    Returns:
+        list(nparray,nparray,nparray): z-values of the rows, first column of each block relative to Nmin and power of size (len(z),len(columnEdges))
+    """
+    if pulse_or_spectrum.lower()=="pulse":
+        pyramids = [ssfm_result.pulsePyramid for ssfm_result in ssfm_result_list]
+    else:
+        pyramids = [ssfm_result.spectrumPyramid for ssfm_result in ssfm_result_list]
+    
+    if any(pyramid is None for pyramid in pyramids):
+        return zvals, np.arange(Nmax-Nmin), getPower(unpackMatrix(ssfm_result_list,zvals,timeFreq,pulse_or_spectrum,Nmin,Nmax))
+    
+    #All fibers are read at the same level, so their columns line up
+    level = np.min([pyramid.getLevel(len(ssfm_result.z_array),Nmax-Nmin,rows*len(ssfm_result.z_array)/len(zvals),cols) 
+                    for ssfm_result, pyramid in zip(ssfm_result_list,pyramids)])
+    
+    z_list = []
+    power_list = []
+    previous_length = 0
+    for i, (ssfm_result, pyramid) in enumerate(zip(ssfm_result_list,pyramids)):
+        
+        #Last row of every fiber but the final one is identical to the first row of the next one
+        number_of_rows = len(ssfm_result.z_array) if i==len(ssfm_result_list)-1 else len(ssfm_result.z_array)-1
+        
+        power, rowEdges, columnEdges = pyramid.read(slice(0,number_of_rows),slice(Nmin,Nmax),level)
+        z_list.append(getBlockCenters(ssfm_result.z_array[0:number_of_rows],rowEdges)+previous_length)
+        power_list.append(power)
+        
+        previous_length += ssfm_result.fiber.Length
+    
+    return np.concatenate(z_list), columnEdges, np.concatenate(power_list)
+
+
+from matplotlib.image import NonUniformImage
+
+def getOutputPixels(ax,dpi=None):
+    """ 
+    Computes how many pixels an axis covers in the saved image
+    
+    Parameters:
+        ax (Axes): Matplotlib axis to be drawn on
+        dpi=None (int) (optional): Resolution of the saved image. Defaults to the one used by saveplot. 
+        
+    Returns:
+        list(int,int): Number of pixels along the vertical (z) and horizontal (time or freq.) direction
+    """
+    if dpi is None:
+        dpi = plotSettings["dpi"]
+    fig = ax.get_figure()
+    bbox = ax.get_window_extent()
+    scale = dpi/fig.dpi
+    return max(int(np.ceil(bbox.height*scale)),1), max(int(np.ceil(bbox.width*scale)),1)
+
+
+def getBlockEdges(number_of_points,number_of_blocks):
+    """ 
+    Splits range(number_of_points) into at most number_of_blocks contiguous blocks
+    
+    Parameters:
+        number_of_points (int): Length of axis to be split
+        number_of_blocks (int): Largest allowed number of blocks
+        
+    Returns:
+        nparray: Index of the first entry in each block
+    """
+    if number_of_points <= number_of_blocks:
+        return np.arange(number_of_points)
+    return np.unique(np.linspace(0,number_of_points,number_of_blocks+1).astype(int)[:-1])
+
+
+def decimateMatrix(matrix,rows,cols,pooling="max"):
+    """ 
+    Reduces a real matrix to at most rows x cols entries by pooling blocks
+    
+    Each output entry summarizes one block of neighbouring entries. Max 
+    pooling is used for powers so narrow peaks survive the decimation, 
+    absmax pooling for signed quantities like chirp keeps the most extreme 
+    value of either sign.
+    
+    Parameters:
+        matrix (nparray): Real matrix of size (n_z, N)
+        rows (int): Largest number of rows in the output
+        cols (int): Largest number of columns in the output
+        pooling="max" (str) (optional): "max", "mean" or "absmax"
+        
+    Returns:
+        list(nparray,nparray,nparray): Decimated matrix and the first row and column index of each block
+    """
+    matrix = np.asarray(matrix)
+    rowEdges = getBlockEdges(matrix.shape[0],rows)
+    colEdges = getBlockEdges(matrix.shape[1],cols)
+    
+    if pooling.lower()=="max":
+        decimated = np.maximum.reduceat(np.maximum.reduceat(matrix,rowEdges,axis=0),colEdges,axis=1)
+    elif pooling.lower()=="mean":
+        counts = np.outer(np.diff(np.append(rowEdges,matrix.shape[0])),np.diff(np.append(colEdges,matrix.shape[1])))
+        decimated = np.add.reduceat(np.add.reduceat(matrix,rowEdges,axis=0),colEdges,axis=1)/counts
+    elif pooling.lower()=="absmax":
+        largest  = np.maximum.reduceat(np.maximum.reduceat(matrix,rowEdges,axis=0),colEdges,axis=1)
+        smallest = np.minimum.reduceat(np.minimum.reduceat(matrix,rowEdges,axis=0),colEdges,axis=1)
+        decimated = np.where(np.abs(largest)>=np.abs(smallest),largest,smallest)
+    else:
+        assert False, f"ERROR: Unknown pooling={pooling}. Use 'max', 'mean' or 'absmax'!!!"
+        
+    return decimated, rowEdges, colEdges
+
+
+def getBlockCenters(values,edges):
+    """ 
+    Computes the average coordinate of each block made by getBlockEdges
+    
+    Parameters:
+        values (nparray): Coordinates along the decimated axis
+        edges (nparray): Index of the first entry in each block
+        
+    Returns:
+        nparray: Average coordinate of each block
+    """
+    counts = np.diff(np.append(edges,len(values)))
+    return np.add.reduceat(values,edges)/counts
+
+
+def getEvolutionMapData(ax,x,z,values,renderMode="raster",pooling="max"):
+    """ 
+    Prepares data for an evolution map 
+    
+    In "raster" mode, values are decimated to the pixel resolution of ax in
+    the saved image so rendering time does not grow with simulation size. 
+    In "contour" mode, the data is returned unchanged.
+    
+    Parameters:
+        ax (Axes): Matplotlib axis to be drawn on
+        x (nparray): Time or freq. values of the columns
+        z (nparray): z-values of the rows
+        values (nparray): Real matrix of size (len(z),len(x))
+        renderMode="raster" (str) (optional): "raster" or "contour"
+        pooling="max" (str) (optional): Pooling used for decimation. See decimateMatrix.
+        
+    Returns:
+        list(nparray,nparray,nparray): x, z and values to be drawn
+    """
+    if renderMode.lower()=="contour":
+        return x, z, np.asarray(values)
+    
+    rows, cols = getOutputPixels(ax)
+    values, rowEdges, colEdges = decimateMatrix(values,rows,cols,pooling)
+    
+    return getBlockCenters(x,colEdges), getBlockCenters(z,rowEdges), values
+
+
+def getSurfaceShape(n_z,N,maxPolygons):
+    """ 
+    Computes the largest grid for a 3D surface that fits the polygon budget
+    
+    The aspect ratio of the original matrix is kept, but neither axis is 
+    reduced below 2 points or increased beyond its original length. 
+    
+    Parameters:
+        n_z (int): Number of rows in the full matrix
+        N (int): Number of columns in the full matrix
+        maxPolygons (int): Largest allowed number of grid points in the surface
         
+    Returns:
+        list(int,int): Number of rows and columns in the surface
+    """
+    rows = int(np.clip(np.sqrt(maxPolygons*n_z/N),2,n_z))
+    cols = int(np.clip(maxPolygons//rows,2,N))
+    return rows, cols
 
-        
-        if i==0:
-            matrix[0: len(ssfm_result.fiber.z_array)-1, :] = sourceMatrix[0: len(ssfm_result.fiber.z_array)-1, :]
-            
-        elif  (i>0) and (i< number_of_fibers-1):
 
-            matrix[starting_row : starting_row + len(ssfm_result.fiber.z_array)-1, :] = sourceMatrix[0: len(ssfm_result.fiber.z_array)-1, :]
+def getSurfaceData(x,z,values,maxPolygons=2500,pooling="max"):
+    """ 
+    Reduces a matrix to be drawn by plot_surface to a polygon budget
+    
+    The row and column strides are chosen by getSurfaceShape and each 
+    vertex is the max-pooled value of its block, so narrow peaks are kept 
+    even for heavily decimated surfaces. 
+    
+    Parameters:
+        x (nparray): Time or freq. values of the columns
+        z (nparray): z-values of the rows
+        values (nparray): Real matrix of size (len(z),len(x))
+        maxPolygons=2500 (int) (optional): Largest allowed number of grid points. Use None to keep the full matrix.
+        pooling="max" (str) (optional): Pooling used for decimation. See decimateMatrix.
+        
+    Returns:
+        list(nparray,nparray,nparray): x, z and values to be drawn
+    """
+    values = np.asarray(values)
+    if maxPolygons is None:
+        return x, z, values
+    
+    rows, cols = getSurfaceShape(values.shape[0],values.shape[1],maxPolygons)
+    values, rowEdges, colEdges = decimateMatrix(values,rows,cols,pooling)
+    
+    return getBlockCenters(x,colEdges), getBlockCenters(z,rowEdges), values
 
-        elif i==number_of_fibers-1:
 
-            matrix[starting_row : starting_row + len(ssfm_result.fiber.z_array), :] = sourceMatrix[0:len(ssfm_result.fiber.z_array), :]
-            
-        starting_row +=len(ssfm_result.fiber.z_array)-1
+def drawEvolutionMap(ax,x,z,values,renderMode="raster",cmap=None):
+    """ 
+    Draws an evolution map as an image or filled contour plot
     
+    In "raster" mode, the map is drawn with imshow if both axes are evenly 
+    spaced and as a NonUniformImage otherwise, e.g. for spans of fibers 
+    with different step sizes or adaptive snapshots. "contour" mode uses 
+    contourf with 40 levels.
     
-
+    Parameters:
+        ax (Axes): Matplotlib axis to be drawn on
+        x (nparray): Time or freq. values of the columns
+        z (nparray): z-values of the rows
+        values (nparray): Real matrix of size (len(z),len(x)), e.g. from getEvolutionMapData
+        renderMode="raster" (str) (optional): "raster" or "contour"
+        cmap=None (str) (optional): Colour map. Uses matplotlib default if None. 
+        
+    Returns:
+        Mappable to be passed to fig.colorbar
+    """
+    if renderMode.lower()=="contour":
+        X, Z = np.meshgrid(x, z)
+        return ax.contourf(X, Z, values,levels=40,cmap=cmap)
     
-    return matrix        
+    assert renderMode.lower()=="raster", f"ERROR: Unknown renderMode={renderMode}. Use 'raster' or 'contour'!!!"
+    
+    def isEvenlySpaced(values):
+        steps = np.diff(values)
+        return len(values)<3 or np.allclose(steps,steps[0],rtol=1e-3)
+    
+    if len(x)>1 and len(z)>1 and isEvenlySpaced(x) and isEvenlySpaced(z):
+        dx = (x[-1]-x[0])/(len(x)-1)/2
+        dz = (z[-1]-z[0])/(len(z)-1)/2
+        return ax.imshow(values,extent=(x[0]-dx,x[-1]+dx,z[0]-dz,z[-1]+dz),
+                         origin="lower",aspect="auto",interpolation="nearest",cmap=cmap)
+    
+    image = NonUniformImage(ax,interpolation="nearest",cmap=cmap,extent=(x[0],x[-1],z[0],z[-1]))
+    image.set_data(x,z,values)
+    ax.add_image(image)
+    ax.set_xlim(x[0],x[-1])
+    ax.set_ylim(z[0],z[-1])
+    return image
 
           
 def plotFirstAndLastPulse(ssfm_result_list, nrange:int, dB_cutoff,**kwargs):
@@ -1840,11 +5362,11 @@ def plotFirstAndLastPulse(ssfm_result_list, nrange:int, dB_cutoff,**kwargs):
 
     ax.legend(bbox_to_anchor=(1.15,0.8))
     saveplot('first_and_last_pulse')
-    plt.show() 
+    showplot()
     os.chdir(ssfm_result_list[0].dirs[0])
 
 
-def plotPulseMatrix2D(ssfm_result_list, nrange:int, dB_cutoff):
+def plotPulseMatrix2D(ssfm_result_list, nrange:int, dB_cutoff, renderMode="raster"):
     """ 
     Plots amplitude calculated by SSFM as colour surface
     
@@ -1855,6 +5377,7 @@ def plotPulseMatrix2D(ssfm_result_list, nrange:int, dB_cutoff):
         ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
         nrange (int): Determines how many points on either side of the center we wish to plot  
         dB_cutoff : Lowest y-value in plot is this many dB smaller than the peak power
+        renderMode="raster" (str) (optional): "raster" max-pools the matrix to the image resolution and draws it with imshow. "contour" uses contourf on the full matrix.
         
     Returns:
     """   
@@ -1868,29 +5391,28 @@ def plotPulseMatrix2D(ssfm_result_list, nrange:int, dB_cutoff):
      
     zvals = unpackZvals(ssfm_result_list)
     print(f"length of zvals = {len(zvals)}")
-    matrix = unpackMatrix(ssfm_result_list,zvals,timeFreq,"pulse")
     
 
     #Plot pulse evolution throughout fiber in normalized log scale
     os.chdir(ssfm_result_list[0].dirs[1])
     fig, ax = plt.subplots(dpi=200)
     ax.set_title('Pulse Evolution (dB scale)')
-    t_ps = timeFreq.t[Nmin:Nmax]*1e12
-    z = zvals
-    T_ps, Z = np.meshgrid(t_ps, z)
-    P=getPower(matrix[:,Nmin:Nmax]  )/np.max(getPower(matrix[:,Nmin:Nmax]))
+    rows, cols = getOutputPixels(ax) if renderMode.lower()=="raster" else (len(zvals), Nmax-Nmin)
+    z, columnEdges, P = unpackPowerMatrix(ssfm_result_list,zvals,timeFreq,"pulse",Nmin,Nmax,rows,cols)
+    t_ps, z, P = getEvolutionMapData(ax,getBlockCenters(timeFreq.t[Nmin:Nmax]*1e12,columnEdges),z,P,renderMode)
+    P=P/np.max(P)
     P[P<1e-100]=1e-100
     P = 10*np.log10(P)
     P[P<dB_cutoff]=dB_cutoff
-    surf=ax.contourf(T_ps, Z, P,levels=40, cmap="jet")
+    surf=drawEvolutionMap(ax,t_ps,z,P,renderMode,cmap="jet")
     ax.set_xlabel('Time [ps]')
     ax.set_ylabel('Distance [m]')
     cbar=fig.colorbar(surf, ax=ax)
     saveplot('pulse_evo_2D') 
-    plt.show()
+    showplot()
     os.chdir(ssfm_result_list[0].dirs[0])
 
-def plotPulseMatrix3D(ssfm_result_list, nrange:int, dB_cutoff):
+def plotPulseMatrix3D(ssfm_result_list, nrange:int, dB_cutoff, maxPolygons=2500):
     """ 
     Plots amplitude calculated by SSFM as 3D colour surface
     
@@ -1901,6 +5423,7 @@ def plotPulseMatrix3D(ssfm_result_list, nrange:int, dB_cutoff):
         ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
         nrange (int): Determines how many points on either side of the center we wish to plot  
         dB_cutoff : Lowest y-value in plot is this many dB smaller than the peak power
+        maxPolygons=2500 (int) (optional): Largest number of grid points in the surface. Blocks are max-pooled so peaks survive, and power pyramids are used if the results have them. Use None to plot the full matrix.
         
     Returns:
     """   
@@ -1913,33 +5436,34 @@ def plotPulseMatrix3D(ssfm_result_list, nrange:int, dB_cutoff):
  
     
     zvals = unpackZvals(ssfm_result_list)
-    matrix = unpackMatrix(ssfm_result_list,zvals,timeFreq,"pulse")
+    rows, cols = (len(zvals), Nmax-Nmin) if maxPolygons is None else getSurfaceShape(len(zvals),Nmax-Nmin,maxPolygons)
+    z, columnEdges, P_surf = unpackPowerMatrix(ssfm_result_list,zvals,timeFreq,"pulse",Nmin,Nmax,rows,cols)
   
     #Plot pulse evolution in 3D
     os.chdir(ssfm_result_list[0].dirs[1])
     fig, ax = plt.subplots(1,1, figsize=(10,7),subplot_kw={"projection": "3d"})
     plt.title("Pulse Evolution (dB scale)")
 
-    t = timeFreq.t[Nmin:Nmax]*1e12
-    z = zvals
+    t, z, P_surf = getSurfaceData(getBlockCenters(timeFreq.t[Nmin:Nmax]*1e12,columnEdges),z,P_surf,maxPolygons)
     T_surf, Z_surf = np.meshgrid(t, z)
-    P_surf=getPower(matrix[:,Nmin:Nmax]  )/np.max(getPower(matrix[:,Nmin:Nmax]))
+    P_surf=P_surf/np.max(P_surf)
     P_surf[P_surf<1e-100]=1e-100
     P_surf = 10*np.log10(P_surf)
     P_surf[P_surf<dB_cutoff]=dB_cutoff
-    # Plot the surface.
+    # Plot the surface. rcount and ccount are set so matplotlib does not stride the already decimated grid.
     surf = ax.plot_surface(T_surf, Z_surf, P_surf, cmap=cm.jet,
+                            rcount=len(z), ccount=len(t),
                             linewidth=0, antialiased=False)
     ax.set_xlabel('Time [ps]')
     ax.set_ylabel('Distance [m]')
     # Add a color bar which maps values to colors.
     fig.colorbar(surf, shrink=0.5, aspect=5)
     saveplot('pulse_evo_3D')
-    plt.show()
+    showplot()
     os.chdir(ssfm_result_list[0].dirs[0])
 
 
-def plotPulseChirp2D(ssfm_result_list, nrange:int, dB_cutoff,**kwargs):
+def plotPulseChirp2D(ssfm_result_list, nrange:int, dB_cutoff, renderMode="raster",**kwargs):
     """ 
     Plots local chirp throughout entire fiber span.
     
@@ -1950,6 +5474,7 @@ def plotPulseChirp2D(ssfm_result_list, nrange:int, dB_cutoff,**kwargs):
         ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
         nrange (int): Determines how many points on either side of the center we wish to plot  
         dB_cutoff : Lowest y-value in plot is this many dB smaller than the peak power
+        renderMode="raster" (str) (optional): "raster" pools the chirp to the image resolution keeping the most extreme value and draws it with imshow. "contour" uses contourf on the full matrix.
         **kwargs : If chirpPlotRange=(fmin,fmax) is contained in **kwargs, use these values to set color scale. 
         
     Returns:
@@ -1962,21 +5487,15 @@ def plotPulseChirp2D(ssfm_result_list, nrange:int, dB_cutoff,**kwargs):
       
     
     zvals = unpackZvals(ssfm_result_list)
-    matrix = unpackMatrix(ssfm_result_list,zvals,timeFreq,"pulse")
+    matrix = unpackMatrix(ssfm_result_list,zvals,timeFreq,"pulse",Nmin,Nmax)
 
     #Plot pulse evolution throughout fiber  in normalized log scale
     os.chdir(ssfm_result_list[0].dirs[1])
     fig, ax = plt.subplots(dpi=200)
     ax.set_title('Pulse Chirp Evolution')
     t = timeFreq.t[Nmin:Nmax]*1e12
-    z = zvals
-    T, Z = np.meshgrid(t, z)
-    
     
-    Cmatrix=np.ones( (len(z),len(t))  )*1.0
-
-    for i in range(len(zvals)):
-        Cmatrix[i,:]=getChirp(t/1e12,matrix[i,Nmin:Nmax])/1e9
+    Cmatrix=getChirpMatrix(t/1e12,matrix)/1e9
 
     
     chirpplotrange_set_flag = False
@@ -1990,21 +5509,22 @@ def plotPulseChirp2D(ssfm_result_list, nrange:int, dB_cutoff,**kwargs):
         Cmatrix[Cmatrix<-50]=-50 #Default fmin = -50GHz
         Cmatrix[Cmatrix> 50]=50  #Default fmax = -50GHz
         
-    surf=ax.contourf(T, Z, Cmatrix,levels=40,cmap='RdBu')
+    t, z, Cmatrix = getEvolutionMapData(ax,t,zvals,Cmatrix,renderMode,pooling="absmax")
+    surf=drawEvolutionMap(ax,t,z,Cmatrix,renderMode,cmap='RdBu')
     
     ax.set_xlabel('Time [ps]')
     ax.set_ylabel('Distance [m]')
     cbar=fig.colorbar(surf, ax=ax)
     cbar.set_label('Chirp [GHz]')
     saveplot('chirp_evo_2D') 
-    plt.show()
+    showplot()
     os.chdir(ssfm_result_list[0].dirs[0])
 
 
 
 def plotEverythingAboutPulses(ssfm_result_list, 
                               nrange:int, 
-                              dB_cutoff, **kwargs):
+                              dB_cutoff, renderMode="raster", renderCache=None, **kwargs):
     """ 
     Generates all plots of pulse amplitudes throughout fiber span
     
@@ -2015,6 +5535,8 @@ def plotEverythingAboutPulses(ssfm_result_list,
         ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
         nrange (int): Determines how many points on either side of the center we wish to plot  
         dB_cutoff : Lowest y-value in plot is this many dB smaller than the peak power
+        renderMode="raster" (str) (optional): "raster" or "contour" for the 2D plots. See drawEvolutionMap.
+        renderCache=None (render_cache_class) (optional): If specified, plots made before with the same result and arguments are copied from this cache instead of being made again
         **kwargs (optional):     
     
     Returns:
@@ -2022,10 +5544,10 @@ def plotEverythingAboutPulses(ssfm_result_list,
     
     """  
     print('  ')
-    plotFirstAndLastPulse(ssfm_result_list, nrange, dB_cutoff,**kwargs)
-    plotPulseMatrix2D(ssfm_result_list,nrange,dB_cutoff)
-    plotPulseChirp2D(ssfm_result_list,nrange,dB_cutoff,**kwargs) 
-    plotPulseMatrix3D(ssfm_result_list,nrange,dB_cutoff)
+    callPlot(renderCache,plotFirstAndLastPulse,ssfm_result_list, nrange, dB_cutoff,**kwargs)
+    callPlot(renderCache,plotPulseMatrix2D,ssfm_result_list,nrange,dB_cutoff,renderMode)
+    callPlot(renderCache,plotPulseChirp2D,ssfm_result_list,nrange,dB_cutoff,renderMode,**kwargs) 
+    callPlot(renderCache,plotPulseMatrix3D,ssfm_result_list,nrange,dB_cutoff)
     print('  ')
 
 
@@ -2079,11 +5601,11 @@ def plotFirstAndLastSpectrum(ssfm_result_list, nrange:int, dB_cutoff):
     ax.set_ylim(Pmax/(10**(-dB_cutoff/10)),2*Pmax)
     fig.legend(bbox_to_anchor=(0.95,0.8))
     saveplot('first_and_last_spectrum')
-    plt.show()
+    showplot()
     os.chdir(ssfm_result_list[0].dirs[0])
 
 
-def plotSpectrumMatrix2D(ssfm_result_list, nrange:int, dB_cutoff):
+def plotSpectrumMatrix2D(ssfm_result_list, nrange:int, dB_cutoff, renderMode="raster"):
     """ 
     Plots spectrum calculated by SSFM as colour surface
     
@@ -2094,15 +5616,16 @@ def plotSpectrumMatrix2D(ssfm_result_list, nrange:int, dB_cutoff):
         ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
         nrange (int): Determines how many points on either side of the center we wish to plot  
         dB_cutoff : Lowest y-value in plot is this many dB smaller than the peak power
+        renderMode="raster" (str) (optional): "raster" max-pools the matrix to the image resolution and draws it with imshow. "contour" uses contourf on the full matrix.
         
     Returns:
     """     
     timeFreq = ssfm_result_list[0].input_signal.timeFreq   
     zvals = unpackZvals(ssfm_result_list)
-    matrix = unpackMatrix(ssfm_result_list,zvals,timeFreq,"spectrum")
     
     Nmin = np.max([int(timeFreq.number_of_points/2-nrange),0])
     Nmax = np.min([int(timeFreq.number_of_points/2+nrange),timeFreq.number_of_points-1])   
+
     center_freq_Hz = timeFreq.centerFrequency
 
 
@@ -2110,22 +5633,22 @@ def plotSpectrumMatrix2D(ssfm_result_list, nrange:int, dB_cutoff):
     os.chdir(ssfm_result_list[0].dirs[1])
     fig, ax = plt.subplots(dpi=200)
     ax.set_title('Spectrum Evolution (dB scale)')
-    f = (timeFreq.f[Nmin:Nmax]+center_freq_Hz)/1e12 
-    z = zvals
-    F, Z = np.meshgrid(f, z)
-    Pf=getPower(matrix[:,Nmin:Nmax]  )/np.max(getPower(matrix[:,Nmin:Nmax]))
+    rows, cols = getOutputPixels(ax) if renderMode.lower()=="raster" else (len(zvals), Nmax-Nmin)
+    z, columnEdges, Pf = unpackPowerMatrix(ssfm_result_list,zvals,timeFreq,"spectrum",Nmin,Nmax,rows,cols)
+    f, z, Pf = getEvolutionMapData(ax,getBlockCenters((timeFreq.f[Nmin:Nmax]+center_freq_Hz)/1e12,columnEdges),z,Pf,renderMode)
+    Pf=Pf/np.max(Pf)
     Pf[Pf<1e-100]=1e-100
     Pf = 10*np.log10(Pf)
     Pf[Pf<dB_cutoff]=dB_cutoff
-    surf=ax.contourf(F, Z, Pf,levels=40)
+    surf=drawEvolutionMap(ax,f,z,Pf,renderMode)
     ax.set_xlabel('Freq. [THz]')
     ax.set_ylabel('Distance [m]')
     cbar=fig.colorbar(surf, ax=ax) 
     saveplot('spectrum_evo_2D') 
-    plt.show()
+    showplot()
     os.chdir(ssfm_result_list[0].dirs[0])
 
-def plotSpectrumMatrix3D(ssfm_result_list, nrange:int, dB_cutoff):
+def plotSpectrumMatrix3D(ssfm_result_list, nrange:int, dB_cutoff, maxPolygons=2500):
     """ 
     Plots spectrum calculated by SSFM as 3D colour surface
     
@@ -2136,15 +5659,18 @@ def plotSpectrumMatrix3D(ssfm_result_list, nrange:int, dB_cutoff):
         ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
         nrange (int): Determines how many points on either side of the center we wish to plot  
         dB_cutoff : Lowest y-value in plot is this many dB smaller than the peak power
+        maxPolygons=2500 (int) (optional): Largest number of grid points in the surface. Blocks are max-pooled so peaks survive, and power pyramids are used if the results have them. Use None to plot the full matrix.
         
     Returns:
     """    
     timeFreq = ssfm_result_list[0].input_signal.timeFreq   
     zvals = unpackZvals(ssfm_result_list)
-    matrix = unpackMatrix(ssfm_result_list,zvals,timeFreq,"spectrum")
     
     Nmin = np.max([int(timeFreq.number_of_points/2-nrange),0])
     Nmax = np.min([int(timeFreq.number_of_points/2+nrange),timeFreq.number_of_points-1])     
+    rows, cols = (len(zvals), Nmax-Nmin) if maxPolygons is None else getSurfaceShape(len(zvals),Nmax-Nmin,maxPolygons)
+    z, columnEdges, P_surf = unpackPowerMatrix(ssfm_result_list,zvals,timeFreq,"spectrum",Nmin,Nmax,rows,cols)
+
     center_freq_Hz = timeFreq.centerFrequency
 
 
@@ -2153,28 +5679,30 @@ def plotSpectrumMatrix3D(ssfm_result_list, nrange:int, dB_cutoff):
     fig, ax = plt.subplots(1,1, figsize=(10,7),subplot_kw={"projection": "3d"})
     plt.title("Spectrum Evolution (dB scale)")
       
-    f = (timeFreq.f[Nmin:Nmax]+center_freq_Hz)/1e12 
-    z = zvals
+    f, z, P_surf = getSurfaceData(getBlockCenters((timeFreq.f[Nmin:Nmax]+center_freq_Hz)/1e12,columnEdges),z,P_surf,maxPolygons)
     F_surf, Z_surf = np.meshgrid(f, z)
-    P_surf=getPower(matrix[:,Nmin:Nmax]  )/np.max(getPower(matrix[:,Nmin:Nmax]))
+    P_surf=P_surf/np.max(P_surf)
     P_surf[P_surf<1e-100]=1e-100
     P_surf = 10*np.log10(P_surf)
     P_surf[P_surf<dB_cutoff]=dB_cutoff
-    # Plot the surface.
+    # Plot the surface. rcount and ccount are set so matplotlib does not stride the already decimated grid.
     surf = ax.plot_surface(F_surf, Z_surf, P_surf, cmap=cm.viridis,
+                          rcount=len(z), ccount=len(f),
                           linewidth=0, antialiased=False)
     ax.set_xlabel('Freq. [GHz]')
     ax.set_ylabel('Distance [m]')
     # Add a color bar which maps values to colors.
     fig.colorbar(surf, shrink=0.5, aspect=5)
     saveplot('spectrum_evo_3D') 
-    plt.show()
+    showplot()
     os.chdir(ssfm_result_list[0].dirs[0])
 
 
 def plotEverythingAboutSpectra(ssfm_result_list,
                                nrange:int, 
-                               dB_cutoff):
+                               dB_cutoff,
+                               renderMode="raster",
+                               renderCache=None):
     """ 
     Generates all plots of pulse amplitudes throughout fiber span
     
@@ -2185,6 +5713,8 @@ def plotEverythingAboutSpectra(ssfm_result_list,
         ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
         nrange (int): Determines how many points on either side of the center we wish to plot  
         dB_cutoff : Lowest y-value in plot is this many dB smaller than the peak power
+        renderMode="raster" (str) (optional): "raster" or "contour" for the 2D plot. See drawEvolutionMap.
+        renderCache=None (render_cache_class) (optional): If specified, plots made before with the same result and arguments are copied from this cache instead of being made again
     
     Returns:
 
@@ -2192,9 +5722,9 @@ def plotEverythingAboutSpectra(ssfm_result_list,
     """   
 
     print('  ')  
-    plotFirstAndLastSpectrum(ssfm_result_list, nrange, dB_cutoff)
-    plotSpectrumMatrix2D(ssfm_result_list, nrange, dB_cutoff)
-    plotSpectrumMatrix3D(ssfm_result_list, nrange, dB_cutoff)
+    callPlot(renderCache, plotFirstAndLastSpectrum, ssfm_result_list, nrange, dB_cutoff)
+    callPlot(renderCache, plotSpectrumMatrix2D, ssfm_result_list, nrange, dB_cutoff, renderMode)
+    callPlot(renderCache, plotSpectrumMatrix3D, ssfm_result_list, nrange, dB_cutoff)
     print('  ')  
 
     
@@ -2202,48 +5732,60 @@ def plotEverythingAboutSpectra(ssfm_result_list,
 
 
 
-from matplotlib.animation import FuncAnimation, PillowWriter
+from matplotlib import animation
+from matplotlib.animation import FuncAnimation, PillowWriter, FFMpegWriter
 from matplotlib.legend import LineCollection
 from matplotlib.colors import LinearSegmentedColormap
 
-def makeChirpGif(ssfm_result_list,nrange:int,chirpRange=[-20,20],framerate=30):
+def makeChirpGif(ssfm_result_list,nrange:int,chirpRange=[-20,20],framerate=30,maxFrames=None,writerName="pillow"):
     """ 
     Animates pulse evolution and shows local chirp 
     
     Animates pulse power evolution and shows local chirp by changing line color.
-    Saves result as .gif file.
-    Note: Producing the animation can take a several minutes on a regular 
-    PC, so please be patient.
+    Saves result as .gif file, or as .mp4 file if writerName="ffmpeg".
+    Power and chirp of all frames are computed in one pass with 
+    getChirpMatrix, and every frame only updates the segments and colours 
+    of a single LineCollection, which is redrawn with blitting. Frames 
+    are streamed to the encoder as they are drawn. 
     
     Parameters:
         ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
         nrange (int): Determines how many points on either side of the center we wish to plot  
         chirpRange=[-20,20] (list) (optional): Min and Max frequency values in GHz to determine line color
         framerate=30 (int) (optional): Framerate of .gif animation. May want to reduce this number for simulations with few steps.     
+        maxFrames=None (int) (optional): If specified, only use this many evenly spaced z-steps as frames. The first and last z-steps are always included.
+        writerName="pillow" (str) (optional): "pillow" for .gif or "ffmpeg" for .mp4. Falls back to "pillow" if ffmpeg is not installed.
         
     """      
-    print("Making .gif anination of pulse evolution. This may take a while, so please be patient.")
-    
     os.chdir(ssfm_result_list[0].dirs[1])
     
-    print(f"The .gif animation will be saved in {os.getcwd()}")
-    
     timeFreq = ssfm_result_list[0].input_signal.timeFreq   
     zvals = unpackZvals(ssfm_result_list)
-    matrix = unpackMatrix(ssfm_result_list,zvals,timeFreq,"pulse")
     scalingFactor, letter =  getUnitsFromValue(np.max(zvals))
     
     Nmin = np.max([int(timeFreq.number_of_points/2-nrange),0])
     Nmax = np.min([int(timeFreq.number_of_points/2+nrange),timeFreq.number_of_points-1])    
     
-    Tmin = timeFreq.t[Nmin]
-    Tmax = timeFreq.t[Nmax]
+    matrix = unpackMatrix(ssfm_result_list,zvals,timeFreq,"pulse",Nmin,Nmax)
     
-    points = np.array( [timeFreq.t*1e12 ,  getPower(matrix[len(zvals)-1,Nmin:Nmax])   ] ,dtype=object ).T.reshape(-1,1,2)
-    segments = np.concatenate([points[0:-1],points[1:]],axis=1)
+    frames = np.arange(len(zvals))
+    if maxFrames is not None and len(zvals) > maxFrames:
+        frames = np.unique(np.round(np.linspace(0,len(zvals)-1,maxFrames)).astype(int))
+    
+    #Compute power and chirp of all frames in one go. Each segment is coloured by the chirp at its start
+    t_ps = timeFreq.t[Nmin:Nmax]*1e12
+    P = getPower(matrix[frames,:])
+    C = getChirpMatrix(timeFreq.t[Nmin:Nmax],matrix[frames,:])[:,0:-1]/1e9
     
+    segments = np.zeros((len(t_ps)-1,2,2))
+    segments[:,0,0] = t_ps[0:-1]
+    segments[:,1,0] = t_ps[1:]
     
+    if writerName.lower() == "ffmpeg" and animation.writers.is_available("ffmpeg") == False:
+        print("ffmpeg is not installed, so the animation will be saved as .gif with Pillow instead")
+        writerName = "pillow"
     
+    print(f"Making animation of pulse evolution with {len(frames)} frames. It will be saved in {os.getcwd()}")
     
     #Make custom colormap
     colors = ["red" ,"gray", "blue"]
@@ -2252,59 +5794,39 @@ def makeChirpGif(ssfm_result_list,nrange:int,chirpRange=[-20,20],framerate=30):
     #Initialize color normalization function
     norm = plt.Normalize(chirpRange[0],chirpRange[1])
     
-    #Initialize line collection to be plotted
-    lc=LineCollection(segments,cmap=cmap1,norm=norm)
-    lc.set_array( getChirp(timeFreq.t[Nmin:Nmax],matrix[len(zvals)-1,Nmin:Nmax])/1e9 )
-    
-    #Initialize figure
+    #Initialize figure with a single line collection, which is updated for every frame
     fig, ax = plt.subplots(dpi=150)
+    lc=LineCollection(segments,cmap=cmap1,norm=norm,animated=True)
     line = ax.add_collection(lc)
     fig.colorbar(line,ax=ax, label = 'Chirp [GHz]')
     
-    Pmax = np.max( np.abs(matrix) )**2
-    
-
-    
-    
-    #Function for specifying axes
-    def init():
-      
-    
-      ax.set_xlim([Tmin*1e12,Tmax*1e12])
-      ax.set_ylim([0,1.05*Pmax])
-      
-      ax.set_xlabel('Time [ps]')
-      ax.set_ylabel('Power [W]')
-    #Function for updating the plot in the .gif
-    def update(i):
-      ax.clear() #Clear figure 
-      init()     #Reset axes  {num:{1}.{5}}  np.round(,2)
-      ax.set_title(f'Pulse evolution, z = {zvals[i]/scalingFactor:.2f}{letter}m')
-      
-      #Make collection of points from pulse power
-      points = np.array( [timeFreq.t[Nmin:Nmax]*1e12 ,  getPower(matrix[i,Nmin:Nmax])   ] ,dtype=object ).T.reshape(-1,1,2)
-      
-      #Make collection of lines from points
-      segments = np.concatenate([points[0:-1],points[1:]],axis=1)
-      lc=LineCollection(segments,cmap=cmap1,norm=norm)
-    
-      #Activate norm function based on local chirp
-      
-      lc.set_array( getChirp(timeFreq.t[Nmin:Nmax],matrix[i,Nmin:Nmax])/1e9 )
-      #Plot line
-      line = ax.add_collection(lc)
-
-
-
-    #Make animation
-    ani = FuncAnimation(fig,update,range(len(zvals)),init_func=init)
-    plt.show()
+    ax.set_xlim([t_ps[0],t_ps[-1]])
+    ax.set_ylim([0,1.05*np.max(P)])
+    ax.set_xlabel('Time [ps]')
+    ax.set_ylabel('Power [W]')
+    ax.set_title('Pulse evolution')
+    
+    #Label is drawn inside the axes, so it is restored by blitting
+    label = ax.text(0.02,0.95,'',transform=ax.transAxes,verticalalignment='top',animated=True)
+    
+    #Function for updating the plot in the animation
+    def update(frame_index):
+      segments[:,0,1] = P[frame_index,0:-1]
+      segments[:,1,1] = P[frame_index,1:]
+      lc.set_segments(segments)
+      lc.set_array(C[frame_index,:])
+      label.set_text(f'z = {zvals[frames[frame_index]]/scalingFactor:.2f}{letter}m')
+      return lc, label
+    
+    #Make animation and stream frames to the encoder
+    ani = FuncAnimation(fig,update,range(len(frames)),blit=True)
+    
+    if writerName.lower() == "ffmpeg":
+        ani.save(f'{ssfm_result_list[0].experimentName}_fps={framerate}.mp4',writer=FFMpegWriter(fps=framerate))
+    else:
+        ani.save(f'{ssfm_result_list[0].experimentName}_fps={framerate}.gif',writer=PillowWriter(fps=framerate))
     
-    #Save animation as .gif
-
-    writer = PillowWriter(fps=framerate)
-    ani.save(f'{ssfm_result_list[0].experimentName}_fps={framerate}.gif',writer=writer)
-
+    showplot()
     os.chdir(ssfm_result_list[0].dirs[0])
 
 
@@ -2364,11 +5886,139 @@ def getStDevTimeOrFreq(time_or_freq,pulse_or_spectrum):
     return np.sqrt(getVarianceTimeOrFreq(time_or_freq,pulse_or_spectrum))
 
 
+#Functions below compute the same quantities as the ones above for every 
+#row of a (n_z, N) matrix at once. Lazy matrices and slices of them, e.g. 
+#chunked_matrix_class[:,Nmin:Nmax], are accepted and read in one go.
+
+def getPhaseMatrix(matrix):
+    """ 
+    Gets the phase of every row of a matrix of pulses
+    
+    Vectorized version of getPhase. Unwraps the complex angle along each 
+    row and centers it on the middle entry.
+
+    Parameters:
+        matrix (nparray): Pulse amplitudes in time domain with one pulse per row
+        
+    Returns:
+        nparray: Phase of every pulse at every instance in radians 
+    """
+    phi=np.unwrap(np.angle(np.asarray(matrix)),axis=1) 
+    return phi-phi[:,int(phi.shape[1]/2),np.newaxis]
+    
+
+def getChirpMatrix(time_s,matrix):
+    """ 
+    Get local chirp of every row of a matrix of pulses
+    
+    Vectorized version of getChirp.
+
+    Parameters:
+        time_s (nparray): Time range in seconds
+        matrix (nparray): Pulse amplitudes in time domain with one pulse per row
+        
+    Returns:
+        nparray: Chirp in Hz of every pulse at every instance 
+    """
+    phi=getPhaseMatrix(matrix)
+    dphi=np.diff(phi,prepend = (phi[:,0] - (phi[:,1] - phi[:,0]))[:,np.newaxis],axis=1) 
+    dt  =np.diff(time_s,prepend = time_s[0]- (time_s[1] - time_s[0] )) 
+    
+    return -1.0/(2*pi)*dphi/dt
+    
+
+def getEnergyArray(time_or_freq,matrix):
+    """ 
+    Computes energy of every row of a matrix of pulses or spectra
+    
+    Parameters:
+        time_or_freq (nparray): Time range in seconds or freq. range in Hz
+        matrix (nparray): Temporal or spectral amplitudes with one signal per row
+        
+    Returns:
+        nparray: Energy in J of every row
+    """
+    return np.trapz(getPower(np.asarray(matrix)),time_or_freq,axis=1)
+
+
+def getMomentsTimeOrFreq(time_or_freq,matrix):
+    """ 
+    Computes energy, center and width of every row of a matrix of pulses or spectra
+    
+    Vectorized version of getEnergy, getAverageTimeOrFreq and 
+    getStDevTimeOrFreq that computes the power only once and shares the 
+    energy between the center and width.
+    
+    Parameters:
+        time_or_freq (nparray): Time range in seconds or freq. range in Hz
+        matrix (nparray): Temporal or spectral amplitudes with one signal per row
+        
+    Returns:
+        list(nparray,nparray,nparray): Energy, average time or freq. and standard deviation of every row
+    """
+    P = getPower(np.asarray(matrix))
+    E = np.trapz(P,time_or_freq,axis=1)
+    meanValue = np.trapz(time_or_freq*P,time_or_freq,axis=1)/E
+    variance = np.trapz(time_or_freq**2*P,time_or_freq,axis=1)/E - meanValue**2
+    
+    return E, meanValue, np.sqrt(variance)
+
+
+def getPeakPowerArray(matrix):
+    """ 
+    Computes peak power or PSD of every row of a matrix of pulses or spectra
+    
+    Parameters:
+        matrix (nparray): Temporal or spectral amplitudes with one signal per row
+        
+    Returns:
+        nparray: Largest power or PSD of every row
+    """
+    return np.max(getPower(np.asarray(matrix)),axis=1)
+
+
+def getFWHMArray(time_or_freq,matrix):
+    """ 
+    Computes full width at half maximum of every row of a matrix of pulses or spectra
+    
+    The width is measured between the outermost points where the power is 
+    at least half of the peak power of the row, with linear interpolation 
+    between grid points at both edges. 
+    
+    Parameters:
+        time_or_freq (nparray): Time range in seconds or freq. range in Hz
+        matrix (nparray): Temporal or spectral amplitudes with one signal per row
+        
+    Returns:
+        nparray: FWHM in s or Hz of every row
+    """
+    P = getPower(np.asarray(matrix))
+    number_of_points = P.shape[1]
+    halfMax = np.max(P,axis=1)/2
+    
+    above = P >= halfMax[:,np.newaxis]
+    first = np.argmax(above,axis=1)
+    last  = number_of_points-1-np.argmax(above[:,::-1],axis=1)
+    
+    def getCrossing(inside,outside):
+        #Interpolate between the point inside the peak and its neighbour outside it
+        P_inside  = np.take_along_axis(P,inside[:,np.newaxis],axis=1)[:,0]
+        P_outside = np.take_along_axis(P,outside[:,np.newaxis],axis=1)[:,0]
+        with np.errstate(divide="ignore",invalid="ignore"):
+            fraction = np.where(P_inside > P_outside, (P_inside-halfMax)/(P_inside-P_outside), 0.0)
+        return time_or_freq[inside]+fraction*(time_or_freq[outside]-time_or_freq[inside])
+    
+    left  = getCrossing(first, np.maximum(first-1,0))
+    right = getCrossing(last, np.minimum(last+1,number_of_points-1))
+    
+    return right-left
+
+
 def plotAverageAndStdTimeAndFreq(ssfm_result_list):
     """ 
     Plots how spectral and temporal width of signal change with distance
     
-    Uses getAverageTimeOrFreq and getStDevTimeOrFreq to create dual-axis 
+    Uses getMomentsTimeOrFreq to create dual-axis 
     line plot of temporal and spectral center and widths throughout fiber span.
     Saves plot in appropriate folder.
     
@@ -2385,23 +6035,8 @@ def plotAverageAndStdTimeAndFreq(ssfm_result_list):
     pulseMatrix = unpackMatrix(ssfm_result_list,zvals,timeFreq,"pulse")
     spectrumMatrix = unpackMatrix(ssfm_result_list,zvals,timeFreq,"spectrum")
     
-    meanTimeArray = np.zeros( len(zvals) )*1.0
-    meanFreqArray = np.copy( meanTimeArray )
-    stdTimeArray  = np.copy( meanTimeArray )
-    stdFreqArray  = np.copy( meanTimeArray )
-    
-    
-    i = 0
-    for pulse, spectrum in zip(pulseMatrix,spectrumMatrix):
-        
-        meanTimeArray[i] = getAverageTimeOrFreq(timeFreq.t,pulse)
-        meanFreqArray[i] = getAverageTimeOrFreq(timeFreq.f,spectrum)
-        
-        stdTimeArray[i]  = getStDevTimeOrFreq(timeFreq.t,pulse)
-        stdFreqArray[i]  = getStDevTimeOrFreq(timeFreq.f,spectrum)
-        
-        
-        i+=1
+    _, meanTimeArray, stdTimeArray = getMomentsTimeOrFreq(timeFreq.t,pulseMatrix)
+    _, meanFreqArray, stdFreqArray = getMomentsTimeOrFreq(timeFreq.f,spectrumMatrix)
 
     scalingFactor_Z,prefix_Z=getUnitsFromValue(np.max(zvals))
     maxCenterTime = np.max( np.abs(meanTimeArray)  )
@@ -2430,7 +6065,7 @@ def plotAverageAndStdTimeAndFreq(ssfm_result_list):
     fig.legend(bbox_to_anchor=(1.55,0.8))
     
     saveplot('Width_evo') 
-    plt.show()
+    showplot()
     os.chdir(ssfm_result_list[0].dirs[0])
     
 
@@ -2441,6 +6076,8 @@ def plotEverythingAboutResult(ssfm_result_list,
                               dB_cutoff_spectrum,
                               skip_3D_plot_flag = False,
                               skip_chirp_plot_flag = False,
+                              renderMode = "raster",
+                              renderCache = None,
                               **kwargs):
     """ 
     Generates all plots of pulse amplitudes, spectra etc. throughout fiber span
@@ -2454,101 +6091,414 @@ def plotEverythingAboutResult(ssfm_result_list,
         dB_cutoff_pulse   : For pulse plots, lowest y-value in plot is this many dB smaller than the peak power
         nrange_spectrum (int): For spectrum plots, determines how many points on either side of the center we wish to plot  
         dB_cutoff_spectrum   : For spectrum plots, lowest y-value in plot is this many dB smaller than the peak power
+        renderMode = "raster" (str) (optional): "raster" or "contour" for the 2D evolution plots. See drawEvolutionMap.
+        renderCache = None (render_cache_class) (optional): If specified, plots made before with the same result and arguments are copied from this cache instead of being made again
         **kwargs (optional):     
     
     Returns:
 
     """  
-    plotAverageAndStdTimeAndFreq(ssfm_result_list)
+    callPlot(renderCache, plotAverageAndStdTimeAndFreq, ssfm_result_list)
     
     plotEverythingAboutPulses(ssfm_result_list, 
                                   nrange_pulse, 
-                                  dB_cutoff_pulse, **kwargs)
+                                  dB_cutoff_pulse, renderMode, renderCache, **kwargs)
     
     plotEverythingAboutSpectra(ssfm_result_list,
                                    nrange_spectrum, 
-                                   dB_cutoff_spectrum)
+                                   dB_cutoff_spectrum, renderMode, renderCache)
 
 
+def _initPlotWorker(basePath, settings):
+    """ 
+    Initializer for worker processes used by renderEverythingAboutResult
+    
+    Switches to the non-interactive Agg backend, applies the export 
+    settings and memory-maps the results once per worker.
+    """
+    plt.switch_backend("Agg")
+    plotSettings.update(settings)
+    _workerState["ssfm_result_list"] = load_results(basePath)
 
 
+def _runPlotTask(plotFunction, args, kwargs, renderCache):
+    """ 
+    Makes a single plot of the results loaded by _initPlotWorker
+    """
+    callPlot(renderCache, plotFunction, _workerState["ssfm_result_list"], *args, **kwargs)
+    plt.close("all")
+    return plotFunction.__name__
+
+
+def renderEverythingAboutResult(basePath,
+                                nrange_pulse, 
+                                dB_cutoff_pulse, 
+                                nrange_spectrum, 
+                                dB_cutoff_spectrum,
+                                skip_3D_plot_flag = False,
+                                skip_chirp_plot_flag = False,
+                                renderMode = "raster",
+                                fileFormat = "png",
+                                dpi = 500,
+                                number_of_workers = None,
+                                renderCache = None,
+                                **kwargs):
+    """ 
+    Generates the plots of plotEverythingAboutResult headless and in parallel
+    
+    Every plot is made by a separate task in a process pool. Workers use 
+    the Agg backend, never call plt.show() and read the results saved by 
+    SSFM in basePath memory-mapped with load_results, so no matrices are 
+    sent between processes. The run must be made with saveResultsFlag=True. Plots are saved in basePath.
+    
+    Parameters:
+        basePath (str): Path to run folder
+        nrange_pulse (int): For pulse plots, determines how many points on either side of the center we wish to plot  
+        dB_cutoff_pulse   : For pulse plots, lowest y-value in plot is this many dB smaller than the peak power
+        nrange_spectrum (int): For spectrum plots, determines how many points on either side of the center we wish to plot  
+        dB_cutoff_spectrum   : For spectrum plots, lowest y-value in plot is this many dB smaller than the peak power
+        skip_3D_plot_flag = False (optional): Do not make the 3D surface plots
+        skip_chirp_plot_flag = False (optional): Do not make the 2D chirp plot
+        renderMode = "raster" (str) (optional): "raster" or "contour" for the 2D evolution plots. See drawEvolutionMap.
+        fileFormat = "png" (str) (optional): File type of saved plots, e.g. "png", "pdf" or "svg"
+        dpi = 500 (int) (optional): Resolution of saved plots
+        number_of_workers = None (int) (optional): Number of worker processes. Defaults to os.cpu_count()
+        renderCache = None (render_cache_class) (optional): If specified, plots made before with the same result and arguments are copied from this cache instead of being made again
+        **kwargs (optional): Passed to plotFirstAndLastPulse and plotPulseChirp2D
+    
+    Returns:
+        
+    """
+    if number_of_workers is None:
+        number_of_workers = os.cpu_count()
+    
+    tasks = [(plotAverageAndStdTimeAndFreq, (), {}),
+             (plotFirstAndLastPulse, (nrange_pulse, dB_cutoff_pulse), kwargs),
+             (plotPulseMatrix2D, (nrange_pulse, dB_cutoff_pulse, renderMode), {}),
+             (plotFirstAndLastSpectrum, (nrange_spectrum, dB_cutoff_spectrum), {}),
+             (plotSpectrumMatrix2D, (nrange_spectrum, dB_cutoff_spectrum, renderMode), {})]
+    
+    if skip_chirp_plot_flag == False:
+        tasks.append((plotPulseChirp2D, (nrange_pulse, dB_cutoff_pulse, renderMode), kwargs))
+    
+    if skip_3D_plot_flag == False:
+        tasks.append((plotPulseMatrix3D, (nrange_pulse, dB_cutoff_pulse), {}))
+        tasks.append((plotSpectrumMatrix3D, (nrange_spectrum, dB_cutoff_spectrum), {}))
+    
+    settings = {"format": fileFormat, "dpi": dpi, "show": False, "exportQueue": None, "savedPlots": None}
+    
+    print(f"Rendering {len(tasks)} plots of {basePath} with {number_of_workers} workers")
+    
+    with ProcessPoolExecutor(max_workers = number_of_workers,
+                             initializer = _initPlotWorker,
+                             initargs = (os.path.realpath(basePath), settings)) as executor:
+        futures = [executor.submit(_runPlotTask, plotFunction, args, plot_kwargs, renderCache) for plotFunction, args, plot_kwargs in tasks]
+        
+        for future in futures:
+            print(f"Finished {future.result()}")
 
 
-from scipy import signal
 
-def waveletTest(M,s):
-    
-    w=1
-    x = np.arange(0, M) - (M - 1.0) / 2
-    x = x / s
-    wavelet = np.exp(1j * w * x) * np.exp(-0.5 * x**2) * np.pi**(-0.25)
-    output = np.sqrt(1/s) * wavelet
-    return output  
 
-def waveletTransform(timeFreq:timeFreq_class,
-                     pulse, 
-                     nrange_pulse,
-                     nrange_spectrum,
-                     dB_cutoff ):
+def getMorletFilters(time_s,freq_Hz,w0=6.0):
+    """ 
+    Computes Fourier transforms of Morlet wavelets for an FFT-based CWT
     
-    Nmin_pulse = np.max([int(timeFreq.number_of_points/2-nrange_pulse),0])
-    Nmax_pulse = np.min([int(timeFreq.number_of_points/2+nrange_pulse),timeFreq.number_of_points-1])    
+    The wavelet for frequency f has scale s = w0/(2*pi*|f|), so it covers 
+    w0/(2*pi) oscillations like scipy's morlet2. Frequencies are relative 
+    to the center frequency and may be negative. Scales are limited to half 
+    the time window, so frequencies close to zero use the widest wavelet 
+    that fits instead of an infinitely wide one. 
+    
+    Parameters:
+        time_s (nparray): Time range in seconds
+        freq_Hz (nparray): Frequencies at which the CWT is computed
+        w0=6.0 (float) (optional): Number of radians the wavelet oscillates through within one scale
+        
+    Returns:
+        nparray: Filters of size (len(freq_Hz),len(time_s)) in unshifted FFT order
+    """
+    dt = time_s[1]-time_s[0]
+    omega = 2*pi*fftfreq(len(time_s), d=dt)
+    omega_k = 2*pi*np.atleast_1d(freq_Hz)
+    
+    scales = np.minimum(w0/np.maximum(np.abs(omega_k),1e-300), (time_s[-1]-time_s[0])/2)
     
+    return (np.sqrt(2*pi*scales)*pi**(-0.25))[:,np.newaxis]*np.exp(-0.5*(scales[:,np.newaxis]*(omega[np.newaxis,:]-omega_k[:,np.newaxis]))**2)
 
-    Tmax = timeFreq.t[Nmax_pulse]
+
+def getBatchSize(batchSize,elementsPerRow,maxElements=2**24):
+    """ 
+    Number of rows processed at a time by the time-frequency functions
     
-   
+    Parameters:
+        batchSize (int): Requested number of rows. If None, as many rows as fit in maxElements are used.
+        elementsPerRow (int): Number of complex values computed for each row
+        maxElements=2**24 (int) (optional): Largest number of complex values held in memory at a time
+        
+    Returns:
+        int: Number of rows processed at a time
+    """
+    if batchSize is not None:
+        return batchSize
+    return max(int(maxElements//elementsPerRow),1)
+
 
+def getCWTMatrix(time_s,pulses,freq_Hz,w0=6.0,timeStride=1,batchSize=None):
+    """ 
+    Computes the power of the Morlet continuous wavelet transform of many pulses 
+    
+    Every pulse is Fourier transformed once, multiplied by the filters of 
+    all frequencies from getMorletFilters and transformed back, so the CWT
+    is computed for all frequencies and z-slices in a few FFT calls instead 
+    of one convolution per scale. 
+    
+    Parameters:
+        time_s (nparray): Time range in seconds
+        pulses (nparray): Pulse amplitude in time domain, either a single pulse or one pulse per row, e.g. pulseMatrix
+        freq_Hz (nparray): Frequencies at which the CWT is computed
+        w0=6.0 (float) (optional): Number of radians the wavelet oscillates through within one scale. See getMorletFilters.
+        timeStride=1 (int) (optional): Only keep every timeStride-th time point of the output
+        batchSize=None (int) (optional): Number of pulses transformed at a time. If None, chosen to keep memory use bounded.
+        
+    Returns:
+        nparray: float32 array of size (number of pulses, len(freq_Hz), len(time_s[::timeStride])) with |CWT|^2
+    """
+    pulses = pulses if np.ndim(pulses) == 2 else np.atleast_2d(pulses)
+    filters = getMorletFilters(time_s,freq_Hz,w0)
+    batchSize = getBatchSize(batchSize,filters.size)
     
-    t = timeFreq.t[Nmin_pulse:Nmax_pulse]
+    output = np.zeros((len(pulses),len(filters),len(time_s[::timeStride])),dtype=np.float32)
+    
+    for row_min in range(0,len(pulses),batchSize):
+        X = fft(np.asarray(pulses[row_min:row_min+batchSize],dtype=complex),axis=-1)
+        W = ifft(X[:,np.newaxis,:]*filters[np.newaxis,:,:],axis=-1)
+        output[row_min:row_min+batchSize] = getPower(W[:,:,::timeStride])
+    
+    return output
 
-    wavelet_durations = np.linspace((t[1]-t[0])*10,Tmax,1000)
+
+def getGateMatrix(gate,delayIndices):
+    """ 
+    Makes delayed copies of a gate function without wrapping around the time window
+    
+    Parameters:
+        gate (nparray): Gate or reference pulse centered in the time window
+        delayIndices (nparray): Delays in number of time steps
+        
+    Returns:
+        nparray: Array of size (len(delayIndices),len(gate)). Row k is gate delayed by delayIndices[k] and zero where it has been shifted out of the window.
+    """
+    N = len(gate)
+    source = np.arange(N)[np.newaxis,:]-np.atleast_1d(delayIndices)[:,np.newaxis]
+    inside = (source >= 0) & (source < N)
+    return np.where(inside, gate[np.clip(source,0,N-1)], 0)
+
+
+def getSpectrogramMatrix(timeFreq:timeFreq_class,
+                         pulses,
+                         delays_s,
+                         gate = None,
+                         gateDuration_s = None,
+                         Nmin = None,
+                         Nmax = None,
+                         batchSize = None):
+    """ 
+    Computes short-time Fourier spectrograms or XFROG traces of many pulses
     
-    print((t[1]-t[0])*100,Tmax)
-    print(1/Tmax/1e9,1/((t[1]-t[0])*100)/1e9)
+    For every pulse and delay tau, the pulse is multiplied by the gate 
+    delayed by tau and Fourier transformed. All delays of a batch of pulses
+    are transformed in one FFT call. With a Gaussian gate this is a 
+    spectrogram, with a reference pulse as gate it is an XFROG trace. 
     
-    dt_wavelet = wavelet_durations[1]-wavelet_durations[0]
+    Parameters:
+        timeFreq (timeFreq_class): timeFreq for simulation
+        pulses (nparray): Pulse amplitude in time domain, either a single pulse or one pulse per row, e.g. pulseMatrix
+        delays_s (nparray): Gate delays in seconds. Rounded to the nearest time step.
+        gate = None (nparray) (optional): Gate or reference pulse centered in the time window. If None, a Gaussian gate with duration gateDuration_s is used.
+        gateDuration_s = None (float) (optional): Duration of Gaussian gate. Required if gate is None.
+        Nmin = None (int) (optional): First frequency index in output. Defaults to 0.
+        Nmax = None (int) (optional): Output frequency indices up to but not including Nmax. Defaults to number of points.
+        batchSize = None (int) (optional): Number of pulses transformed at a time. If None, chosen to keep memory use bounded.
+        
+    Returns:
+        nparray: float32 array of size (number of pulses, len(delays_s), Nmax-Nmin) with power spectral density for frequencies timeFreq.f[Nmin:Nmax]
+    """
+    t = timeFreq.t
+    dt = t[1]-t[0]
     
+    if gate is None:
+        assert gateDuration_s is not None, "ERROR: Please specify either gate or gateDuration_s!!!"
+        gate = np.exp(-0.5*(t/gateDuration_s)**2)
     
-    plt.figure()
-    plt.plot(t,np.real(pulse[Nmin_pulse:Nmax_pulse]))
-    plt.plot(t,np.imag(pulse[Nmin_pulse:Nmax_pulse]))
-    plt.show()
+    if Nmin is None:
+        Nmin = 0
+    if Nmax is None:
+        Nmax = len(t)
     
-            
-    plt.figure()
-    plt.plot(t,getChirp(t, pulse[Nmin_pulse:Nmax_pulse])/1e9)
-    plt.ylabel('Chirp [GHz]')
-    plt.show()
+    pulses = pulses if np.ndim(pulses) == 2 else np.atleast_2d(pulses)
+    gates = getGateMatrix(np.asarray(gate,dtype=complex),np.round(np.atleast_1d(delays_s)/dt).astype(int))
+    batchSize = getBatchSize(batchSize,gates.size)
     
-    cwtmatr = signal.cwt(pulse[Nmin_pulse:Nmax_pulse], signal.morlet2, wavelet_durations,dtype=complex)
+    output = np.zeros((len(pulses),len(gates),Nmax-Nmin),dtype=np.float32)
     
+    for row_min in range(0,len(pulses),batchSize):
+        gated = np.asarray(pulses[row_min:row_min+batchSize],dtype=complex)[:,np.newaxis,:]*gates[np.newaxis,:,:]
+        S = fftshift(fft(gated,axis=-1),axes=-1)*dt
+        output[row_min:row_min+batchSize] = getPower(S[:,:,Nmin:Nmax])
+    
+    return output
+
 
+def getSpectrogramEvolution(ssfm_result_list,
+                            delays_s,
+                            nrange_spectrum,
+                            gate = None,
+                            gateDuration_s = None,
+                            maxFrames = None):
+    """ 
+    Computes spectrograms or XFROG traces at every z-step of a fiber span
     
+    Parameters:
+        ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
+        delays_s (nparray): Gate delays in seconds
+        nrange_spectrum (int): Determines how many frequencies on either side of the center are kept
+        gate = None (nparray) (optional): Gate or reference pulse. See getSpectrogramMatrix.
+        gateDuration_s = None (float) (optional): Duration of Gaussian gate. Required if gate is None.
+        maxFrames = None (int) (optional): If specified, only use this many evenly spaced z-steps. The first and last z-steps are always included.
+        
+    Returns:
+        list(nparray,nparray,nparray): z-values, frequencies relative to the center frequency and float32 array of size (len(z), len(delays_s), len(f))
+    """
+    timeFreq = ssfm_result_list[0].input_signal.timeFreq
+    zvals = unpackZvals(ssfm_result_list)
     
+    Nmin = np.max([int(timeFreq.number_of_points/2-nrange_spectrum),0])
+    Nmax = np.min([int(timeFreq.number_of_points/2+nrange_spectrum),timeFreq.number_of_points-1])
     
-      
-    Z = np.abs(cwtmatr)**2
-    print(np.max(Z))
-    Z /= np.max(Z)
+    frames = np.arange(len(zvals))
+    if maxFrames is not None and len(zvals) > maxFrames:
+        frames = np.unique(np.round(np.linspace(0,len(zvals)-1,maxFrames)).astype(int))
     
-    Z[Z<10**(dB_cutoff/10)] = 10**(dB_cutoff/10)
+    matrix = unpackMatrix(ssfm_result_list,zvals,timeFreq,"pulse")
     
+    return zvals[frames], timeFreq.f[Nmin:Nmax], getSpectrogramMatrix(timeFreq,matrix[frames,:],delays_s,gate,gateDuration_s,Nmin,Nmax)
 
-    fig, ax = plt.subplots(dpi=200)
-    ax.set_title('Wavelet transform of final pulse')
-    T, F = np.meshgrid(t, 1/wavelet_durations)
+
+def makeSpectrogramGif(ssfm_result_list,
+                       delays_s,
+                       nrange_spectrum,
+                       dB_cutoff,
+                       gate = None,
+                       gateDuration_s = None,
+                       framerate = 30,
+                       maxFrames = None,
+                       writerName = "pillow"):
+    """ 
+    Animates the evolution of the spectrogram or XFROG trace throughout the fiber span
+    
+    All frames are computed up front with getSpectrogramEvolution, and 
+    every frame only replaces the data of a single image, which is redrawn 
+    with blitting. Saved like makeChirpGif.
+    
+    Parameters:
+        ssfm_result_list (list): List of ssmf_result_class objects corresponding to each fiber segment
+        delays_s (nparray): Gate delays in seconds
+        nrange_spectrum (int): Determines how many frequencies on either side of the center we wish to plot
+        dB_cutoff : Lowest value in plot is this many dB smaller than the peak of all frames
+        gate = None (nparray) (optional): Gate or reference pulse. See getSpectrogramMatrix.
+        gateDuration_s = None (float) (optional): Duration of Gaussian gate. Required if gate is None.
+        framerate = 30 (int) (optional): Framerate of animation
+        maxFrames = None (int) (optional): If specified, only use this many evenly spaced z-steps as frames
+        writerName = "pillow" (str) (optional): "pillow" for .gif or "ffmpeg" for .mp4. Falls back to "pillow" if ffmpeg is not installed.
+    """
+    os.chdir(ssfm_result_list[0].dirs[1])
+    
+    zvals, f, S = getSpectrogramEvolution(ssfm_result_list,delays_s,nrange_spectrum,gate,gateDuration_s,maxFrames)
+    scalingFactor, letter = getUnitsFromValue(np.max(zvals))
+    
+    S = S/np.max(S)
+    S[S<1e-100] = 1e-100
+    S = 10*np.log10(S)
+    S[S<dB_cutoff] = dB_cutoff
     
-    surf=ax.contourf(T/1e-12,F/1e9, Z,levels=40)
-    ax.set_xlabel('Time. [ps]')
+    if writerName.lower() == "ffmpeg" and animation.writers.is_available("ffmpeg") == False:
+        print("ffmpeg is not installed, so the animation will be saved as .gif with Pillow instead")
+        writerName = "pillow"
+    
+    print(f"Making animation of spectrogram evolution with {len(zvals)} frames. It will be saved in {os.getcwd()}")
+    
+    fig, ax = plt.subplots(dpi=150)
+    delays_ps = np.atleast_1d(delays_s)*1e12
+    f_GHz = f/1e9
+    image = ax.imshow(S[0].T,extent=(delays_ps[0],delays_ps[-1],f_GHz[0],f_GHz[-1]),
+                      origin="lower",aspect="auto",interpolation="nearest",vmin=dB_cutoff,vmax=0,animated=True)
+    fig.colorbar(image,ax=ax,label='PSD [dB]')
+    ax.set_xlabel('Delay [ps]')
     ax.set_ylabel('Freq. [GHz]')
-    cbar=fig.colorbar(surf, ax=ax) 
-    saveplot('wavelet_final') 
-    plt.show()
+    ax.set_title('Spectrogram evolution')
+    label = ax.text(0.02,0.95,'',transform=ax.transAxes,verticalalignment='top',color='white',animated=True)
+    
+    def update(frame_index):
+      image.set_data(S[frame_index].T)
+      label.set_text(f'z = {zvals[frame_index]/scalingFactor:.2f}{letter}m')
+      return image, label
+    
+    ani = FuncAnimation(fig,update,range(len(zvals)),blit=True)
+    
+    if writerName.lower() == "ffmpeg":
+        ani.save(f'{ssfm_result_list[0].experimentName}_spectrogram_fps={framerate}.mp4',writer=FFMpegWriter(fps=framerate))
+    else:
+        ani.save(f'{ssfm_result_list[0].experimentName}_spectrogram_fps={framerate}.gif',writer=PillowWriter(fps=framerate))
+    
+    showplot()
+    os.chdir(ssfm_result_list[0].dirs[0])
+
+
+def waveletTransform(timeFreq:timeFreq_class,
+                     pulse, 
+                     nrange_pulse,
+                     nrange_spectrum,
+                     dB_cutoff,
+                     w0 = 6.0):
+    """ 
+    Plots the Morlet wavelet transform of a single pulse
+    
+    Uses getCWTMatrix with one wavelet for every frequency within 
+    nrange_spectrum points of the center and saves the plot as wavelet_final.
+    
+    Parameters:
+        timeFreq (timeFreq_class): timeFreq for simulation
+        pulse (nparray): Pulse amplitude in time domain
+        nrange_pulse (int): Determines how many time points on either side of the center we wish to plot
+        nrange_spectrum (int): Determines how many frequencies on either side of the center we wish to plot
+        dB_cutoff : Lowest value in plot is this many dB smaller than the peak
+        w0 = 6.0 (float) (optional): Number of radians the wavelet oscillates through within one scale. See getMorletFilters.
+    """
+    Nmin_pulse = np.max([int(timeFreq.number_of_points/2-nrange_pulse),0])
+    Nmax_pulse = np.min([int(timeFreq.number_of_points/2+nrange_pulse),timeFreq.number_of_points-1])    
     
+    Nmin_spectrum = np.max([int(timeFreq.number_of_points/2-nrange_spectrum),0])
+    Nmax_spectrum = np.min([int(timeFreq.number_of_points/2+nrange_spectrum),timeFreq.number_of_points-1])
     
+    f = timeFreq.f[Nmin_spectrum:Nmax_spectrum]
+    Z = getCWTMatrix(timeFreq.t,pulse,f,w0)[0][:,Nmin_pulse:Nmax_pulse]
     
+    fig, ax = plt.subplots(dpi=200)
+    ax.set_title('Wavelet transform of final pulse')
+    t_ps, f_GHz, Z = getEvolutionMapData(ax,timeFreq.t[Nmin_pulse:Nmax_pulse]*1e12,f/1e9,Z)
+    Z = Z/np.max(Z)
+    Z[Z<1e-100] = 1e-100
+    Z = 10*np.log10(Z)
+    Z[Z<dB_cutoff] = dB_cutoff
     
+    surf=drawEvolutionMap(ax,t_ps,f_GHz,Z)
+    ax.set_xlabel('Time [ps]')
+    ax.set_ylabel('Freq. [GHz]')
+    cbar=fig.colorbar(surf, ax=ax) 
+    saveplot('wavelet_final') 
+    showplot()
+
 
 
 def wavelengthToFreq(wavelength_m):